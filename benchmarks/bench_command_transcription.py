@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark latenza per comando: whisper_model.transcribe vs CommandTranscriber
+
+Uso:
+    python benchmarks/bench_command_transcription.py [--model base] [--precision int8] [--runs 10] [clip.wav ...]
+
+Senza WAV usa clip sintetiche da 1 a 4 secondi (la latenza dipende dalla
+durata e dal numero di token, non dal contenuto: per misure realistiche
+passare registrazioni di comandi veri).
+
+Limite del percorso veloce: ogni clip viene comunque portata a 30 s per
+l'encoder di Whisper, il cui costo è identico nei due percorsi; la
+differenza misurata viene dal decoder e dal ciclo di `transcribe`.
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+
+from common import percentiles, load_wav, print_table
+
+from config.settings import WHISPER_MODEL, WHISPER_PRECISION, WHISPER_LANGUAGE, SAMPLE_RATE
+from whisper_engine import CommandTranscriber, load_whisper_model, WHISPER_PRECISIONS
+
+
+def synthetic_clips():
+    """Clip da 1-4 s con un segnale armonico modulato (simil-voce) su rumore"""
+    rng = np.random.default_rng(0)
+    clips = []
+    for seconds in (1, 2, 3, 4):
+        t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * 3 * t))
+        voice = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 12))
+        clips.append((0.1 * envelope * voice + 0.005 * rng.standard_normal(len(t))).astype(np.float32))
+    return clips
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('wavs', nargs='*', help='WAV mono 16 kHz con comandi registrati')
+    parser.add_argument('--model', default=WHISPER_MODEL)
+    parser.add_argument('--precision', default=WHISPER_PRECISION, choices=WHISPER_PRECISIONS)
+    parser.add_argument('--runs', type=int, default=10, help='ripetizioni per clip')
+    parser.add_argument('--beam-size', type=int, default=1)
+    parser.add_argument('--json', help='salva i risultati in JSON')
+    args = parser.parse_args()
+
+    clips = [load_wav(path) for path in args.wavs] or synthetic_clips()
+    model, precision = load_whisper_model(args.model, args.precision)
+    fast = CommandTranscriber(model, beam_size=args.beam_size)
+
+    # Riscaldamento (allocazioni torch, creazione sessione)
+    model.transcribe(clips[0], language=WHISPER_LANGUAGE, fp16=False, verbose=None)
+    fast.transcribe(clips[0])
+
+    timings = {'transcribe': [], 'fast_path': []}
+    for _ in range(args.runs):
+        for clip in clips:
+            start = time.perf_counter()
+            model.transcribe(clip, language=WHISPER_LANGUAGE, fp16=False, verbose=None,
+                             condition_on_previous_text=False)
+            timings['transcribe'].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            fast.transcribe(clip)
+            timings['fast_path'].append((time.perf_counter() - start) * 1000)
+
+    results = {name: percentiles(values) for name, values in timings.items()}
+    print_table(f"Latenza per comando (ms) - modello {args.model} ({precision}), "
+                f"{len(clips)} clip x {args.runs}", results)
+    speedup = results['transcribe']['p50'] / results['fast_path']['p50']
+    print(f"\nSpeedup p50: {speedup:.2f}x")
+    print("Nota: entrambi i percorsi codificano 30 s di audio (encoder di Whisper a finestra fissa)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'model': args.model, 'precision': precision, 'beam_size': args.beam_size,
+                       'results': results, 'speedup_p50': speedup}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark ritardo dell'event loop durante una generazione di Ollama
+
+Uso:
+    python benchmarks/bench_event_loop_lag.py [--requests 5] [--ollama-delay-ms 1000]
+
+Un task "ticker" dorme `--tick-ms` e misura di quanto si sveglia in ritardo,
+mentre un altro task invia richieste a un server locale che imita Ollama:
+'blocking' usa requests.post dentro la coroutine (il vecchio client),
+'async' usa AsyncOllamaClient. Con il client bloccante il ritardo massimo è
+pari all'intera generazione; con quello asincrono resta sotto il millisecondo.
+Riporta anche le connessioni TCP aperte (keep-alive del client asincrono).
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from common import percentiles, print_table
+from ollama_stub import OllamaStub
+
+from ollama_client import AsyncOllamaClient
+
+MODES = ('blocking', 'async')
+
+
+def payload(stub):
+    return {'model': stub.model, 'prompt': 'Che ore sono?', 'stream': False}
+
+
+async def ticker(tick, lags, stop_event):
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(tick)
+        lags.append((time.perf_counter() - start - tick) * 1000)
+
+
+async def run_mode(mode, stub, requests_count, tick):
+    lags, durations = [], []
+    stop_event = asyncio.Event()
+    connections = stub.connections
+    client = AsyncOllamaClient(stub.url)
+
+    ticker_task = asyncio.create_task(ticker(tick, lags, stop_event))
+    await asyncio.sleep(tick * 5)  # Ritardo a riposo come riferimento
+    try:
+        for _ in range(requests_count):
+            start = time.perf_counter()
+            if mode == 'blocking':
+                import requests
+                requests.post(f"{stub.url}/api/generate", json=payload(stub), timeout=30).json()
+            else:
+                await client.post_json('/api/generate', payload(stub), timeout=30)
+            durations.append((time.perf_counter() - start) * 1000)
+    finally:
+        stop_event.set()
+        await ticker_task
+        await client.close()
+
+    return {
+        'loop_lag_ms': percentiles(lags),
+        'request_ms': percentiles(durations),
+        'connections': stub.connections - connections
+    }
+
+
+async def run(args):
+    stub = OllamaStub(delay_ms=args.ollama_delay_ms, token_ms=args.ollama_token_ms).start()
+    try:
+        return {mode: await run_mode(mode, stub, args.requests, args.tick_ms / 1000) for mode in args.mode}
+    finally:
+        stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--tick-ms', type=float, default=10)
+    parser.add_argument('--ollama-delay-ms', type=float, default=1000)
+    parser.add_argument('--ollama-token-ms', type=float, default=20)
+    parser.add_argument('--mode', nargs='+', default=list(MODES), choices=MODES)
+    parser.add_argument('--json', help='salva i risultati in JSON')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    print_table(f"Ritardo event loop (ms, tick {args.tick_ms:.0f} ms)",
+                {mode: r['loop_lag_ms'] for mode, r in results.items()})
+    print_table("Durata richiesta (ms)", {mode: r['request_ms'] for mode, r in results.items()})
+    print(f"\n{'':<28}{'connessioni':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<28}{r['connections']:>12}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'requests': args.requests, 'tick_ms': args.tick_ms,
+                       'ollama_delay_ms': args.ollama_delay_ms, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
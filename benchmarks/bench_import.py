@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark costo di import della configurazione
+
+Uso:
+    python benchmarks/bench_import.py [--runs 20]
+
+Ogni misura gira in un interprete nuovo (nessun modulo già in cache):
+`import config.settings` deve costare pochi millisecondi e nessun accesso a
+rete o dispositivi; il primo `get_settings()` legge ambiente e .env.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+from common import ROOT_DIR, percentiles, print_table
+
+# Stampa i due tempi in millisecondi
+PROBE = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import config.settings
+imported = time.perf_counter()
+config.settings.get_settings()
+loaded = time.perf_counter()
+print((imported - start) * 1000, (loaded - imported) * 1000)
+"""
+
+
+def measure(runs):
+    imports, loads = [], []
+    code = PROBE.format(root=ROOT_DIR)
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        import_ms, load_ms = map(float, output.split())
+        imports.append(import_ms)
+        loads.append(load_ms)
+    return {'import_ms': percentiles(imports), 'first_get_settings_ms': percentiles(loads)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--json', help='salva i risultati in JSON')
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    print_table("Configurazione (ms, processo nuovo)", {
+        'import config.settings': results['import_ms'],
+        'primo get_settings()': results['first_get_settings_ms']
+    })
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'runs': args.runs, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
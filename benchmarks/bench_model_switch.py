@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark primo comando dopo l'avvio e dopo un cambio di modello
+
+Uso:
+    python benchmarks/bench_model_switch.py [--runs 5] [--ollama-load-ms 2000]
+
+Un server locale imita Ollama, compreso il caricamento del modello alla
+prima richiesta (`--ollama-load-ms`) e lo scaricamento con `keep_alive: 0`.
+Per ogni giro, con nessun modello in memoria:
+    cold            primo comando senza precaricamento
+    prewarmed       primo comando dopo il precaricamento della fase di avvio
+    switch_lazy     primo comando dopo aver solo cambiato nome al modello
+    switch_preload  primo comando dopo switch_model (che precarica il nuovo modello)
+Riporta anche la durata di precaricamenti e cambi di modello.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from common import percentiles, print_table
+from ollama_stub import OllamaStub
+
+from claude_api import OllamaAssistant
+
+COMMAND = "Che ore sono?"  # Mai in cache: ogni giro arriva al modello
+OTHER_MODEL = 'bench-alt'
+
+
+async def first_command(assistant):
+    start = time.perf_counter()
+    await assistant.process_command(COMMAND)
+    return (time.perf_counter() - start) * 1000
+
+
+async def run_once(stub, results):
+    stub.loaded.clear()
+    assistant = OllamaAssistant(host=stub.url, model=stub.model)
+    try:
+        results['cold'].append(await first_command(assistant))
+
+        stub.loaded.clear()
+        start = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(None, assistant.prewarm)
+        results['prewarm_load'].append((time.perf_counter() - start) * 1000)
+        results['prewarmed'].append(await first_command(assistant))
+
+        assistant.model = OTHER_MODEL
+        results['switch_lazy'].append(await first_command(assistant))
+        assistant.model = stub.model
+
+        stub.loaded.clear()
+        stub.loaded.add(stub.model)
+        start = time.perf_counter()
+        await assistant.switch_model(OTHER_MODEL)
+        results['switch_model'].append((time.perf_counter() - start) * 1000)
+        results['switch_preload'].append(await first_command(assistant))
+    finally:
+        await assistant.close()
+
+
+async def run(args):
+    stub = OllamaStub(delay_ms=args.ollama_delay_ms, token_ms=args.ollama_token_ms,
+                      load_ms=args.ollama_load_ms, models=(OTHER_MODEL,)).start()
+    results = {name: [] for name in ('cold', 'prewarmed', 'switch_lazy', 'switch_preload',
+                                     'prewarm_load', 'switch_model')}
+    try:
+        for _ in range(args.runs):
+            await run_once(stub, results)
+    finally:
+        stub.stop()
+    return {name: percentiles(values) for name, values in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--ollama-load-ms', type=float, default=2000)
+    parser.add_argument('--ollama-delay-ms', type=float, default=100)
+    parser.add_argument('--ollama-token-ms', type=float, default=5)
+    parser.add_argument('--json', help='salva i risultati in JSON')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    print_table("Primo comando (ms)", {name: results[name]
+                                       for name in ('cold', 'prewarmed', 'switch_lazy', 'switch_preload')})
+    print_table("Caricamento (ms)", {name: results[name] for name in ('prewarm_load', 'switch_model')})
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'runs': args.runs, 'ollama_load_ms': args.ollama_load_ms, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
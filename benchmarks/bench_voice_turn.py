@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-to-end di un turno vocale, senza microfono né rete
+
+Uso:
+    python benchmarks/bench_voice_turn.py [--runs 20] [--fixtures benchmarks/fixtures] [--json out.json]
+
+Per ogni turno riproduce in tempo reale una registrazione della wake word e,
+dopo il "Sì?", una registrazione del comando, attraverso l'intero percorso
+di ImprovedJarvisHelmet (hub di cattura → VAD → Whisper → callback →
+Ollama → TTS). Ollama è sostituito da un server HTTP locale con latenza
+configurabile; la sintesi vocale è disattivata e conta l'istante in cui
+parte.
+
+Fixture: `wake*.wav` e `command*.wav` (mono, 16 bit, 16 kHz) nella cartella
+indicata, usate a rotazione e tagliate a fine parlato (la fine della clip
+è la "fine parlato" dei segmenti). Si registrano ad esempio con:
+    arecord -f S16_LE -r 16000 -c 1 -d 2 benchmarks/fixtures/wake_1.wav
+
+Segmenti (ms):
+    wake_detect      fine parlato wake word → wake word riconosciuta
+    wake_ack         wake word riconosciuta → inizio TTS del "Sì?"
+    command_stt      fine parlato comando → comando trascritto
+    llm_reply        comando trascritto → risposta di Ollama (prima frase con LLM_STREAMING)
+    reply_tts_start  risposta di Ollama → inizio TTS della risposta
+    turn_total       fine parlato comando → inizio TTS della risposta
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import queue
+import subprocess
+import threading
+import time
+import numpy as np
+
+from common import ROOT_DIR, percentiles, load_wav, print_table
+from ollama_stub import OllamaStub
+
+os.environ.setdefault('TTS_ENABLED', 'False')
+
+from config.settings import CHUNK_SIZE, WHISPER_MODEL, WHISPER_PRECISION, VAD_ENGINE, LLM_STREAMING
+from audio_capture import configure_capture_hub, shutdown_capture_hub
+from audio_sources import ThreadedAudioSource
+from speech_handler import ImprovedWhisperSpeechHandler
+from claude_api import OllamaAssistant
+from audio_manager import AudioManager
+from main import ImprovedJarvisHelmet
+
+SEGMENTS = ('wake_detect', 'wake_ack', 'command_stt', 'llm_reply', 'reply_tts_start', 'turn_total')
+
+
+class ScriptedSource(ThreadedAudioSource):
+    name = 'bench'
+
+    def __init__(self, speed=1.0, noise=0.002):
+        """Microfono simulato: rumore di fondo continuo, clip riprodotte su richiesta"""
+        super().__init__(speed)
+        self.noise = noise
+        self.speech_end = None
+        self.speech_ended = threading.Event()
+        self._clips = queue.Queue()
+        self._rng = np.random.default_rng(0)
+
+    def play(self, clip):
+        self.speech_ended.clear()
+        self._clips.put(clip)
+
+    def _background(self, n):
+        return self.noise * self._rng.standard_normal(n)
+
+    @staticmethod
+    def _pcm(samples):
+        return (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+
+    def _chunks(self):
+        while self.is_running:
+            try:
+                clip = self._clips.get_nowait()
+            except queue.Empty:
+                yield self._pcm(self._background(CHUNK_SIZE))
+                continue
+
+            padded = self._background(-(-len(clip) // CHUNK_SIZE) * CHUNK_SIZE)
+            padded[:len(clip)] += clip
+            for i in range(0, len(padded), CHUNK_SIZE):
+                yield self._pcm(padded[i:i + CHUNK_SIZE])
+
+            # L'ultimo chunk della clip è stato appena pubblicato
+            self.speech_end = time.perf_counter()
+            self.speech_ended.set()
+
+
+class TurnProbe:
+    def __init__(self, jarvis):
+        """Registra gli istanti dei passaggi di un turno agganciandosi ai componenti"""
+        self.marks = {}
+        self.events = {name: threading.Event() for name in ('wake', 'ack', 'command', 'reply', 'reply_tts')}
+
+        handler = jarvis.speech_handler
+        on_wake, on_command = handler.wake_word_callback, handler.command_callback
+        speak = handler.speak
+        process_command = jarvis.ai_assistant.process_command
+        stream_command = jarvis.ai_assistant.stream_command
+
+        def wake_callback(text):
+            self.mark('wake')
+            on_wake(text)
+
+        def command_callback(text):
+            self.mark('command')
+            on_command(text)
+
+        def timed_speak(text):
+            self.mark('reply_tts' if self.events['reply'].is_set() else 'ack')
+            speak(text)
+
+        async def timed_process_command(text):
+            response = await process_command(text)
+            self.mark('reply')
+            return response
+
+        async def timed_stream_command(text):
+            async for sentence in stream_command(text):
+                self.mark('reply')
+                yield sentence
+
+        handler.wake_word_callback = wake_callback
+        handler.command_callback = command_callback
+        handler.speak = timed_speak
+        jarvis.ai_assistant.process_command = timed_process_command
+        jarvis.ai_assistant.stream_command = timed_stream_command
+
+    def mark(self, name):
+        if not self.events[name].is_set():
+            self.marks[name] = time.perf_counter()
+            self.events[name].set()
+
+    def reset(self):
+        self.marks = {}
+        for event in self.events.values():
+            event.clear()
+
+
+def load_fixtures(directory):
+    wakes = sorted(glob.glob(os.path.join(directory, 'wake*.wav')))
+    commands = sorted(glob.glob(os.path.join(directory, 'command*.wav')))
+    if not wakes or not commands:
+        raise SystemExit(f"Servono wake*.wav e command*.wav in {directory} (vedi --help)")
+    return [load_wav(p) for p in wakes], [load_wav(p) for p in commands]
+
+
+def run_turns(source, probe, wakes, commands, runs, timeout, pause):
+    """Esegue i turni (thread separato dal loop asyncio di Jarvis)"""
+    results = []
+    for i in range(runs):
+        probe.reset()
+        turn = {'run': i, 'ok': False}
+        results.append(turn)
+        time.sleep(pause)
+
+        source.play(wakes[i % len(wakes)])
+        if not source.speech_ended.wait(timeout) or not probe.events['ack'].wait(timeout):
+            turn['error'] = 'wake word non riconosciuta'
+            continue
+        wake_end = source.speech_end
+
+        source.play(commands[i % len(commands)])
+        if not source.speech_ended.wait(timeout) or not probe.events['reply_tts'].wait(timeout):
+            turn['error'] = 'comando non completato'
+            continue
+        command_end = source.speech_end
+
+        m = probe.marks
+        turn.update({
+            'ok': True,
+            'wake_detect': (m['wake'] - wake_end) * 1000,
+            'wake_ack': (m['ack'] - m['wake']) * 1000,
+            'command_stt': (m['command'] - command_end) * 1000,
+            'llm_reply': (m['reply'] - m['command']) * 1000,
+            'reply_tts_start': (m['reply_tts'] - m['reply']) * 1000,
+            'turn_total': (m['reply_tts'] - command_end) * 1000
+        })
+        print(f"  turno {i + 1}/{runs}: {turn['turn_total']:.0f} ms")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+async def run(args):
+    wakes, commands = load_fixtures(args.fixtures)
+    stub = OllamaStub(delay_ms=args.ollama_delay_ms, token_ms=args.ollama_token_ms).start()
+
+    source = ScriptedSource(speed=args.speed)
+    configure_capture_hub(source)
+
+    jarvis = ImprovedJarvisHelmet(
+        speech_handler=ImprovedWhisperSpeechHandler(),
+        ai_assistant=OllamaAssistant(host=stub.url, model=stub.model),
+        audio_manager=AudioManager(),
+        start_servers=False,
+        keyboard_input=False
+    )
+    probe = TurnProbe(jarvis)
+
+    system = asyncio.create_task(jarvis.start_system())
+    try:
+        results = await asyncio.get_running_loop().run_in_executor(
+            None, run_turns, source, probe, wakes, commands, args.runs, args.timeout, args.pause
+        )
+    finally:
+        jarvis.is_running = False
+        await system
+        stub.stop()
+        shutdown_capture_hub()
+
+    return results, jarvis
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=os.path.join(ROOT_DIR, 'benchmarks', 'fixtures'))
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--speed', type=float, default=1.0, help='velocità di replay (1 = tempo reale)')
+    parser.add_argument('--timeout', type=float, default=20, help='attesa massima per passaggio (s)')
+    parser.add_argument('--pause', type=float, default=1.0, help='pausa tra un turno e il successivo (s)')
+    parser.add_argument('--ollama-delay-ms', type=float, default=300)
+    parser.add_argument('--ollama-token-ms', type=float, default=20)
+    parser.add_argument('--json', help='salva i risultati in JSON')
+    args = parser.parse_args()
+
+    results, jarvis = asyncio.run(run(args))
+
+    ok = [r for r in results if r['ok']]
+    summary = {name: percentiles([r[name] for r in ok]) for name in SEGMENTS}
+    print_table(f"Turno vocale (ms, {len(ok)}/{len(results)} turni completati)", summary)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'meta': {
+                    'git_revision': git_revision(),
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'whisper_model': WHISPER_MODEL,
+                    'whisper_precision': jarvis.speech_handler.whisper_precision,
+                    'requested_precision': WHISPER_PRECISION,
+                    'vad_engine': VAD_ENGINE,
+                    'llm_streaming': LLM_STREAMING,
+                    'runs': args.runs,
+                    'speed': args.speed,
+                    'ollama_delay_ms': args.ollama_delay_ms,
+                    'ollama_token_ms': args.ollama_token_ms
+                },
+                'segments': summary,
+                'failures': len(results) - len(ok),
+                'turns': results
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Utilità comuni per gli script di benchmark
+"""
+
+import os
+import sys
+import wave
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Gli script girano da qualsiasi cartella: stessi import di src/main.py
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, 'src')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def percentiles(samples_ms):
+    """Riepilogo di una serie di latenze in millisecondi"""
+    if not samples_ms:
+        return {'count': 0}
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'count': int(len(values)),
+        'mean': float(values.mean()),
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max())
+    }
+
+
+def load_wav(path, sample_rate=16000):
+    """Carica un WAV mono 16 bit come float32 normalizzato"""
+    with wave.open(path, 'rb') as wf:
+        if wf.getframerate() != sample_rate or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: serve un WAV mono 16 bit a {sample_rate} Hz")
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    return audio.astype(np.float32) / 32768.0
+
+
+def print_table(title, rows):
+    """Stampa una tabella di riepilogo {nome: percentiles(...)}"""
+    print(f"\n{title}")
+    print(f"{'':<28}{'n':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, stats in rows.items():
+        if not stats.get('count'):
+            print(f"{name:<28}{0:>6}")
+            continue
+        print(f"{name:<28}{stats['count']:>6}{stats['p50']:>10.1f}{stats['p95']:>10.1f}"
+              f"{stats['p99']:>10.1f}{stats['max']:>10.1f}")
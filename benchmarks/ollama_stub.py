@@ -0,0 +1,170 @@
+"""
+Server HTTP locale che imita l'API di Ollama (nessun modello, nessuna rete)
+"""
+
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "Sono le dieci e mezza. Posso aiutarti con altro?"
+
+
+class OllamaStub:
+    def __init__(self, reply=DEFAULT_REPLY, delay_ms=300, token_ms=20, model='bench', load_ms=0, models=()):
+        """
+        Risponde a /api/tags, /api/generate e /api/chat con una risposta fissa (e a /api/embed, /api/ps)
+
+        Args:
+            delay_ms (float): attesa prima del primo token (prompt eval simulato)
+            token_ms (float): attesa tra un token e il successivo (risposte in streaming
+                e tempo totale di quelle non in streaming)
+            load_ms (float): caricamento simulato della prima richiesta a un modello non
+                in memoria; `keep_alive: 0` lo scarica
+            models (tuple[str]): altri modelli disponibili oltre a `model`
+        """
+        self.reply = reply
+        self.delay = delay_ms / 1000
+        self.token_delay = token_ms / 1000
+        self.model = model
+        self.models = (model,) + tuple(models)
+        self.load_delay = load_ms / 1000
+        self.loaded = set()
+        self.loads = 0
+        self.requests = 0
+        self.connections = 0
+        self._cached = []  # "Cache KV": parole dell'ultimo prompt più la risposta generata
+        self._server = None
+        self._thread = None
+
+    def load(self, model):
+        """Durata del caricamento in ns (0 se il modello è già in memoria)"""
+        if model in self.loaded:
+            return 0
+        time.sleep(self.load_delay)
+        self.loaded.add(model)
+        self.loads += 1
+        return int(self.load_delay * 1e9)
+
+    def evaluate_prompt(self, request, reply_tokens):
+        """Come Ollama: valuta solo le parole dopo il prefisso in comune con la richiesta precedente"""
+        if 'messages' in request:
+            words = ' '.join(m.get('content', '') for m in request['messages']).split()
+        else:
+            words = request.get('prompt', '').split()
+        common = 0
+        for cached, word in zip(self._cached, words):
+            if cached != word:
+                break
+            common += 1
+        self._cached = words + reply_tokens
+        return max(len(words) - common, 1)
+
+    @staticmethod
+    def embed(text, size=64):
+        """Embedding finto ma deterministico: parole contate in `size` posizioni"""
+        vector = [0.0] * size
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode()) % size] += 1.0
+        return vector
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive: conta le connessioni riusate dai client
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._send_json({'models': [{'name': m} for m in stub.models]})
+                elif self.path == '/api/ps':
+                    self._send_json({'models': [{'name': m} for m in sorted(stub.loaded)]})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if self.path == '/api/embed':
+                    inputs = request.get('input', '')
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._send_json({'model': request.get('model'), 'embeddings': [stub.embed(t) for t in inputs]})
+                    return
+                if self.path not in ('/api/generate', '/api/chat'):
+                    self.send_error(404)
+                    return
+
+                model = request.get('model', stub.model)
+                if request.get('keep_alive') == 0:
+                    stub.loaded.discard(model)
+                    self._send_json({'model': model, 'response': '', 'done': True, 'done_reason': 'unload'})
+                    return
+                load_duration = stub.load(model)
+                if not request.get('prompt') and not request.get('messages'):
+                    # Solo caricamento, come Ollama con una richiesta vuota
+                    self._send_json({'model': model, 'response': '', 'done': True, 'done_reason': 'load',
+                                     'load_duration': load_duration})
+                    return
+
+                stub.requests += 1
+                tokens = stub.reply.split(' ')
+                prompt_eval_count = stub.evaluate_prompt(request, tokens)
+                time.sleep(stub.delay)
+
+                def chunk(text, done, **extra):
+                    if self.path == '/api/chat':
+                        payload = {'message': {'role': 'assistant', 'content': text}}
+                    else:
+                        payload = {'response': text}
+                    return {'model': stub.model, **payload, 'done': done, **extra}
+
+                if not request.get('stream', True):
+                    time.sleep(stub.token_delay * len(tokens))
+                    self._send_json(chunk(stub.reply, True, prompt_eval_count=prompt_eval_count,
+                                          eval_count=len(tokens)))
+                    return
+
+                # Streaming NDJSON, un token per riga come Ollama
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Connection', 'close')  # Nessuna lunghezza: la fine è la chiusura
+                self.end_headers()
+                self.close_connection = True
+                for i, token in enumerate(tokens):
+                    self.wfile.write(json.dumps(chunk(token if i == 0 else ' ' + token, False)).encode() + b'\n')
+                    self.wfile.flush()
+                    time.sleep(stub.token_delay)
+                self.wfile.write(json.dumps(chunk('', True, prompt_eval_count=prompt_eval_count,
+                                                  eval_count=len(tokens))).encode() + b'\n')
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -1,111 +1,337 @@
+"""
+Configurazione di Jarvis: oggetto Settings tipizzato, caricato al primo uso
+
+L'import di questo modulo non ha effetti collaterali (niente .env, rete o
+PyAudio): i valori si leggono da ambiente e .env alla prima richiesta.
+I moduli continuano a usare `from config.settings import DEBUG, ...`
+(risolto da `__getattr__` sul Settings corrente); `get_settings()`
+restituisce l'oggetto completo. Le sovrascritture valgono per processo
+(`configure_settings`, da chiamare prima di importare i componenti) o per
+sessione (`override_settings`, letto solo da chi usa `get_settings()`).
+"""
+
 import os
-from dotenv import load_dotenv
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, fields, replace
+from types import MappingProxyType
+from typing import Optional, Tuple
 
-# Carica le variabili d'ambiente dal file .env
-load_dotenv()
 
-# Configurazione Ollama
-OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
-OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama3.2:1b')  # Modello leggero
+def _bool(value):
+    return value.lower() == 'true'
 
-# Configurazione Whisper
-WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')  # tiny, base, small, medium, large
-WHISPER_LANGUAGE = 'it'  # Italiano
 
+def _optional_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None  # Auto-selezione
+
+
+def _env(name, default, cast=None):
+    """Campo sovrascrivibile dalla variabile d'ambiente `name`"""
+    return field(default=default, metadata={'env': name, 'cast': cast})
+
+
+def _mapping(value):
+    """Dizionario di sola lettura come valore di default"""
+    return field(default_factory=lambda: MappingProxyType(value))
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Configurazione Ollama
+    OLLAMA_HOST: str = _env('OLLAMA_HOST', 'http://localhost:11434')
+    OLLAMA_MODEL: str = _env('OLLAMA_MODEL', 'llama3.2:1b')  # Modello leggero
+    OLLAMA_REQUEST_TIMEOUT: float = _env('OLLAMA_REQUEST_TIMEOUT', 30)  # Secondi massimi per una risposta
+    OLLAMA_MAX_CONNECTIONS: int = 4  # Connessioni persistenti per event loop
+    OLLAMA_KEEP_ALIVE: str = _env('OLLAMA_KEEP_ALIVE', '-1')  # Modello in memoria: '30m', secondi, negativo = sempre
+    OLLAMA_PREWARM: bool = _env('OLLAMA_PREWARM', True)  # Carica il modello all'avvio, prima del primo comando
+    OLLAMA_LOAD_TIMEOUT: float = 120  # Secondi massimi per caricare un modello
+    OLLAMA_UNLOAD_PREVIOUS: bool = _env('OLLAMA_UNLOAD_PREVIOUS', True)  # Dopo un cambio scarica il precedente
+    LLM_STREAMING: bool = _env('LLM_STREAMING', True)  # Risposta in streaming, pronunciata frase per frase
+    CONVERSATION_ENABLED: bool = _env('CONVERSATION_ENABLED', True)  # Cronologia multi-turno
+    CONVERSATION_MAX_TOKENS: int = _env('CONVERSATION_MAX_TOKENS', 1024)  # Oltre, i turni più vecchi vengono riassunti
+    CONVERSATION_IDLE_RESET: float = 300  # Secondi di silenzio dopo cui la conversazione riparte da zero
+    RESPONSE_CACHE_ENABLED: bool = _env('RESPONSE_CACHE_ENABLED', True)  # Risposte memorizzate per domande ricorrenti
+    RESPONSE_CACHE_SIZE: int = 256  # Voci massime (LRU)
+    RESPONSE_CACHE_TTL: float = 3600  # Secondi di validità di default
+    RESPONSE_CACHE_SIMILARITY: float = 0.92  # Similarità coseno minima tra domande
+    RESPONSE_CACHE_EMBED_MODEL: str = _env('RESPONSE_CACHE_EMBED_MODEL', 'nomic-embed-text')  # '' = solo confronto esatto
+
+    # Configurazione Whisper
+    WHISPER_MODEL: str = _env('WHISPER_MODEL', 'base')  # tiny, base, small, medium, large
+    WHISPER_LANGUAGE: str = 'it'  # Italiano
+    WHISPER_PRECISION: str = _env('WHISPER_PRECISION', 'fp32')  # fp32, int8 (quantizzato per CPU), fp16 (solo GPU)
+    WHISPER_CACHE_PATH: str = _env('WHISPER_CACHE_PATH', 'models_cache')  # Modelli convertiti/quantizzati
+    WHISPER_MMAP_CACHE: bool = _env('WHISPER_MMAP_CACHE', True)  # Pesi in cache mappati in memoria (torch >= 2.1)
+    WHISPER_FAST_DECODE: bool = _env('WHISPER_FAST_DECODE', True)  # Decodifica diretta (l'encoder elabora sempre 30 s)
+    WHISPER_BEAM_SIZE: int = _env('WHISPER_BEAM_SIZE', 1)  # 1 = greedy
+    WHISPER_COMMAND_MAX_TOKENS: int = 96  # Token massimi per comando
+    WHISPER_FAST_PATH_MAX_SECONDS: float = 30  # Oltre questa durata si usa transcribe()
+    WHISPER_NO_SPEECH_THRESHOLD: float = 0.5  # Probabilità "nessun parlato" oltre cui scartare
+    WHISPER_LOGPROB_THRESHOLD: float = -1.0  # Log-probabilità media sotto cui il risultato è incerto
+
+    # Configurazione Audio Migliorata
+    MICROPHONE_INDEX: Optional[int] = _env('MICROPHONE_INDEX', None, _optional_int)  # None = auto-selezione
+    SAMPLE_RATE: int = 16000
+    CHUNK_SIZE: int = 1024
+
+    # Configurazione Speech Recognition Ottimizzata
+    SPEECH_TIMEOUT: float = 1.5  # Secondi di silenzio prima di processare (ridotto)
+    SPEECH_PHRASE_TIMEOUT: float = 8  # Timeout massimo per una frase (aumentato)
+    MINIMUM_AUDIO_LENGTH: float = 0.5  # Secondi minimi di audio per processare (ridotto)
+
+    # Configurazione Text-to-Speech
+    TTS_RATE: int = 180  # Velocità della voce (parole per minuto) - leggermente più veloce
+    TTS_VOLUME: float = 0.9  # Volume (0.0 - 1.0) - più alto
+    TTS_VOICE: int = 0  # Indice voce (0 = prima voce disponibile)
+    TTS_ENABLED: bool = _env('TTS_ENABLED', True)  # False: risposte solo a video (headless)
+
+    # Parole di attivazione (tutte lowercase)
+    WAKE_WORDS: Tuple[str, ...] = ("jarvis", "assistente", "casco", "computer", "hey jarvis")
+
+    # Configurazione Keyword Spotting (filtro leggero prima di Whisper)
+    WAKE_WORD_SPOTTER_ENABLED: bool = _env('WAKE_WORD_SPOTTER_ENABLED', True)
+    WAKE_WORD_TEMPLATES_PATH: str = 'wake_word_templates'  # <cartella>/<wake word>/*.wav
+    WAKE_WORD_SPOTTER_THRESHOLD: float = 0.35  # Costo DTW massimo (distanza coseno media)
+    WAKE_WORD_SPOTTER_VERIFY: bool = False  # Conferma con Whisper dopo il rilevamento
+    WAKE_WORD_SPOTTER_CONFIG: MappingProxyType = _mapping({
+        # Per ogni voce di WAKE_WORDS: 'enabled' e 'threshold' specifici
+        "jarvis": {'threshold': 0.35},
+        "hey jarvis": {'threshold': 0.30},
+        "assistente": {'threshold': 0.35},
+        "casco": {'threshold': 0.30},
+        "computer": {'threshold': 0.35},
+    })
+
+    # Configurazione Monitoraggio Vocale Intelligente
+    VOICE_DETECTION_THRESHOLD: int = 300  # Soglia volume per rilevare voce (più sensibile)
+    VOICE_CHUNKS_NEEDED: int = 3  # Chunks consecutivi per confermare voce
+    SILENCE_CHUNKS_MAX: int = 15  # Chunks silenzio prima di fermare registrazione
+    SPECULATIVE_ENDPOINTING: bool = _env('SPECULATIVE_ENDPOINTING', True)  # Trascrive alla prima pausa
+    SPECULATIVE_SILENCE_CHUNKS: int = 4  # Chunks di silenzio che avviano la trascrizione speculativa
+    COMMAND_TIMEOUT: float = 10  # Secondi timeout per comando dopo wake word
+
+    # Configurazione Voice Activity Detection
+    VAD_ENGINE: str = _env('VAD_ENGINE', 'spectral')  # 'spectral' (feature spettrali) o 'rms' (solo volume)
+    VAD_FRAME_SIZE: int = 256  # Campioni per frame di analisi (16 ms)
+    VAD_SPEECH_BAND: Tuple[int, int] = (100, 4000)  # Banda vocale (Hz)
+    VAD_ENERGY_RATIO: float = 3.0  # Energia minima rispetto al rumore di fondo stimato
+    VAD_FLATNESS_MAX: float = 0.35  # Piattezza spettrale massima (rumore a banda larga ~0.6)
+    VAD_BAND_RATIO_MIN: float = 0.6  # Frazione minima di energia nella banda vocale
+    VAD_ZCR_MAX: float = 0.35  # Attraversamenti dello zero massimi per campione
+    VAD_HANGOVER_CHUNKS: int = 2  # Chunk di voce mantenuti dopo l'ultimo frame vocale
+
+    # Configurazione Trascrizione Streaming
+    STREAMING_TRANSCRIPTION: bool = _env('STREAMING_TRANSCRIPTION', False)
+    STREAMING_STEP_SECONDS: float = 0.5  # Audio nuovo prima di rilanciare Whisper
+    STREAMING_WINDOW_SECONDS: float = 6  # Finestra massima di audio non confermato
+
+    # Configurazione generale
+    DEBUG: bool = _env('DEBUG', True)
+    AUTO_DOWNLOAD_MODELS: bool = True  # Scarica automaticamente modelli se mancanti
+
+    # Configurazione Performance
+    AUDIO_BUFFER_SIZE: float = 10  # Secondi di buffer audio
+    AUDIO_SOURCE: str = _env('AUDIO_SOURCE', 'device')  # device[:indice], wav:<file|cartella>, tcp:[host:]porta, noise
+    AUDIO_SOURCE_SPEED: float = _env('AUDIO_SOURCE_SPEED', 1.0)  # Replay file: 1 tempo reale, 0 massima velocità
+    AUDIO_CAPTURE_BACKEND: str = _env('AUDIO_CAPTURE_BACKEND', 'callback')  # callback (PortAudio) o blocking (thread con stream.read)
+    TRANSCRIPTION_THREADS: int = _env('TRANSCRIPTION_THREADS', 1)  # Worker di trascrizione (1 = sequenziale)
+    TRANSCRIPTION_QUEUE_SIZE: int = 4  # Enunciati massimi in attesa di trascrizione
+    TRANSCRIPTION_QUEUE_POLICY: str = _env('TRANSCRIPTION_QUEUE_POLICY', 'drop_oldest')  # drop_oldest, drop_newest, coalesce
+    STT_BACKEND: str = _env('STT_BACKEND', 'inprocess')  # inprocess, process (Whisper in processi separati, fuori dal GIL)
+    STT_WORKERS: int = _env('STT_WORKERS', 1)  # Processi Whisper (con più worker alzare anche TRANSCRIPTION_THREADS)
+    STT_MAX_RESTARTS: int = 5  # Riavvii consecutivi falliti prima di arrendersi
+    STT_LOAD_TIMEOUT: float = 300  # Secondi massimi per il caricamento del modello in un worker
+    STT_REQUEST_TIMEOUT: float = 60  # Secondi massimi per una trascrizione
+
+    # Configurazione Filtri Audio
+    ENABLE_AUDIO_PREPROCESSING: bool = True  # Abilita preprocessing audio
+    HIGH_PASS_FREQUENCY: float = 300  # Frequenza filtro passa-alto (Hz)
+    HIGH_PASS_ORDER: int = 3  # Ordine del filtro Butterworth
+    NORMALIZATION_TARGET: float = 0.8  # Picco dopo la normalizzazione dell'enunciato
+    NOISE_REDUCTION_ENABLED: bool = True  # Abilita riduzione rumore
+
+    # Configurazione WebSocket
+    WEBSOCKET_HOST: str = '0.0.0.0'
+    WEBSOCKET_PORT: int = 8765
+    WEBSOCKET_PING_INTERVAL: float = 20
+    WEBSOCKET_PING_TIMEOUT: float = 10
+
+    # Configurazione Server Mobile
+    MOBILE_SERVER_HOST: str = '0.0.0.0'
+    MOBILE_SERVER_PORT: int = 8766
+
+    # Configurazione Avanzata per Debug
+    SAVE_AUDIO_RECORDINGS: bool = _env('SAVE_AUDIO_RECORDINGS', False)
+    AUDIO_RECORDINGS_PATH: str = 'recordings'  # Cartella per salvare registrazioni
+    TRACING_ENABLED: bool = _env('TRACING_ENABLED', True)  # Timeline delle fasi per enunciato
+    TRACE_HISTORY: int = 50  # Tracce complete tenute in memoria
+    TRACE_EXPORT_PATH: str = _env('TRACE_EXPORT_PATH', 'traces/jarvis_trace.json')  # Export Chrome trace all'arresto
+
+    # Configurazione Sistema
+    MAX_CONSECUTIVE_ERRORS: int = 5  # Errori consecutivi prima di reset
+    ERROR_RECOVERY_DELAY: float = 2  # Secondi di attesa dopo errore
+
+    # Messaggi di Sistema
+    WAKE_CONFIRMATION_MESSAGES: Tuple[str, ...] = ("Sì?", "Dimmi", "Ti ascolto", "Comando?", "Sono qui")
+    ERROR_MESSAGES: MappingProxyType = _mapping({
+        'audio_error': "Problema con l'audio, riprova.",
+        'ai_error': "Errore del sistema AI, riprova.",
+        'network_error': "Problema di connessione, riprova.",
+        'timeout_error': "Tempo scaduto, riprova.",
+        'generic_error': "Si è verificato un errore, riprova."
+    })
+    SUCCESS_SOUNDS: MappingProxyType = _mapping({
+        'wake_word': {'frequency': 1200, 'duration': 0.2},
+        'command_complete': {'frequency': 800, 'duration': 0.2},
+        'system_ready': {'frequency': 1000, 'duration': 0.3},
+        'error': {'frequency': 400, 'duration': 0.5}
+    })
+
+    @classmethod
+    def from_env(cls, environ=None, **overrides):
+        """Valori di default, sovrascritti dalle variabili d'ambiente e poi da `overrides`"""
+        environ = os.environ if environ is None else environ
+        values = {}
+        for f in fields(cls):
+            name = f.metadata.get('env')
+            if name is None or name not in environ:
+                continue
+            cast = f.metadata.get('cast') or (_bool if f.type is bool else f.type)
+            try:
+                values[f.name] = cast(environ[name])
+            except (TypeError, ValueError):
+                raise ValueError(f"Valore non valido per {name}: {environ[name]!r}")
+        values.update(overrides)
+        return cls(**values)
+
+    def with_overrides(self, **changes):
+        """Copia con alcuni valori cambiati (l'oggetto originale non cambia)"""
+        return replace(self, **changes)
+
+    def validate(self):
+        """
+        Controlli locali (nessun accesso a rete o dispositivi)
+
+        Returns:
+            list[str]: problemi trovati
+        """
+        choices = {
+            'WHISPER_PRECISION': ('fp32', 'int8', 'fp16'),
+            'VAD_ENGINE': ('spectral', 'rms'),
+            'AUDIO_CAPTURE_BACKEND': ('callback', 'blocking'),
+            'TRANSCRIPTION_QUEUE_POLICY': ('drop_oldest', 'drop_newest', 'coalesce'),
+            'STT_BACKEND': ('inprocess', 'process'),
+        }
+        problems = [
+            f"{name}={getattr(self, name)!r} non valido (validi: {', '.join(valid)})"
+            for name, valid in choices.items() if getattr(self, name) not in valid
+        ]
+        for name in ('TRANSCRIPTION_THREADS', 'STT_WORKERS', 'WHISPER_BEAM_SIZE'):
+            if getattr(self, name) < 1:
+                problems.append(f"{name} deve essere almeno 1")
+        if self.AUDIO_SOURCE_SPEED < 0:
+            problems.append("AUDIO_SOURCE_SPEED non può essere negativo")
+        return problems
+
+
+_settings = None
+_settings_lock = threading.Lock()
+_session_settings = ContextVar('jarvis_settings', default=None)
+
+
+def _load_dotenv():
+    """Variabili dal file .env (python-dotenv è facoltativo)"""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def get_settings():
+    """Impostazioni correnti: quelle della sessione se presenti, altrimenti quelle del processo"""
+    session = _session_settings.get()
+    if session is not None:
+        return session
+
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _load_dotenv()
+                _settings = Settings.from_env()
+    return _settings
+
+
+def configure_settings(**overrides):
+    """
+    Sovrascrive le impostazioni del processo (riga di comando, benchmark)
+
+    Va chiamata prima di importare i componenti: chi ha già fatto
+    `from config.settings import X` conserva il valore letto allora.
+    """
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _load_dotenv()
+            _settings = Settings.from_env(**overrides)
+        else:
+            _settings = _settings.with_overrides(**overrides)
+    return _settings
+
+
+@contextmanager
+def override_settings(**overrides):
+    """Impostazioni diverse per il blocco `with` (thread o task asyncio corrente)"""
+    token = _session_settings.set(get_settings().with_overrides(**overrides))
+    try:
+        yield _session_settings.get()
+    finally:
+        _session_settings.reset(token)
+
+
+_FIELD_NAMES = None
 
-# Configurazione Audio Migliorata
-def get_microphone_index():
-    """Ottieni indice microfono da configurazione o auto-selezione"""
-    env_mic = os.getenv('MICROPHONE_INDEX')
-    if env_mic is not None:
-        try:
-            return int(env_mic)
-        except ValueError:
-            pass
-    return None  # Auto-selezione
-
-
-MICROPHONE_INDEX = get_microphone_index()
-SAMPLE_RATE = 16000
-CHUNK_SIZE = 1024
-
-# Configurazione Speech Recognition Ottimizzata
-SPEECH_TIMEOUT = 1.5  # Secondi di silenzio prima di processare (ridotto)
-SPEECH_PHRASE_TIMEOUT = 8  # Timeout massimo per una frase (aumentato)
-MINIMUM_AUDIO_LENGTH = 0.5  # Secondi minimi di audio per processare (ridotto)
-
-# Configurazione Text-to-Speech
-TTS_RATE = 180  # Velocità della voce (parole per minuto) - leggermente più veloce
-TTS_VOLUME = 0.9  # Volume (0.0 - 1.0) - più alto
-TTS_VOICE = 0  # Indice voce (0 = prima voce disponibile)
-
-# Parole di attivazione (tutte lowercase)
-WAKE_WORDS = ["jarvis", "assistente", "casco", "computer", "hey jarvis"]
-
-# Configurazione Monitoraggio Vocale Intelligente
-VOICE_DETECTION_THRESHOLD = 300  # Soglia volume per rilevare voce (più sensibile)
-VOICE_CHUNKS_NEEDED = 3  # Chunks consecutivi per confermare voce
-SILENCE_CHUNKS_MAX = 15  # Chunks silenzio prima di fermare registrazione
-COMMAND_TIMEOUT = 10  # Secondi timeout per comando dopo wake word
-
-# Configurazione generale
-DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
-AUTO_DOWNLOAD_MODELS = True  # Scarica automaticamente modelli se mancanti
-
-# Configurazione Performance
-AUDIO_BUFFER_SIZE = 10  # Secondi di buffer audio
-TRANSCRIPTION_THREADS = 1  # Thread per trascrizione (1 = sequenziale)
-
-# Configurazione Filtri Audio
-ENABLE_AUDIO_PREPROCESSING = True  # Abilita preprocessing audio
-HIGH_PASS_FREQUENCY = 300  # Frequenza filtro passa-alto (Hz)
-NOISE_REDUCTION_ENABLED = True  # Abilita riduzione rumore
-
-# Configurazione WebSocket
-WEBSOCKET_HOST = '0.0.0.0'
-WEBSOCKET_PORT = 8765
-WEBSOCKET_PING_INTERVAL = 20
-WEBSOCKET_PING_TIMEOUT = 10
-
-# Configurazione Server Mobile
-MOBILE_SERVER_HOST = '0.0.0.0'
-MOBILE_SERVER_PORT = 8766
-
-# Configurazione Avanzata per Debug
-SAVE_AUDIO_RECORDINGS = os.getenv('SAVE_AUDIO_RECORDINGS', 'False').lower() == 'true'
-AUDIO_RECORDINGS_PATH = 'recordings'  # Cartella per salvare registrazioni
-
-# Configurazione Sistema
-MAX_CONSECUTIVE_ERRORS = 5  # Errori consecutivi prima di reset
-ERROR_RECOVERY_DELAY = 2  # Secondi di attesa dopo errore
-
-# Messaggi di Sistema
-WAKE_CONFIRMATION_MESSAGES = [
-    "Sì?", "Dimmi", "Ti ascolto", "Comando?", "Sono qui"
-]
 
-ERROR_MESSAGES = {
-    'audio_error': "Problema con l'audio, riprova.",
-    'ai_error': "Errore del sistema AI, riprova.",
-    'network_error': "Problema di connessione, riprova.",
-    'timeout_error': "Tempo scaduto, riprova.",
-    'generic_error': "Si è verificato un errore, riprova."
-}
+def __getattr__(name):
+    """`from config.settings import DEBUG` legge il campo dal Settings corrente"""
+    global _FIELD_NAMES
+    if _FIELD_NAMES is None:
+        _FIELD_NAMES = frozenset(f.name for f in fields(Settings))
+    if name in _FIELD_NAMES:
+        return getattr(get_settings(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-SUCCESS_SOUNDS = {
-    'wake_word': {'frequency': 1200, 'duration': 0.2},
-    'command_complete': {'frequency': 800, 'duration': 0.2},
-    'system_ready': {'frequency': 1000, 'duration': 0.3},
-    'error': {'frequency': 400, 'duration': 0.5}
-}
+
+def __dir__():
+    return sorted(set(globals()) | {f.name for f in fields(Settings)})
 
 
 # Funzioni Helper
-def get_best_microphone():
-    """Trova il microfono migliore disponibile (funzione standalone)"""
+def get_microphone_index():
+    """Ottieni indice microfono da configurazione o auto-selezione"""
+    return get_settings().MICROPHONE_INDEX
+
+
+def get_best_microphone(audio=None):
+    """
+    Trova il microfono migliore disponibile
+
+    Args:
+        audio (pyaudio.PyAudio | None): istanza esistente da riusare; se assente
+            ne viene creata (e chiusa) una temporanea
+    """
+    debug = get_settings().DEBUG
     try:
         import pyaudio
-        audio = pyaudio.PyAudio()
+        owns_audio = audio is None
+        if owns_audio:
+            audio = pyaudio.PyAudio()
 
         # Priorità microfoni (dal migliore al peggiore)
         preferred_keywords = [
@@ -148,7 +374,7 @@ def get_best_microphone():
                         score -= 5
                         break
 
-                if DEBUG:
+                if debug:
                     print(f"[MIC] {i}: {info['name']} - Score: {score}")
 
                 if score > best_score:
@@ -158,60 +384,71 @@ def get_best_microphone():
             except:
                 continue
 
-        audio.terminate()
+        if owns_audio:
+            audio.terminate()
 
         if best_mic is not None:
-            if DEBUG:
+            if debug:
                 print(f"[MIC] Microfono auto-selezionato: {best_mic}")
             return best_mic
         else:
-            if DEBUG:
+            if debug:
                 print("[MIC] Uso microfono di default")
             return None
 
     except Exception as e:
-        if DEBUG:
+        if debug:
             print(f"[MIC] Errore selezione automatica: {e}")
         return None
 
 
-def validate_settings():
-    """Valida le impostazioni e mostra avvisi se necessario"""
-    if DEBUG:
-        print("[SETTINGS] Validazione configurazione...")
+def validate_settings(settings=None, check_network=True):
+    """
+    Valida le impostazioni e mostra avvisi se necessario
+
+    Non viene più eseguita all'import: main la lancia in background
+    durante l'avvio. Il controllo di Ollama fa una richiesta HTTP.
 
-        # Controlla Ollama
+    Returns:
+        list[str]: problemi trovati
+    """
+    settings = settings or get_settings()
+    problems = settings.validate()
+
+    if check_network:
         try:
             import requests
-            response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=2)
-            if response.status_code == 200:
-                print("[SETTINGS] ✅ Ollama raggiungibile")
-            else:
-                print("[SETTINGS] ⚠️ Ollama non risponde correttamente")
-        except:
-            print("[SETTINGS] ❌ Ollama non raggiungibile")
+            response = requests.get(f"{settings.OLLAMA_HOST}/api/tags", timeout=2)
+            if response.status_code != 200:
+                problems.append("Ollama non risponde correttamente")
+        except Exception:
+            problems.append("Ollama non raggiungibile")
+
+    if settings.DEBUG:
+        print("[SETTINGS] Validazione configurazione...")
+        for problem in problems:
+            print(f"[SETTINGS] ⚠️ {problem}")
 
         # Controlla microfono
-        if MICROPHONE_INDEX is not None:
-            print(f"[SETTINGS] ✅ Microfono configurato: {MICROPHONE_INDEX}")
+        if settings.MICROPHONE_INDEX is not None:
+            print(f"[SETTINGS] ✅ Microfono configurato: {settings.MICROPHONE_INDEX}")
         else:
             print("[SETTINGS] ⚠️ Microfono auto-selezione")
 
         # Controlla Whisper model
-        if WHISPER_MODEL in ['tiny', 'base', 'small']:
-            print(f"[SETTINGS] ✅ Modello Whisper ottimale: {WHISPER_MODEL}")
-        elif WHISPER_MODEL in ['medium', 'large']:
-            print(f"[SETTINGS] ⚠️ Modello Whisper pesante: {WHISPER_MODEL} (potrebbe essere lento)")
+        if settings.WHISPER_MODEL in ['tiny', 'base', 'small']:
+            print(f"[SETTINGS] ✅ Modello Whisper ottimale: {settings.WHISPER_MODEL}")
+        elif settings.WHISPER_MODEL in ['medium', 'large']:
+            print(f"[SETTINGS] ⚠️ Modello Whisper pesante: {settings.WHISPER_MODEL} (potrebbe essere lento)")
 
         print("[SETTINGS] Configurazione validata")
 
+    return problems
 
-# Auto-validazione all'import se debug attivo
-if DEBUG:
-    validate_settings()
 
 # Export delle configurazioni principali
 __all__ = [
+    'Settings', 'get_settings', 'configure_settings', 'override_settings',
     'OLLAMA_HOST', 'OLLAMA_MODEL',
     'WHISPER_MODEL', 'WHISPER_LANGUAGE',
     'MICROPHONE_INDEX', 'SAMPLE_RATE', 'CHUNK_SIZE',
@@ -219,5 +456,5 @@ __all__ = [
     'TTS_RATE', 'TTS_VOLUME', 'TTS_VOICE',
     'WAKE_WORDS', 'DEBUG',
     'VOICE_DETECTION_THRESHOLD', 'VOICE_CHUNKS_NEEDED', 'SILENCE_CHUNKS_MAX',
-    'COMMAND_TIMEOUT', 'get_best_microphone'
-]
\ No newline at end of file
+    'COMMAND_TIMEOUT', 'get_best_microphone', 'validate_settings'
+]
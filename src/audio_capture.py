@@ -0,0 +1,293 @@
+"""
+Hub di cattura audio condiviso: un solo dispositivo aperto, tanti consumatori
+"""
+
+import threading
+import time
+from config.settings import DEBUG, SAMPLE_RATE, CHUNK_SIZE, AUDIO_BUFFER_SIZE
+from ring_buffer import AudioRingBuffer
+from audio_sources import create_audio_source, get_pyaudio, terminate_pyaudio
+from metrics import CAPTURE_XRUNS, CAPTURE_DEFICIT, dropped_samples, queue_depth
+
+
+class AudioSubscription:
+    def __init__(self, hub, name, cursor):
+        """
+        Consumatore dell'hub con un proprio cursore sul buffer condiviso
+
+        Ogni consumatore legge al proprio ritmo; se resta indietro più della
+        capacità del buffer salta all'audio più vecchio ancora disponibile e
+        conta i campioni persi in `overrun_samples`.
+        """
+        self.hub = hub
+        self.name = name
+        self.cursor = cursor
+        self.last_start = cursor  # Cursore di inizio dell'ultimo blocco letto
+        self.overrun_samples = 0
+        self.is_open = True
+        self.lag_metric = queue_depth(f'capture_{name}')
+        self.dropped_metric = dropped_samples(name)
+
+    def read(self, frames=CHUNK_SIZE, timeout=None):
+        """
+        Restituisce i prossimi `frames` campioni come vista sul buffer condiviso
+
+        Returns:
+            np.ndarray | None: None se la cattura si è fermata o al timeout
+        """
+        ring = self.hub.ring
+        with self.hub.condition:
+            while self.is_open and self.hub.is_running and ring.write_pos < self.cursor + frames:
+                if not self.hub.condition.wait(timeout):
+                    return None
+            if not self.is_open or ring.write_pos < self.cursor + frames:
+                return None
+
+        if self.cursor < ring.oldest_pos:
+            # Consumatore troppo lento: l'audio è già stato sovrascritto
+            skipped = ring.oldest_pos - self.cursor
+            self.overrun_samples += skipped
+            self.dropped_metric.inc(skipped)
+            self.cursor = ring.oldest_pos
+            if DEBUG:
+                print(f"[CAPTURE] ⚠️ '{self.name}' in ritardo, persi {skipped} campioni")
+
+        self.last_start = self.cursor
+        view = ring.read(self.cursor, self.cursor + frames)
+        self.cursor += frames
+        self.lag_metric.set(ring.write_pos - self.cursor)
+        return view
+
+    def skip_to_latest(self):
+        """Scarta l'audio arretrato e riparte dal presente"""
+        self.cursor = self.hub.ring.write_pos
+
+    def close(self):
+        """Rimuove il consumatore dall'hub"""
+        self.is_open = False
+        self.lag_metric.set(0)
+        self.hub.unsubscribe(self)
+
+
+class AudioCaptureHub:
+    def __init__(self, source=None, seconds=AUDIO_BUFFER_SIZE):
+        """
+        Possiede l'unica sorgente audio del processo (di default il microfono)
+
+        I frame catturati finiscono in un AudioRingBuffer condiviso; VAD,
+        misuratore di livello, registratore, test microfono e uplink di rete
+        si iscrivono con `subscribe()` e ricevono ciascuno un proprio cursore,
+        quindi aggiungere un consumatore non riapre il dispositivo né
+        interrompe il monitoraggio. La sorgente (AUDIO_SOURCE) può essere
+        anche un file WAV, un array NumPy o un socket PCM: i consumatori non
+        vedono differenze.
+        """
+        self.source = source if source is not None else create_audio_source()
+        self.ring = AudioRingBuffer(seconds)
+        self.condition = threading.Condition()
+        self.subscriptions = []
+        self.is_running = False
+        self.dispatch_thread = None
+        self._lock = threading.Lock()
+        self._data_ready = threading.Event()
+        self._started_at = None
+        self._start_pos = 0
+
+        if DEBUG:
+            print(f"[CAPTURE] Hub audio inizializzato (sorgente: {self.source.name}, "
+                  f"microfono: {self.device_index})")
+
+    @property
+    def pyaudio(self):
+        """Istanza PyAudio condivisa (uscita audio, elenco dispositivi), None se assente"""
+        return get_pyaudio()
+
+    @property
+    def device_index(self):
+        return self.source.device_index
+
+    @property
+    def backend(self):
+        return self.source.name
+
+    def start(self):
+        """Avvia la sorgente (idempotente)"""
+        with self._lock:
+            if self.is_running:
+                return
+
+            self._data_ready.clear()
+            self.is_running = True
+            self._started_at = time.perf_counter()
+            self._start_pos = self.ring.write_pos
+            CAPTURE_XRUNS.set_function(lambda: self.source.xruns + self.source.input_overflows)
+            CAPTURE_DEFICIT.set_function(self.capture_deficit)
+
+            self.dispatch_thread = threading.Thread(target=self._dispatch_loop, name="audio-capture", daemon=True)
+            self.dispatch_thread.start()
+            try:
+                self.source.start(self)
+            except Exception:
+                self.is_running = False
+                self._data_ready.set()
+                raise
+
+        if DEBUG:
+            print("[CAPTURE] 🎧 Cattura audio avviata")
+
+    def publish(self, samples, block=False):
+        """
+        Chiamato dalla sorgente (un solo thread): scrive nel buffer e segnala
+
+        Args:
+            block (bool): attende che il consumatore più lento abbia spazio
+                (sorgenti più veloci del tempo reale, nessun campione perso)
+        """
+        if block:
+            n = len(samples) if not isinstance(samples, (bytes, bytearray)) else len(samples) // 2
+            while self.is_running and self._max_lag() + n > self.ring.capacity - CHUNK_SIZE:
+                time.sleep(0.005)
+        self.ring.write(samples)
+        self._data_ready.set()
+
+    def source_ended(self):
+        """Chiamato dalla sorgente quando non produce più audio"""
+        if DEBUG:
+            print(f"[CAPTURE] Sorgente {self.source.name} terminata")
+        self.is_running = False
+        self._data_ready.set()
+
+    def _max_lag(self):
+        with self.condition:
+            if not self.subscriptions:
+                return 0
+            return self.ring.write_pos - min(s.cursor for s in self.subscriptions)
+
+    def _dispatch_loop(self):
+        """Sveglia i consumatori quando arriva audio (fuori dal thread della sorgente)"""
+        try:
+            while self.is_running:
+                if not self._data_ready.wait(0.5):
+                    continue
+                self._data_ready.clear()
+                with self.condition:
+                    self.condition.notify_all()
+        finally:
+            with self.condition:
+                self.is_running = False
+                self.condition.notify_all()
+
+    def subscribe(self, name, start=None):
+        """
+        Registra un nuovo consumatore
+
+        Args:
+            name (str): nome del consumatore (per log e statistiche)
+            start (int | None): cursore iniziale (default: da adesso)
+
+        Returns:
+            AudioSubscription
+        """
+        subscription = AudioSubscription(self, name, self.ring.write_pos if start is None else start)
+        with self.condition:
+            self.subscriptions.append(subscription)
+        # Dopo la registrazione: il primo consumatore non perde l'inizio della sorgente
+        self.start()
+        if DEBUG:
+            print(f"[CAPTURE] Nuovo consumatore: {name}")
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.condition:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+            self.condition.notify_all()
+
+    def get_device_info(self):
+        """Informazioni sulla sorgente in uso (formato PyAudio)"""
+        return self.source.get_device_info()
+
+    def capture_deficit(self):
+        """
+        Campioni mancanti rispetto al tempo trascorso dall'avvio (stima)
+
+        Vale per le sorgenti in tempo reale: un valore che cresce nel tempo
+        indica frame persi; resta vicino a zero (latenza di un chunk) se la
+        cattura tiene il passo.
+        """
+        if not self.is_running or self._started_at is None or not self.source.realtime:
+            return 0
+        expected = (time.perf_counter() - self._started_at) * SAMPLE_RATE
+        captured = self.ring.write_pos - self._start_pos
+        return max(0, int(expected - captured) - CHUNK_SIZE)
+
+    def get_stats(self):
+        """Stato della cattura e dei consumatori"""
+        with self.condition:
+            stats = {
+                'running': self.is_running,
+                'samples_captured': self.ring.write_pos,
+                'deficit_samples': self.capture_deficit(),
+                'subscribers': {
+                    s.name: {'lag_samples': self.ring.write_pos - s.cursor, 'overrun_samples': s.overrun_samples}
+                    for s in self.subscriptions
+                }
+            }
+        stats.update(self.source.get_stats())
+        return stats
+
+    def stop(self):
+        """Ferma la sorgente"""
+        with self._lock:
+            self.is_running = False
+            self._data_ready.set()
+            self.source.stop()
+            if self.dispatch_thread:
+                self.dispatch_thread.join(timeout=2)
+                self.dispatch_thread = None
+        with self.condition:
+            self.condition.notify_all()
+
+    def terminate(self):
+        """Ferma la cattura e rilascia PyAudio"""
+        self.stop()
+        terminate_pyaudio()
+        if DEBUG:
+            print("[CAPTURE] Hub audio chiuso")
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_capture_hub():
+    """Restituisce l'hub di cattura condiviso del processo, creandolo al primo uso"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = AudioCaptureHub()
+        return _hub
+
+
+def configure_capture_hub(source):
+    """
+    Crea l'hub condiviso con una sorgente specifica (da chiamare prima dei componenti)
+
+    Returns:
+        AudioCaptureHub
+    """
+    global _hub
+    with _hub_lock:
+        if _hub is not None:
+            raise RuntimeError("Hub di cattura già creato")
+        _hub = AudioCaptureHub(source)
+        return _hub
+
+
+def shutdown_capture_hub():
+    """Chiude l'hub condiviso (se è stato creato)"""
+    global _hub
+    with _hub_lock:
+        if _hub is not None:
+            _hub.terminate()
+            _hub = None
@@ -1,21 +1,30 @@
-import pyaudio
 import wave
 import threading
 import time
+import numpy as np
 from config.settings import SAMPLE_RATE, CHUNK_SIZE, DEBUG
+from ring_buffer import AudioRingBuffer
+from audio_capture import get_capture_hub
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None  # Nessuna uscita audio (headless, CI)
 
 
 class AudioManager:
     def __init__(self):
         """Inizializza il gestore audio per controllo avanzato"""
-        self.audio = pyaudio.PyAudio()
+        # Cattura e PyAudio condivisi con il resto del sistema
+        self.capture_hub = get_capture_hub()
+        self.audio = self.capture_hub.pyaudio
         self.is_recording = False
         self.is_playing = False
         self.recording_thread = None
         self.playback_thread = None
 
-        # Buffer per registrazione
-        self.audio_buffer = []
+        # Buffer circolare preallocato (ultimi 10 secondi di audio)
+        self.audio_buffer = AudioRingBuffer(seconds=10)
 
         if DEBUG:
             print("[AUDIO] AudioManager inizializzato")
@@ -23,7 +32,7 @@ class AudioManager:
 
     def _list_audio_devices(self):
         """Lista tutti i dispositivi audio disponibili"""
-        if not DEBUG:
+        if not DEBUG or self.audio is None:
             return
 
         print("\n[AUDIO] Dispositivi audio disponibili:")
@@ -54,22 +63,16 @@ class AudioManager:
             if DEBUG:
                 print(f"[AUDIO] Test microfono per {duration} secondi...")
 
-            # Configurazione stream
-            stream = self.audio.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=SAMPLE_RATE,
-                input=True,
-                frames_per_buffer=CHUNK_SIZE
-            )
+            subscription = self.capture_hub.subscribe('mic_test')
 
             frames = []
             for i in range(0, int(SAMPLE_RATE / CHUNK_SIZE * duration)):
-                data = stream.read(CHUNK_SIZE)
-                frames.append(data)
+                data = subscription.read(CHUNK_SIZE, timeout=1.0)
+                if data is None:
+                    break
+                frames.append(data.tobytes())
 
-            stream.stop_stream()
-            stream.close()
+            subscription.close()
 
             # Salva file di test
             self._save_wav_file("test_microphone.wav", frames)
@@ -86,7 +89,7 @@ class AudioManager:
         try:
             wf = wave.open(filename, 'wb')
             wf.setnchannels(1)
-            wf.setsampwidth(self.audio.get_sample_size(pyaudio.paInt16))
+            wf.setsampwidth(2)  # int16
             wf.setframerate(SAMPLE_RATE)
             wf.writeframes(b''.join(frames))
             wf.close()
@@ -100,32 +103,23 @@ class AudioManager:
             return
 
         self.is_recording = True
-        self.audio_buffer = []
 
         def record_audio():
+            subscription = None
             try:
-                stream = self.audio.open(
-                    format=pyaudio.paInt16,
-                    channels=1,
-                    rate=SAMPLE_RATE,
-                    input=True,
-                    frames_per_buffer=CHUNK_SIZE
-                )
+                subscription = self.capture_hub.subscribe('recorder')
 
                 if DEBUG:
                     print("[AUDIO] Registrazione continua avviata")
 
                 while self.is_recording:
-                    data = stream.read(CHUNK_SIZE)
-                    self.audio_buffer.append(data)
-
-                    # Mantieni solo gli ultimi 10 secondi di audio
-                    max_frames = int(SAMPLE_RATE / CHUNK_SIZE * 10)
-                    if len(self.audio_buffer) > max_frames:
-                        self.audio_buffer.pop(0)
-
-                stream.stop_stream()
-                stream.close()
+                    data = subscription.read(CHUNK_SIZE, timeout=0.5)
+                    if data is None:
+                        if not self.capture_hub.is_running:
+                            break
+                        continue
+                    # Il buffer circolare sovrascrive l'audio più vecchio di 10 secondi
+                    self.audio_buffer.write(data)
 
                 if DEBUG:
                     print("[AUDIO] Registrazione continua fermata")
@@ -134,6 +128,9 @@ class AudioManager:
                 if DEBUG:
                     print(f"[AUDIO] Errore registrazione continua: {e}")
                 self.is_recording = False
+            finally:
+                if subscription is not None:
+                    subscription.close()
 
         self.recording_thread = threading.Thread(target=record_audio)
         self.recording_thread.daemon = True
@@ -152,16 +149,17 @@ class AudioManager:
         Returns:
             float: Livello audio normalizzato (0.0 - 1.0)
         """
-        if not self.audio_buffer:
+        # Misura direttamente sul buffer dell'hub: non serve un thread di cattura
+        ring = self.capture_hub.ring
+        if not ring.write_pos:
             return 0.0
 
         try:
-            # Prendi l'ultimo chunk
-            import numpy as np
-            last_chunk = np.frombuffer(self.audio_buffer[-1], dtype=np.int16)
+            # Vista sull'ultimo chunk (nessuna copia)
+            last_chunk = ring.latest(CHUNK_SIZE)
 
-            # Calcola RMS (Root Mean Square)
-            rms = np.sqrt(np.mean(last_chunk ** 2))
+            # Calcola RMS (Root Mean Square) in float per evitare overflow int16
+            rms = np.sqrt(np.mean(last_chunk.astype(np.float32) ** 2))
 
             # Normalizza (valore tipico massimo ~3000)
             normalized = min(rms / 3000.0, 1.0)
@@ -181,11 +179,11 @@ class AudioManager:
             frequency (int): Frequenza del tono in Hz
             duration (float): Durata in secondi
         """
+        if self.audio is None:
+            return
 
         def play_tone():
             try:
-                import numpy as np
-
                 # Genera onda sinusoidale
                 sample_rate = 44100
                 frames = int(duration * sample_rate)
@@ -229,7 +227,7 @@ class AudioManager:
         """Pulisce le risorse audio"""
         try:
             self.stop_continuous_recording()
-            self.audio.terminate()
+            # PyAudio appartiene all'hub di cattura condiviso (shutdown_capture_hub)
             if DEBUG:
                 print("[AUDIO] Risorse audio rilasciate")
         except Exception as e:
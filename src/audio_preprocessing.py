@@ -0,0 +1,94 @@
+"""
+Preprocessing audio in streaming: filtro passa-alto con stato e normalizzazione incrementale
+"""
+
+from functools import lru_cache
+import numpy as np
+from config.settings import (
+    DEBUG, SAMPLE_RATE, ENABLE_AUDIO_PREPROCESSING, HIGH_PASS_FREQUENCY,
+    HIGH_PASS_ORDER, NORMALIZATION_TARGET
+)
+
+try:
+    from scipy import signal
+except ImportError:
+    signal = None
+
+
+@lru_cache(maxsize=8)
+def get_highpass_sos(cutoff=HIGH_PASS_FREQUENCY, sample_rate=SAMPLE_RATE, order=HIGH_PASS_ORDER):
+    """Coefficienti SOS del Butterworth passa-alto, progettati una sola volta"""
+    if signal is None:
+        return None
+    return signal.butter(order, cutoff, 'high', fs=sample_rate, output='sos')
+
+
+class StreamingPreprocessor:
+    def __init__(self, enabled=ENABLE_AUDIO_PREPROCESSING, cutoff=HIGH_PASS_FREQUENCY,
+                 order=HIGH_PASS_ORDER, target_peak=NORMALIZATION_TARGET):
+        """
+        Filtra l'audio chunk per chunk mentre arriva
+
+        Lo stato del filtro (`zi` di sosfilt) passa da un chunk al successivo,
+        quindi il risultato è identico a filtrare l'intera registrazione ma il
+        lavoro è già fatto quando l'endpointing chiude l'enunciato. Il picco
+        viene aggiornato a ogni chunk: a fine enunciato resta solo da
+        applicare il guadagno.
+        """
+        self.enabled = enabled
+        self.target_peak = target_peak
+        self.sos = get_highpass_sos(cutoff, SAMPLE_RATE, order) if enabled else None
+
+        if enabled and self.sos is None and DEBUG:
+            print("[PREPROC] Scipy non disponibile, filtro passa-alto disattivato")
+
+        self.reset()
+
+    def reset(self):
+        """Azzera lo stato del filtro (nuovo stream)"""
+        self._zi = None
+        if self.sos is not None:
+            self._zi = np.zeros((self.sos.shape[0], 2), dtype=np.float64)
+        self.segment_peak = 0.0
+
+    def process(self, chunk):
+        """
+        Converte in float32 normalizzato e filtra un chunk, aggiornando il picco
+
+        Args:
+            chunk (np.ndarray): campioni int16 o float32
+
+        Returns:
+            np.ndarray: chunk preprocessato (float32)
+        """
+        if chunk.dtype == np.int16:
+            audio_data = chunk.astype(np.float32)
+            audio_data /= 32768.0
+        else:
+            audio_data = np.array(chunk, dtype=np.float32)
+
+        if self.sos is not None:
+            audio_data, self._zi = signal.sosfilt(self.sos, audio_data, zi=self._zi)
+            audio_data = audio_data.astype(np.float32, copy=False)
+
+        if len(audio_data):
+            self.segment_peak = max(self.segment_peak, float(np.max(np.abs(audio_data))))
+        return audio_data
+
+    def begin_segment(self, preroll=None):
+        """Inizia un nuovo enunciato; `preroll` è l'audio già preprocessato che ne fa parte"""
+        self.segment_peak = float(np.max(np.abs(preroll))) if preroll is not None and len(preroll) else 0.0
+
+    def gain(self, peak=None):
+        """Guadagno di normalizzazione per il picco indicato (default: enunciato corrente)"""
+        peak = self.segment_peak if peak is None else peak
+        if not self.enabled or peak <= 0:
+            return 1.0
+        return self.target_peak / peak
+
+    def process_clip(self, audio_data):
+        """Preprocessa una registrazione completa con uno stato di filtro nuovo"""
+        self.reset()
+        audio_data = self.process(audio_data)
+        audio_data *= self.gain()
+        return audio_data
@@ -0,0 +1,438 @@
+"""
+Sorgenti audio per l'hub di cattura: microfono, file WAV, array NumPy, socket PCM
+"""
+
+import glob
+import os
+import socket
+import threading
+import time
+import wave
+import numpy as np
+from config.settings import (
+    DEBUG, SAMPLE_RATE, CHUNK_SIZE, MICROPHONE_INDEX, AUDIO_CAPTURE_BACKEND,
+    AUDIO_SOURCE, AUDIO_SOURCE_SPEED, get_best_microphone
+)
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None  # Nessun audio di sistema: restano le sorgenti file/array/socket
+
+CAPTURE_BACKENDS = ('callback', 'blocking')
+
+_pyaudio_instance = None
+_pyaudio_lock = threading.Lock()
+
+
+def get_pyaudio():
+    """Istanza PyAudio condivisa del processo (None se PyAudio non è installato)"""
+    global _pyaudio_instance
+    with _pyaudio_lock:
+        if _pyaudio_instance is None and pyaudio is not None:
+            _pyaudio_instance = pyaudio.PyAudio()
+        return _pyaudio_instance
+
+
+def terminate_pyaudio():
+    """Rilascia l'istanza PyAudio condivisa"""
+    global _pyaudio_instance
+    with _pyaudio_lock:
+        if _pyaudio_instance is not None:
+            _pyaudio_instance.terminate()
+            _pyaudio_instance = None
+
+
+class AudioSource:
+    """
+    Interfaccia comune delle sorgenti
+
+    Una sorgente produce campioni int16 mono a SAMPLE_RATE e li consegna
+    all'hub con `hub.publish()`; quando finisce chiama `hub.source_ended()`.
+    """
+
+    name = 'source'
+    realtime = True  # False: l'audio arriva più veloce del tempo reale
+    device_index = None
+
+    def __init__(self):
+        self.is_running = False
+        self.callbacks = 0
+        self.xruns = 0
+        self.input_overflows = 0
+        self.max_callback_time = 0.0
+
+    def start(self, hub):
+        raise NotImplementedError
+
+    def stop(self):
+        self.is_running = False
+
+    def get_device_info(self):
+        """Descrizione della sorgente nello stesso formato di PyAudio"""
+        return {'name': self.name, 'maxInputChannels': 1, 'defaultSampleRate': SAMPLE_RATE}
+
+    def get_stats(self):
+        return {
+            'backend': self.name,
+            'callbacks': self.callbacks,
+            'xruns': self.xruns,
+            'input_overflows': self.input_overflows,
+            'max_callback_ms': self.max_callback_time * 1000
+        }
+
+
+class PyAudioSource(AudioSource):
+    realtime = True
+
+    def __init__(self, device_index=MICROPHONE_INDEX, backend=AUDIO_CAPTURE_BACKEND):
+        """
+        Microfono di sistema via PyAudio
+
+        Backend:
+            'callback': PortAudio chiama `_on_audio` dal proprio thread; la
+                callback copia nel buffer preallocato e segnala un evento,
+                senza competere per il GIL in un ciclo di lettura Python
+            'blocking': thread dedicato con `stream.read` (comportamento storico)
+        """
+        super().__init__()
+        if backend not in CAPTURE_BACKENDS:
+            raise ValueError(f"Backend di cattura sconosciuto: {backend} (validi: {', '.join(CAPTURE_BACKENDS)})")
+
+        self.audio = get_pyaudio()
+        if self.audio is None:
+            raise RuntimeError("PyAudio non disponibile: usa AUDIO_SOURCE=wav:... o tcp:...")
+
+        self.backend = backend
+        self.name = backend
+        self.device_index = device_index
+        if self.device_index is None:
+            self.device_index = get_best_microphone(self.audio)
+
+        self._hub = None
+        self._stream = None
+        self._thread = None
+
+    def start(self, hub):
+        callback = self.backend == 'callback'
+        self._hub = hub
+        self.is_running = True
+        try:
+            self._stream = self.audio.open(
+                format=pyaudio.paInt16,
+                channels=1,
+                rate=SAMPLE_RATE,
+                input=True,
+                input_device_index=self.device_index,
+                frames_per_buffer=CHUNK_SIZE,
+                stream_callback=self._on_audio if callback else None
+            )
+        except Exception:
+            self.is_running = False
+            raise
+
+        if callback:
+            self._thread = threading.Thread(target=self._watch_stream, name="audio-device", daemon=True)
+        else:
+            self._thread = threading.Thread(target=self._read_loop, name="audio-device", daemon=True)
+        self._thread.start()
+
+    def _on_audio(self, in_data, frame_count, time_info, status_flags):
+        """Callback PortAudio: copia nel buffer preallocato e segnala, nient'altro"""
+        start = time.perf_counter()
+        if status_flags:
+            self.xruns += 1
+            if status_flags & pyaudio.paInputOverflow:
+                self.input_overflows += 1
+
+        self._hub.publish(in_data)
+        self.callbacks += 1
+
+        self.max_callback_time = max(self.max_callback_time, time.perf_counter() - start)
+        return (None, pyaudio.paContinue)
+
+    def _watch_stream(self):
+        """Backend callback: segnala all'hub se il dispositivo smette di produrre audio"""
+        while self.is_running:
+            time.sleep(0.5)
+            try:
+                if not self._stream.is_active():
+                    if DEBUG:
+                        print("[CAPTURE] Stream audio non più attivo")
+                    break
+            except Exception:
+                break
+        self._finish()
+
+    def _read_loop(self):
+        """Backend blocking: legge dal dispositivo in un thread dedicato"""
+        try:
+            while self.is_running:
+                self._hub.publish(self._stream.read(CHUNK_SIZE, exception_on_overflow=False))
+        except Exception as e:
+            if DEBUG:
+                print(f"[CAPTURE] Errore cattura: {e}")
+        self._finish()
+
+    def _finish(self):
+        was_running, self.is_running = self.is_running, False
+        if was_running:
+            self._hub.source_ended()
+
+    def stop(self):
+        self.is_running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+        if self._stream:
+            try:
+                self._stream.stop_stream()
+                self._stream.close()
+            except Exception:
+                pass
+            self._stream = None
+
+    def get_device_info(self):
+        if self.device_index is not None:
+            return self.audio.get_device_info_by_index(self.device_index)
+        return self.audio.get_default_input_device_info()
+
+
+def _to_int16(samples):
+    """Converte float [-1, 1] o int16 in int16"""
+    samples = np.asarray(samples)
+    if samples.dtype == np.int16:
+        return samples
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def _rechunk(blocks, frames=CHUNK_SIZE):
+    """Riunisce blocchi di lunghezza qualsiasi in chunk da `frames` campioni"""
+    pending = np.zeros(frames, dtype=np.int16)
+    filled = 0
+    for block in blocks:
+        block = _to_int16(block)
+        offset = 0
+        while offset < len(block):
+            n = min(frames - filled, len(block) - offset)
+            pending[filled:filled + n] = block[offset:offset + n]
+            filled += n
+            offset += n
+            if filled == frames:
+                yield pending.copy()
+                filled = 0
+    if filled:
+        pending[filled:] = 0
+        yield pending.copy()
+
+
+class ThreadedAudioSource(AudioSource):
+    def __init__(self, speed=AUDIO_SOURCE_SPEED):
+        """
+        Sorgente che produce chunk da un thread proprio
+
+        Args:
+            speed (float): 1.0 tempo reale, 4.0 quattro volte più veloce,
+                0 il più veloce possibile
+        """
+        super().__init__()
+        self.speed = float(speed)
+        self.realtime = self.speed == 1.0
+        self._thread = None
+
+    def _chunks(self):
+        """Generatore di chunk int16 da CHUNK_SIZE campioni"""
+        raise NotImplementedError
+
+    def start(self, hub):
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, args=(hub,), name=f"audio-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self, hub):
+        start = time.perf_counter()
+        sent = 0
+        try:
+            for chunk in self._chunks():
+                if not self.is_running:
+                    break
+                if self.speed > 0:
+                    delay = start + sent / (SAMPLE_RATE * self.speed) - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                # Più veloce del tempo reale: aspetta i consumatori invece di sovrascrivere
+                hub.publish(chunk, block=not self.realtime)
+                self.callbacks += 1
+                sent += len(chunk)
+        except Exception as e:
+            if DEBUG:
+                print(f"[CAPTURE] Errore sorgente {self.name}: {e}")
+        finally:
+            self.is_running = False
+            hub.source_ended()
+
+    def stop(self):
+        self.is_running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+
+class WavFileSource(ThreadedAudioSource):
+    name = 'wav'
+
+    def __init__(self, paths, speed=AUDIO_SOURCE_SPEED, gap_seconds=1.5, loop=False):
+        """
+        Riproduce file WAV (mono, 16 bit, SAMPLE_RATE) come se arrivassero dal microfono
+
+        Args:
+            paths (str | list): file o cartelle (tutti i *.wav in ordine alfabetico)
+            gap_seconds (float): silenzio dopo ogni file, così l'endpointing chiude l'enunciato
+            loop (bool): ricomincia dal primo file alla fine
+        """
+        super().__init__(speed)
+        if isinstance(paths, str):
+            paths = [paths]
+
+        self.files = []
+        for path in paths:
+            if os.path.isdir(path):
+                self.files.extend(sorted(glob.glob(os.path.join(path, '*.wav'))))
+            else:
+                self.files.append(path)
+        if not self.files:
+            raise ValueError(f"Nessun file WAV trovato in {', '.join(paths)}")
+
+        self.gap_seconds = gap_seconds
+        self.loop = loop
+        self.current_file = None
+
+    def _read_file(self, path):
+        with wave.open(path, 'rb') as wf:
+            if wf.getframerate() != SAMPLE_RATE or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+                raise ValueError(f"{path}: serve un WAV mono 16 bit a {SAMPLE_RATE} Hz")
+            return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+    def _blocks(self):
+        gap = np.zeros(int(self.gap_seconds * SAMPLE_RATE), dtype=np.int16)
+        while True:
+            for path in self.files:
+                self.current_file = path
+                if DEBUG:
+                    print(f"[CAPTURE] ▶️ {os.path.basename(path)}")
+                yield self._read_file(path)
+                yield gap
+            if not self.loop:
+                return
+
+    def _chunks(self):
+        return _rechunk(self._blocks())
+
+    def get_device_info(self):
+        info = super().get_device_info()
+        info['name'] = f"WAV: {os.path.commonpath(self.files) if len(self.files) > 1 else self.files[0]}"
+        return info
+
+
+class ArraySource(ThreadedAudioSource):
+    name = 'array'
+
+    def __init__(self, blocks, speed=0):
+        """
+        Sorgente da array NumPy (test e benchmark)
+
+        Args:
+            blocks: iterabile o generatore di array (float in [-1, 1] o int16)
+                di lunghezza qualsiasi
+        """
+        super().__init__(speed)
+        self.blocks = blocks
+
+    def _chunks(self):
+        return _rechunk(self.blocks)
+
+
+class PCMSocketSource(ThreadedAudioSource):
+    name = 'tcp'
+
+    def __init__(self, host='0.0.0.0', port=8767):
+        """
+        Server TCP che riceve PCM grezzo (int16 little endian, mono, SAMPLE_RATE)
+
+        Il ritmo lo dà chi invia; a client disconnesso si attende il successivo.
+        Esempio: `arecord -f S16_LE -r 16000 -c 1 -t raw | nc host 8767`
+        """
+        super().__init__(speed=0)
+        self.host = host
+        self.port = port
+        self.realtime = True  # Nessuna attesa dei consumatori: il mittente va in tempo reale
+        self._server = None
+
+    def _recv_exact(self, conn, buffer):
+        view = memoryview(buffer)
+        received = 0
+        while received < len(buffer) and self.is_running:
+            try:
+                n = conn.recv_into(view[received:])
+            except socket.timeout:
+                continue
+            if not n:
+                return False
+            received += n
+        return received == len(buffer)
+
+    def _chunks(self):
+        self._server = socket.create_server((self.host, self.port))
+        self._server.settimeout(0.5)
+        if DEBUG:
+            print(f"[CAPTURE] In attesa di PCM su {self.host}:{self.port}")
+
+        buffer = bytearray(CHUNK_SIZE * 2)
+        try:
+            while self.is_running:
+                try:
+                    conn, address = self._server.accept()
+                except socket.timeout:
+                    continue
+                if DEBUG:
+                    print(f"[CAPTURE] Client PCM connesso: {address[0]}")
+                with conn:
+                    conn.settimeout(0.5)
+                    while self._recv_exact(conn, buffer):
+                        yield np.frombuffer(buffer, dtype='<i2').astype(np.int16)
+        finally:
+            self._server.close()
+
+    def get_device_info(self):
+        info = super().get_device_info()
+        info['name'] = f"PCM tcp://{self.host}:{self.port}"
+        return info
+
+
+def create_audio_source(spec=AUDIO_SOURCE, speed=AUDIO_SOURCE_SPEED):
+    """
+    Crea una sorgente da una specifica testuale (AUDIO_SOURCE o --audio-source)
+
+    Formati:
+        device | device:<indice>     microfono
+        wav:<file o cartella>[,...]  replay di file WAV
+        tcp:[<host>:]<porta>         PCM grezzo via socket
+        noise                        rumore di fondo sintetico (prove senza audio)
+    """
+    kind, _, arg = spec.partition(':')
+
+    if kind == 'device':
+        return PyAudioSource(int(arg) if arg else MICROPHONE_INDEX)
+    if kind == 'wav':
+        return WavFileSource(arg.split(','), speed=speed)
+    if kind == 'tcp':
+        host, _, port = arg.rpartition(':')
+        return PCMSocketSource(host or '0.0.0.0', int(port))
+    if kind == 'noise':
+        rng = np.random.default_rng()
+        blocks = (0.002 * rng.standard_normal(CHUNK_SIZE) for _ in iter(int, 1))
+        return ArraySource(blocks, speed=speed or 1.0)
+    if os.path.exists(spec):
+        return WavFileSource(spec, speed=speed)
+
+    raise ValueError(f"Sorgente audio sconosciuta: {spec}")
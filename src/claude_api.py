@@ -1,15 +1,125 @@
 import requests
 import json
 import asyncio
-from config.settings import OLLAMA_HOST, OLLAMA_MODEL, DEBUG
+import re
+import time
+from config.settings import OLLAMA_HOST, OLLAMA_MODEL, RESPONSE_CACHE_ENABLED, DEBUG
+from ollama_client import AsyncOllamaClient, OllamaError
+from conversation import ConversationSession
+from response_cache import ResponseCache
+from model_residency import ModelResidency
+from tracing import span
+from metrics import LLM_SECONDS, LLM_ERRORS
+
+# Prefissi che il modello a volte antepone alla risposta
+RESPONSE_PREFIXES = (
+    "Jarvis:", "jarvis:", "Assistente:", "assistente:",
+    "AI:", "ai:", "Bot:", "bot:"
+)
+MAX_RESPONSE_CHARS = 300  # Oltre, per l'audio bastano le prime due frasi
+
+# Fine frase: punteggiatura seguita da spazio, oppure un a capo
+_SENTENCE_END = re.compile(r'[.!?…]+["»)\']*(?=\s)|\n')
+# Abbreviazioni italiane comuni: il punto non chiude la frase
+_ABBREVIATIONS = {'sig', 'sigg', 'dott', 'dr', 'ing', 'prof', 'avv', 'arch', 'geom', 'ecc', 'etc', 'es',
+                  'pag', 'p', 'n', 'nr', 'tel', 'cfr', 'vs'}
+
+
+class ResponseCleaner:
+    def __init__(self, max_chars=MAX_RESPONSE_CHARS):
+        """
+        Versione incrementale di `_clean_response` per le risposte in streaming
+
+        `feed(testo)` riceve i token man mano e restituisce le frasi già
+        complete e pulite: prefissi tolti, righe vuote eliminate, spazi
+        normalizzati. Superati `max_chars` caratteri si tengono solo le frasi
+        entro il limite (almeno due) e `done` diventa True: il resto della
+        generazione si può interrompere.
+        """
+        self.max_chars = max_chars
+        self.buffer = ''
+        self.prefix_checked = False
+        self.sentences = []
+        self.length = 0
+        self.done = False
+
+    def feed(self, text):
+        if self.done:
+            return []
+        self.buffer += text
+        if not self.prefix_checked and not self._strip_prefix(final=False):
+            return []
+        return self._split(final=False)
+
+    def finish(self):
+        """Fine dello stream: restituisce l'ultima frase (anche senza punteggiatura finale)"""
+        if self.done:
+            return []
+        if not self.prefix_checked:
+            self._strip_prefix(final=True)
+        return self._split(final=True)
+
+    @property
+    def text(self):
+        return ' '.join(self.sentences)
+
+    def _strip_prefix(self, final):
+        """False finché l'inizio del testo potrebbe ancora essere un prefisso"""
+        text = self.buffer.lstrip()
+        while True:
+            prefix = next((p for p in RESPONSE_PREFIXES if text.startswith(p)), None)
+            if prefix is None:
+                break
+            text = text[len(prefix):].lstrip()
+        if not final and (not text or any(p.startswith(text) for p in RESPONSE_PREFIXES)):
+            return False
+        self.buffer = text
+        self.prefix_checked = True
+        return True
+
+    def _split(self, final):
+        sentences = []
+        position = 0
+        for match in _SENTENCE_END.finditer(self.buffer):
+            if match.group() == '.':
+                word = re.search(r'(\w+)$', self.buffer[position:match.start()])
+                if word and word.group(1).lower() in _ABBREVIATIONS:
+                    continue
+            self._emit(self.buffer[position:match.end()], sentences)
+            position = match.end()
+            if self.done:
+                break
+        self.buffer = self.buffer[position:]
+
+        if final and not self.done:
+            self._emit(self.buffer, sentences)
+            self.buffer = ''
+            self.done = True
+        return sentences
+
+    def _emit(self, sentence, sentences):
+        sentence = ' '.join(sentence.split())
+        if not sentence or self.done:
+            return
+        if len(self.sentences) >= 2 and self.length + len(sentence) > self.max_chars:
+            self.done = True
+            return
+        self.sentences.append(sentence)
+        self.length += len(sentence) + 1
+        sentences.append(sentence)
 
 
 class OllamaAssistant:
-    def __init__(self):
-        """Inizializza il client Ollama per AI locale gratuita"""
-        self.host = OLLAMA_HOST
-        self.model = OLLAMA_MODEL
-        self.conversation_history = []
+    def __init__(self, host=None, model=None):
+        """Inizializza il client Ollama per AI locale gratuita (default da config/settings.py)"""
+        self.host = host or OLLAMA_HOST
+        self.model = model or OLLAMA_MODEL
+        # Richieste dagli event loop: asincrone, su connessioni persistenti
+        self.client = AsyncOllamaClient(self.host)
+        # Modello tenuto in memoria tra un comando e l'altro, precaricato prima dei cambi
+        self.residency = ModelResidency(self.client, self.host)
+        # Domande ricorrenti senza passare dal modello
+        self.response_cache = ResponseCache(self.client) if RESPONSE_CACHE_ENABLED else None
 
         # Sistema prompt per il casco Jarvis
         self.system_prompt = """
@@ -26,10 +136,13 @@ class OllamaAssistant:
         Usa un linguaggio naturale e colloquiale.
         """
 
+        # Cronologia multi-turno: stesso prefisso a ogni richiesta, riusato da Ollama
+        self.conversation = ConversationSession(self.system_prompt)
+
         self._check_ollama_connection()
 
     def _check_ollama_connection(self):
-        """Verifica la connessione a Ollama"""
+        """Verifica la connessione a Ollama (sincrona: gira nel thread di avvio)"""
         try:
             response = requests.get(f"{self.host}/api/tags", timeout=5)
             if response.status_code == 200:
@@ -99,64 +212,157 @@ class OllamaAssistant:
             if DEBUG:
                 print(f"[OLLAMA] Processando: {user_input}")
 
-            # Prepara il prompt completo
-            full_prompt = f"{self.system_prompt}\n\nUtente: {user_input}\nJarvis:"
+            cached = await self._cached_reply(user_input)
+            if cached is not None:
+                return cached
 
-            # Invia la richiesta a Ollama
-            response = requests.post(
-                f"{self.host}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": full_prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "max_tokens": 200,  # Risposte brevi per audio
-                        "stop": ["\nUtente:", "\n\n"]
-                    }
-                },
-                timeout=30
-            )
+            # Invia la richiesta a Ollama (l'event loop resta libero durante la generazione)
+            with span('ollama_request', model=self.model) as attrs, LLM_SECONDS.time():
+                result = await self.client.post_json("/api/chat", self._chat_payload(user_input, False))
+                attrs['status'] = 200
+                attrs['prompt_eval_count'] = result.get('prompt_eval_count')
 
-            if response.status_code == 200:
-                result = response.json()
-                assistant_response = result.get('response', '').strip()
+            assistant_response = result.get('message', {}).get('content', '')
+            self.conversation.add_turn(user_input, assistant_response, result)
+            assistant_response = assistant_response.strip()
 
-                # Pulisci la risposta
+            # Pulisci la risposta
+            with span('clean_response'):
                 assistant_response = self._clean_response(assistant_response)
 
-                if DEBUG:
-                    print(f"[OLLAMA] Risposta: {assistant_response}")
+            if DEBUG:
+                print(f"[OLLAMA] Risposta: {assistant_response}")
 
-                return assistant_response
-            else:
-                error_msg = f"Errore Ollama: {response.status_code}"
-                if DEBUG:
-                    print(f"[OLLAMA] {error_msg}")
-                return "Mi dispiace, ho riscontrato un problema tecnico."
+            await self._store_reply(user_input, assistant_response)
+            return assistant_response
+
+        except OllamaError as e:
+            LLM_ERRORS.inc()
+            error_msg = f"Errore Ollama: {e.status}"
+            if DEBUG:
+                print(f"[OLLAMA] {error_msg}")
+            return "Mi dispiace, ho riscontrato un problema tecnico."
 
-        except requests.exceptions.Timeout:
+        except asyncio.TimeoutError:
+            LLM_ERRORS.inc()
             error_msg = "Timeout nella risposta"
             if DEBUG:
                 print(f"[OLLAMA] {error_msg}")
             return "Mi dispiace, sto impiegando troppo tempo a rispondere."
 
         except Exception as e:
+            LLM_ERRORS.inc()
             error_msg = f"Errore nell'elaborazione: {str(e)}"
             if DEBUG:
                 print(f"[OLLAMA] Errore: {error_msg}")
             return "Mi dispiace, ho riscontrato un problema tecnico."
 
+    async def stream_command(self, user_input: str):
+        """
+        Come `process_command`, ma con la risposta in streaming
+
+        Restituisce (async for) le frasi pulite appena sono complete, così la
+        sintesi vocale della prima parte mentre Ollama genera il resto. In caso
+        di errore prima della prima frase restituisce il messaggio di errore.
+        """
+        if DEBUG:
+            print(f"[OLLAMA] Processando (streaming): {user_input}")
+
+        cached = await self._cached_reply(user_input)
+        if cached is not None:
+            cleaner = ResponseCleaner(max_chars=len(cached) + 1)
+            for sentence in cleaner.feed(cached) + cleaner.finish():
+                yield sentence
+            return
+
+        cleaner = ResponseCleaner()
+        error = None
+        generated = []  # Testo grezzo per la cronologia
+        final = None  # Ultimo messaggio, con i conteggi dei token
+        started = time.perf_counter()
+        with span('ollama_request', model=self.model, stream=True) as attrs, LLM_SECONDS.time():
+            stream = self.client.stream_json("/api/chat", self._chat_payload(user_input, True))
+            try:
+                async for chunk in stream:
+                    content = chunk.get('message', {}).get('content', '')
+                    generated.append(content)
+                    if chunk.get('done'):
+                        final = chunk
+                    for sentence in cleaner.feed(content):
+                        if len(cleaner.sentences) == 1:
+                            attrs['first_sentence_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                        yield sentence
+                    if cleaner.done or chunk.get('done'):
+                        break
+                attrs['status'] = 200
+                if final is not None:
+                    attrs['prompt_eval_count'] = final.get('prompt_eval_count')
+                # Anche se la generazione è stata interrotta al limite di lunghezza
+                self.conversation.add_turn(user_input, ''.join(generated), final)
+                for sentence in cleaner.finish():
+                    yield sentence
+            except OllamaError as e:
+                error = (f"Errore Ollama: {e.status}", "Mi dispiace, ho riscontrato un problema tecnico.")
+            except asyncio.TimeoutError:
+                error = ("Timeout nella risposta", "Mi dispiace, sto impiegando troppo tempo a rispondere.")
+            except Exception as e:
+                error = (f"Errore nell'elaborazione: {str(e)}", "Mi dispiace, ho riscontrato un problema tecnico.")
+            finally:
+                # Interrompere lo stream chiude la connessione: Ollama smette di generare
+                await stream.aclose()
+            attrs['sentences'] = len(cleaner.sentences)
+
+        if error is not None:
+            LLM_ERRORS.inc()
+            if DEBUG:
+                print(f"[OLLAMA] {error[0]}")
+            if not cleaner.sentences:
+                yield error[1]
+        else:
+            if DEBUG:
+                print(f"[OLLAMA] Risposta: {cleaner.text}")
+            await self._store_reply(user_input, cleaner.text)
+
+    async def _cached_reply(self, user_input):
+        """Risposta dalla cache (None se assente o non applicabile)"""
+        if self.response_cache is None:
+            return None
+        with span('response_cache') as attrs:
+            cached = await self.response_cache.lookup(user_input)
+            attrs['hit'] = cached is not None
+        if cached is not None:
+            if DEBUG:
+                print(f"[OLLAMA] Risposta dalla cache: {cached}")
+            self.conversation.add_turn(user_input, cached)
+        return cached
+
+    async def _store_reply(self, user_input, response):
+        if self.response_cache is not None:
+            try:
+                await self.response_cache.store(user_input, response)
+            except Exception as e:
+                if DEBUG:
+                    print(f"[CACHE] Errore salvataggio: {e}")
+
+    def _chat_payload(self, user_input, stream):
+        # System prompt, turni precedenti e nuova domanda
+        return {
+            "model": self.model,
+            "messages": self.conversation.messages(user_input),
+            "stream": stream,
+            "keep_alive": self.residency.keep_alive,  # Senza, Ollama scarica il modello dopo 5 minuti
+            "options": {
+                "temperature": 0.7,
+                "top_p": 0.9,
+                "num_predict": 200,  # Token generati al massimo: risposte brevi per audio
+                "stop": ["\nUtente:", "\n\n"]
+            }
+        }
+
     def _clean_response(self, response: str) -> str:
         """Pulisce la risposta da artefatti del modello"""
         # Rimuovi prefissi comuni
-        prefixes_to_remove = [
-            "Jarvis:", "jarvis:", "Assistente:", "assistente:",
-            "AI:", "ai:", "Bot:", "bot:"
-        ]
-
-        for prefix in prefixes_to_remove:
+        for prefix in RESPONSE_PREFIXES:
             if response.startswith(prefix):
                 response = response[len(prefix):].strip()
 
@@ -165,45 +371,49 @@ class OllamaAssistant:
         response = '\n'.join(lines)
 
         # Limita lunghezza per audio
-        if len(response) > 300:
+        if len(response) > MAX_RESPONSE_CHARS:
             sentences = response.split('.')
             response = '. '.join(sentences[:2]) + '.'
 
         return response
 
+    @property
+    def conversation_history(self):
+        return list(self.conversation.turns)
+
     def reset_conversation(self):
         """Resetta la cronologia della conversazione"""
-        self.conversation_history = []
+        self.conversation.reset()
         if DEBUG:
             print("[OLLAMA] Cronologia conversazione resettata")
 
     async def get_system_status(self) -> str:
         """Restituisce lo stato del sistema"""
         try:
-            response = requests.get(f"{self.host}/api/tags", timeout=5)
-            if response.status_code == 200:
-                return f"Jarvis attivo con modello {self.model}. Sistema operativo."
-            else:
-                return "Sistema Jarvis attivo ma Ollama non risponde."
-        except:
+            await self.client.get_json("/api/tags", timeout=5)
+            return f"Jarvis attivo con modello {self.model}. Sistema operativo."
+        except OllamaError:
+            return "Sistema Jarvis attivo ma Ollama non risponde."
+        except Exception:
             return "Sistema Jarvis attivo in modalità ridotta."
 
-    def list_available_models(self) -> list:
+    async def list_available_models(self) -> list:
         """Lista i modelli disponibili in Ollama"""
         try:
-            response = requests.get(f"{self.host}/api/tags", timeout=5)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                return [m['name'] for m in models]
-            return []
-        except:
+            return await self.client.list_models()
+        except Exception:
             return []
 
-    def switch_model(self, model_name: str) -> bool:
-        """Cambia il modello AI"""
+    async def switch_model(self, model_name: str) -> bool:
+        """Cambia il modello AI (caricato in memoria prima del cambio)"""
         try:
-            available_models = self.list_available_models()
-            if any(model_name in name for name in available_models):
+            available_models = await self.list_available_models()
+            if model_name not in available_models:
+                # Nome parziale ('llama3.2'): il primo modello che lo contiene
+                model_name = next((name for name in available_models if model_name in name), model_name)
+            if model_name in available_models:
+                # Il primo comando con il nuovo modello non paga il caricamento
+                await self.residency.switch(self.model, model_name)
                 self.model = model_name
                 if DEBUG:
                     print(f"[OLLAMA] Modello cambiato a: {model_name}")
@@ -212,5 +422,15 @@ class OllamaAssistant:
                 if DEBUG:
                     print(f"[OLLAMA] Modello {model_name} non disponibile")
                 return False
-        except:
-            return False
\ No newline at end of file
+        except Exception as e:
+            if DEBUG:
+                print(f"[OLLAMA] Errore cambio modello: {e}")
+            return False
+
+    def prewarm(self):
+        """Carica il modello configurato e lo tiene in memoria (fase di avvio)"""
+        return self.residency.prewarm(self.model)
+
+    async def close(self):
+        """Chiude le connessioni verso Ollama"""
+        await self.client.close()
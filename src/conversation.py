@@ -0,0 +1,148 @@
+"""
+Sessione di conversazione con Ollama: cronologia multi-turno entro un budget di token
+
+I messaggi vanno a /api/chat sempre nello stesso ordine (system prompt,
+turni precedenti, nuova domanda): il prompt di ogni richiesta inizia con il
+prompt della precedente e Ollama riusa la cache KV del prefisso, valutando
+solo i token nuovi (`prompt_eval_count`). Oltre il budget i turni più vecchi
+vengono sostituiti da un breve riassunto, in blocco, così il prefisso cambia
+di rado.
+"""
+
+import threading
+import time
+from config.settings import (
+    DEBUG, CONVERSATION_ENABLED, CONVERSATION_MAX_TOKENS, CONVERSATION_IDLE_RESET
+)
+from metrics import get_metrics_registry
+
+PROMPT_EVAL_TOKENS = get_metrics_registry().histogram(
+    'jarvis_llm_prompt_eval_tokens', 'Token del prompt valutati da Ollama per richiesta',
+    buckets=(8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+)
+
+
+def estimate_tokens(text):
+    """Stima grossolana (circa 4 caratteri per token) finché Ollama non dà il conteggio"""
+    return len(text) // 4 + 1
+
+
+class ConversationSession:
+    def __init__(self, system_prompt, max_tokens=CONVERSATION_MAX_TOKENS,
+                 idle_reset=CONVERSATION_IDLE_RESET, enabled=CONVERSATION_ENABLED):
+        """
+        Args:
+            system_prompt (str): primo messaggio, identico in ogni richiesta
+            max_tokens (int): budget della cronologia (system prompt escluso)
+            idle_reset (float): secondi di inattività dopo cui si riparte da zero
+            enabled (bool): False = ogni domanda senza cronologia (comportamento precedente)
+        """
+        self.system_prompt = system_prompt.strip()
+        self.max_tokens = max_tokens
+        self.idle_reset = idle_reset
+        self.enabled = enabled
+        self.turns = []  # {'user', 'assistant', 'tokens'}
+        self.summary = None
+        self.last_activity = None
+        self.stats = []  # Conteggi di Ollama per turno (ultimi 50)
+        self.total_turns = 0
+        self._lock = threading.Lock()
+
+    def messages(self, user_input):
+        """Messaggi per /api/chat con la nuova domanda in coda"""
+        with self._lock:
+            if (self.turns and self.idle_reset and self.last_activity is not None
+                    and time.monotonic() - self.last_activity > self.idle_reset):
+                if DEBUG:
+                    print("[CONVERSATION] Sessione inattiva, cronologia azzerata")
+                self._clear()
+
+            system = self.system_prompt
+            if self.summary:
+                system += f"\n\nArgomenti già discussi: {self.summary}"
+            messages = [{'role': 'system', 'content': system}]
+            if self.enabled:
+                for turn in self.turns:
+                    messages.append({'role': 'user', 'content': turn['user']})
+                    messages.append({'role': 'assistant', 'content': turn['assistant']})
+        messages.append({'role': 'user', 'content': user_input})
+        return messages
+
+    def add_turn(self, user_input, reply, result=None):
+        """
+        Registra un turno concluso
+
+        Args:
+            reply (str): testo generato così com'è (non ripulito: deve coincidere
+                con quanto Ollama ha in cache per riusare il prefisso)
+            result (dict | None): ultimo messaggio di Ollama con i conteggi
+        """
+        result = result or {}
+        prompt_eval = result.get('prompt_eval_count')
+        eval_count = result.get('eval_count')
+        if prompt_eval is not None:
+            PROMPT_EVAL_TOKENS.observe(prompt_eval)
+
+        with self._lock:
+            self.last_activity = time.monotonic()
+            self.total_turns += 1
+            self.stats.append({
+                'turn': self.total_turns,
+                'history_turns': len(self.turns),
+                'prompt_eval_count': prompt_eval,
+                'eval_count': eval_count,
+                'prompt_eval_ms': round(result['prompt_eval_duration'] / 1e6, 1)
+                if result.get('prompt_eval_duration') else None
+            })
+            del self.stats[:-50]
+
+            if not self.enabled or not reply:
+                return
+            tokens = estimate_tokens(user_input) + (eval_count or estimate_tokens(reply))
+            self.turns.append({'user': user_input, 'assistant': reply, 'tokens': tokens})
+            self._enforce_budget()
+
+        if DEBUG and prompt_eval is not None:
+            print(f"[CONVERSATION] Turno {self.total_turns}: {prompt_eval} token di prompt valutati, "
+                  f"{eval_count} generati, cronologia ~{self.history_tokens} token")
+
+    @property
+    def history_tokens(self):
+        return sum(turn['tokens'] for turn in self.turns)
+
+    def _enforce_budget(self):
+        """Oltre il budget scende a metà: i turni tolti diventano il riassunto"""
+        if self.history_tokens <= self.max_tokens:
+            return
+        evicted = []
+        while len(self.turns) > 1 and self.history_tokens > self.max_tokens // 2:
+            evicted.append(self.turns.pop(0))
+        if not evicted:
+            return  # Un solo turno molto lungo: resta fino al prossimo
+
+        topics = [turn['user'] for turn in evicted]
+        if self.summary:
+            topics.insert(0, self.summary)
+        summary = '; '.join(topics)
+        self.summary = summary[-300:]  # Solo gli argomenti più recenti
+        if DEBUG:
+            print(f"[CONVERSATION] {len(evicted)} turni riassunti, ne restano {len(self.turns)}")
+
+    def _clear(self):
+        self.turns = []
+        self.summary = None
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def get_stats(self):
+        with self._lock:
+            last = self.stats[-1] if self.stats else {}
+            return {
+                'turns': len(self.turns),
+                'history_tokens': self.history_tokens,
+                'summarized': self.summary is not None,
+                'last_prompt_eval_count': last.get('prompt_eval_count'),
+                'last_eval_count': last.get('eval_count')
+            }
@@ -0,0 +1,227 @@
+"""
+Comandi locali riconosciuti senza LLM: ora, data, calcoli, stato, modello, volume
+
+Il testo trascritto viene confrontato con espressioni regolari compilate,
+nell'ordine di registrazione; il primo intent che corrisponde risponde
+subito e in modo deterministico. Tutto il resto passa a Ollama.
+"""
+
+import inspect
+import re
+import time
+from datetime import datetime
+from config.settings import DEBUG, WAKE_WORDS
+from tracing import span
+from metrics import get_metrics_registry
+
+WEEKDAYS = ('lunedì', 'martedì', 'mercoledì', 'giovedì', 'venerdì', 'sabato', 'domenica')
+MONTHS = ('gennaio', 'febbraio', 'marzo', 'aprile', 'maggio', 'giugno', 'luglio', 'agosto',
+          'settembre', 'ottobre', 'novembre', 'dicembre')
+
+NUMBER_WORDS = {
+    'zero': 0, 'uno': 1, 'un': 1, 'una': 1, 'due': 2, 'tre': 3, 'quattro': 4, 'cinque': 5, 'sei': 6,
+    'sette': 7, 'otto': 8, 'nove': 9, 'dieci': 10, 'undici': 11, 'dodici': 12, 'tredici': 13,
+    'quattordici': 14, 'quindici': 15, 'sedici': 16, 'diciassette': 17, 'diciotto': 18,
+    'diciannove': 19, 'venti': 20, 'trenta': 30, 'quaranta': 40, 'cinquanta': 50, 'sessanta': 60,
+    'settanta': 70, 'ottanta': 80, 'novanta': 90, 'cento': 100, 'mille': 1000
+}
+OPERATORS = {
+    'più': '+', '+': '+', 'meno': '-', '-': '-', 'per': '*', 'x': '*', '*': '*', '×': '*',
+    'diviso': '/', 'fratto': '/', '/': '/', ':': '/'
+}
+
+# Scrittura italiana: "." separa le migliaia (1.000), "," i decimali (2,5)
+_NUMBER = (r"(\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:,\d+)?|"
+           + '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")")
+_OPERATOR = r"(più|meno|per|x|×|diviso(?: per)?|fratto|[-+*/:])"
+ARITHMETIC = rf"^(?:quanto fa |calcola |quant'è )?{_NUMBER}\s*{_OPERATOR}\s*{_NUMBER}$"
+
+
+def _normalize(text):
+    """Minuscolo, senza punteggiatura (tranne nei numeri), spazi uniformi e senza wake word iniziale"""
+    text = ' '.join(re.sub(r"[?!;]|[.,](?!\d)", ' ', text.lower()).split())
+    for wake_word in sorted(WAKE_WORDS, key=len, reverse=True):
+        if text.startswith(wake_word + ' '):
+            return text[len(wake_word) + 1:]
+    return text
+
+
+def _number(token):
+    """
+    >>> _number('1.000'), _number('10.000'), _number('2,5'), _number('tre')
+    (1000.0, 10000.0, 2.5, 3)
+    """
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    return float(token.replace('.', '').replace(',', '.'))
+
+
+def _format_number(value):
+    if value == int(value):
+        return str(int(value))
+    return f"{value:.4g}".replace('.', ',')
+
+
+class Intent:
+    def __init__(self, name, patterns, handler):
+        """
+        Args:
+            name (str): nome dell'intent (etichetta delle metriche)
+            patterns (list[str]): espressioni regolari sul testo normalizzato
+            handler (callable): `handler(match, testo)` → risposta (str, anche async);
+                None per lasciare il comando a Ollama
+        """
+        self.name = name
+        self.patterns = [re.compile(p) for p in patterns]
+        self.handler = handler
+        self.hits = get_metrics_registry().counter('jarvis_intent_hits_total', 'Comandi gestiti senza LLM',
+                                                   {'intent': name})
+        self.seconds = get_metrics_registry().histogram('jarvis_intent_seconds', 'Durata dei comandi locali',
+                                                        {'intent': name})
+
+    def match(self, text):
+        for pattern in self.patterns:
+            match = pattern.search(text)
+            if match:
+                return match
+        return None
+
+
+class IntentRouter:
+    def __init__(self):
+        """Registro degli intent locali, provati in ordine di registrazione"""
+        self.intents = []
+        self.fallthrough = get_metrics_registry().counter('jarvis_intent_fallthrough_total',
+                                                          'Comandi passati a Ollama')
+
+    def register(self, name, patterns, handler):
+        self.intents.append(Intent(name, patterns, handler))
+        return self
+
+    def match(self, command):
+        """(intent, match) per il primo intent che corrisponde, o None"""
+        text = _normalize(command)
+        for intent in self.intents:
+            match = intent.match(text)
+            if match:
+                return intent, match
+        return None
+
+    async def handle(self, command):
+        """Risposta locale al comando, o None se deve rispondere Ollama"""
+        found = self.match(command)
+        if found is None:
+            self.fallthrough.inc()
+            return None
+
+        intent, match = found
+        start = time.perf_counter()
+        with span('intent', intent=intent.name) as attrs:
+            try:
+                reply = intent.handler(match, command)
+                if inspect.isawaitable(reply):
+                    reply = await reply
+            except Exception as e:
+                if DEBUG:
+                    print(f"[INTENT] Errore {intent.name}: {e}")
+                reply = None
+            attrs['handled'] = reply is not None
+
+        if reply is None:
+            self.fallthrough.inc()
+            return None
+        intent.hits.inc()
+        intent.seconds.observe(time.perf_counter() - start)
+        if DEBUG:
+            print(f"[INTENT] {intent.name} in {(time.perf_counter() - start) * 1000:.1f} ms: {reply}")
+        return reply
+
+    def get_stats(self):
+        stats = {}
+        for intent in self.intents:
+            _, total, count = intent.seconds.snapshot()
+            stats[intent.name] = {'hits': count, 'avg_ms': round(total / count * 1000, 2) if count else None}
+        stats['llm'] = {'hits': self.fallthrough.value, 'avg_ms': None}
+        return stats
+
+
+# Intent predefiniti
+def tell_time(match, command, now=None):
+    now = now or datetime.now()
+    if now.hour in (1, 13):
+        prefix = "È l'una"
+    elif now.hour == 0:
+        prefix = "È mezzanotte"
+    elif now.hour == 12:
+        prefix = "È mezzogiorno"
+    else:
+        prefix = f"Sono le {now.hour}"
+    return prefix + (f" e {now.minute}." if now.minute else " in punto.")
+
+
+def tell_date(match, command, now=None):
+    now = now or datetime.now()
+    day = 'primo' if now.day == 1 else now.day
+    return f"Oggi è {WEEKDAYS[now.weekday()]} {day} {MONTHS[now.month - 1]} {now.year}."
+
+
+def calculate(match, command):
+    """
+    >>> calculate(re.search(ARITHMETIC, 'quanto fa 1.000 per 2'), '')
+    'Fa 2000.'
+    >>> calculate(re.search(ARITHMETIC, 'quanto fa 10.000 diviso 4'), '')
+    'Fa 2500.'
+    >>> re.search(ARITHMETIC, 'quanto fa 1.5 per 2') is None  # "." decimale: ambiguo, decide Ollama
+    True
+    """
+    left, operator, right = match.group(1), match.group(2), match.group(3)
+    a, b = _number(left), _number(right)
+    operator = OPERATORS[operator.split()[0]]
+    if operator == '/' and b == 0:
+        return "Non si può dividere per zero."
+    result = {'+': a + b, '-': a - b, '*': a * b, '/': a / b if b else 0}[operator]
+    return f"Fa {_format_number(result)}."
+
+
+def create_intent_router(jarvis):
+    """Intent predefiniti per il casco (`jarvis`: ImprovedJarvisHelmet)"""
+
+    async def system_status(match, command):
+        if jarvis.ai_assistant is None:
+            return "Sistema Jarvis attivo, modello AI in caricamento."
+        return await jarvis.ai_assistant.get_system_status()
+
+    async def switch_model(match, command):
+        if jarvis.ai_assistant is None:
+            return "Il modello AI è ancora in caricamento."
+        spoken = re.sub(r'[^a-z0-9]', '', match.group('model'))
+        available = await jarvis.ai_assistant.list_available_models()
+        target = next((m for m in available if spoken and spoken in re.sub(r'[^a-z0-9]', '', m.lower())), None)
+        if target is None or not await jarvis.ai_assistant.switch_model(target):
+            return f"Il modello {match.group('model')} non è disponibile."
+        return f"Modello cambiato: {target}."
+
+    def volume(match, command):
+        handler = jarvis.speech_handler
+        if match.group('level'):
+            level = _number(match.group('level')) / 100
+        elif match.group('direction').startswith('alz'):
+            level = handler.tts_volume + 0.1
+        else:
+            level = handler.tts_volume - 0.1
+        return f"Volume impostato a {round(handler.set_tts_volume(level) * 100)} percento."
+
+    router = IntentRouter()
+    # "ora" da sola all'inizio della frase è quasi sempre "adesso": solo come domanda a sé
+    router.register('time', [r"\bche or[ae] (sono|è|e)\b", r"\bdimmi l'ora\b", r"^(l')?ora$"], tell_time)
+    router.register('date', [r"\bche giorno (è|e)\b", r"\bche data (è|e)\b", r"\bdimmi la data\b",
+                             r"\bquanti ne abbiamo\b"], tell_date)
+    router.register('arithmetic', [ARITHMETIC], calculate)
+    router.register('system_status', [r"\bstato del sistema\b", r"^stato\b", r"\bcome sta il sistema\b"],
+                    system_status)
+    router.register('switch_model', [r"\b(?:usa|cambia|passa a)(?: il)? modello (?:a |in )?(?P<model>[\w.:\- ]+)$"],
+                    switch_model)
+    router.register('volume', [r"\b(?P<direction>alza|abbassa)(?: il)? volume\b(?P<level>)",
+                               r"\bvolume (?:al |a )?(?P<level>\d{1,3})(?: percento| ?%)?$(?P<direction>)"],
+                    volume)
+    return router
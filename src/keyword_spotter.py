@@ -0,0 +1,323 @@
+"""
+Keyword spotting leggero per le wake word, davanti a Whisper
+"""
+
+import os
+import threading
+import time
+import wave
+import numpy as np
+from config.settings import (
+    DEBUG, SAMPLE_RATE, WAKE_WORDS,
+    WAKE_WORD_SPOTTER_ENABLED, WAKE_WORD_TEMPLATES_PATH,
+    WAKE_WORD_SPOTTER_THRESHOLD, WAKE_WORD_SPOTTER_CONFIG
+)
+
+# Parametri feature (25 ms di finestra, 10 ms di passo)
+FRAME_LENGTH = 400
+HOP_LENGTH = 160
+N_FFT = 512
+N_MELS = 40
+N_MFCC = 13
+
+
+def _mel_filterbank(sample_rate=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS):
+    """Costruisce il banco filtri mel triangolare (n_mels x n_fft//2+1)"""
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(60.0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+
+    fbank = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            fbank[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            fbank[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return fbank
+
+
+def _dct_matrix(n_mfcc=N_MFCC, n_mels=N_MELS):
+    """Matrice DCT-II ortonormale per passare da log-mel a MFCC"""
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)[:, None]
+    dct = np.cos(np.pi / n_mels * (n + 0.5) * k) * np.sqrt(2.0 / n_mels)
+    dct[0] /= np.sqrt(2.0)
+    return dct.astype(np.float32)
+
+
+_MEL_FBANK = _mel_filterbank()
+_DCT = _dct_matrix()
+_WINDOW = np.hanning(FRAME_LENGTH).astype(np.float32)
+
+
+def extract_features(audio_data):
+    """
+    Calcola MFCC normalizzate (media per coefficiente) in un'unica passata vettoriale
+
+    Args:
+        audio_data (np.ndarray): audio float32 normalizzato o int16
+
+    Returns:
+        np.ndarray: matrice (frame x N_MFCC), vuota se l'audio è troppo corto
+    """
+    audio_data = np.asarray(audio_data)
+    if audio_data.dtype == np.int16:
+        audio_data = audio_data.astype(np.float32) / 32768.0
+    if len(audio_data) < FRAME_LENGTH:
+        return np.zeros((0, N_MFCC), dtype=np.float32)
+
+    # Pre-enfasi e suddivisione in frame senza copie
+    emphasized = np.append(audio_data[0], audio_data[1:] - 0.97 * audio_data[:-1])
+    frames = np.lib.stride_tricks.sliding_window_view(emphasized, FRAME_LENGTH)[::HOP_LENGTH]
+
+    spectrum = np.abs(np.fft.rfft(frames * _WINDOW, n=N_FFT)) ** 2
+    log_mel = np.log(spectrum @ _MEL_FBANK.T + 1e-10)
+    mfcc = log_mel @ _DCT.T
+
+    return (mfcc - mfcc.mean(axis=0)).astype(np.float32)
+
+
+def subsequence_dtw(query, template):
+    """
+    Costo DTW normalizzato del miglior allineamento del template dentro la query
+
+    Usa passi con pendenza vincolata (1,1), (1,2), (2,1): ogni riga dipende solo
+    dalle due precedenti, quindi il calcolo è vettoriale lungo il template.
+    """
+    n, m = len(query), len(template)
+    if n == 0 or m == 0:
+        return np.inf
+
+    # Distanza coseno tra tutti i frame
+    q = query / (np.linalg.norm(query, axis=1, keepdims=True) + 1e-8)
+    t = template / (np.linalg.norm(template, axis=1, keepdims=True) + 1e-8)
+    cost = 1.0 - q @ t.T
+
+    acc = np.full((n, m), np.inf, dtype=np.float32)
+    acc[:, 0] = cost[:, 0]  # Il template può iniziare in qualsiasi frame
+    for i in range(1, n):
+        row = np.full(m, np.inf, dtype=np.float32)
+        row[1:] = acc[i - 1, :-1] + cost[i, 1:]
+        if m > 2:
+            row[2:] = np.minimum(row[2:], acc[i - 1, :-2] + 2 * cost[i, 2:])
+        if i > 1:
+            row[1:] = np.minimum(row[1:], acc[i - 2, :-1] + cost[i, 1:])
+        acc[i, 1:] = row[1:]
+
+    return float(acc[:, -1].min() / m)
+
+
+class KeywordSpotter:
+    def __init__(self, templates_path=WAKE_WORD_TEMPLATES_PATH):
+        """
+        Inizializza lo spotter a template per le wake word
+
+        Ogni voce di WAKE_WORDS può avere registrazioni di esempio in
+        `<templates_path>/<wake word>/*.wav` (mono, 16 kHz, 16 bit) e una
+        configurazione dedicata in WAKE_WORD_SPOTTER_CONFIG.
+        """
+        self.templates_path = templates_path
+        self.templates = {}
+        self.thresholds = {}
+        self.enabled_words = []
+
+        # Stato per il rilevamento continuo (streaming): la cattura aggiunge
+        # audio mentre un worker confronta la finestra
+        self._stream_buffer = np.zeros(0, dtype=np.float32)
+        self._stream_pending = 0
+        self._stream_lock = threading.Lock()
+        self._detect_lock = threading.Lock()
+
+        # Statistiche
+        self.segments_checked = 0
+        self.segments_rejected = 0
+        self.detections = 0
+        self.total_time = 0.0
+
+        for word in WAKE_WORDS:
+            config = WAKE_WORD_SPOTTER_CONFIG.get(word, {})
+            if not config.get('enabled', True):
+                continue
+            self.enabled_words.append(word)
+            self.thresholds[word] = config.get('threshold', WAKE_WORD_SPOTTER_THRESHOLD)
+            self.templates[word] = self._load_templates(word)
+
+        missing = [w for w in self.enabled_words if not self.templates[w]]
+        if DEBUG:
+            loaded = {w: len(t) for w, t in self.templates.items() if t}
+            print(f"[KWS] Template caricati: {loaded}")
+            if missing:
+                print(f"[KWS] ⚠️ Nessun template per {missing}: filtro disattivato, uso solo Whisper")
+
+    @property
+    def is_active(self):
+        """Lo spotter filtra solo se ogni wake word abilitata ha almeno un template"""
+        return (WAKE_WORD_SPOTTER_ENABLED and bool(self.enabled_words) and
+                all(self.templates.get(w) for w in self.enabled_words))
+
+    @property
+    def max_template_frames(self):
+        lengths = [len(t) for templates in self.templates.values() for t in templates]
+        return max(lengths) if lengths else 0
+
+    def _word_dir(self, word):
+        return os.path.join(self.templates_path, word.replace(' ', '_'))
+
+    def _load_templates(self, word):
+        """Carica e converte in feature i template WAV di una wake word"""
+        templates = []
+        word_dir = self._word_dir(word)
+        if not os.path.isdir(word_dir):
+            return templates
+
+        for filename in sorted(os.listdir(word_dir)):
+            if not filename.lower().endswith('.wav'):
+                continue
+            try:
+                with wave.open(os.path.join(word_dir, filename), 'rb') as wf:
+                    audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+                features = extract_features(audio)
+                if len(features):
+                    templates.append(features)
+            except Exception as e:
+                if DEBUG:
+                    print(f"[KWS] Errore template {filename}: {e}")
+        return templates
+
+    def enroll(self, word, audio_data, save=True):
+        """
+        Aggiunge una registrazione di esempio per una wake word
+
+        Args:
+            word (str): voce di WAKE_WORDS
+            audio_data (np.ndarray): audio int16 o float32 normalizzato
+            save (bool): salva il template su disco
+        """
+        audio_data = np.asarray(audio_data)
+        if audio_data.dtype != np.int16:
+            audio_data = (np.clip(audio_data, -1.0, 1.0) * 32767).astype(np.int16)
+
+        self.templates.setdefault(word, []).append(extract_features(audio_data))
+
+        if save:
+            word_dir = self._word_dir(word)
+            os.makedirs(word_dir, exist_ok=True)
+            filename = os.path.join(word_dir, f"{int(time.time() * 1000)}.wav")
+            with wave.open(filename, 'wb') as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(SAMPLE_RATE)
+                wf.writeframes(audio_data.tobytes())
+            if DEBUG:
+                print(f"[KWS] Template salvato: {filename}")
+
+    def score(self, audio_data):
+        """
+        Confronta l'audio con tutti i template
+
+        Returns:
+            dict: miglior costo DTW per ogni wake word (più basso = più simile)
+        """
+        features = extract_features(audio_data)
+        return {
+            word: min((subsequence_dtw(features, t) for t in self.templates.get(word, [])),
+                      default=np.inf)
+            for word in self.enabled_words
+        }
+
+    def detect(self, audio_data):
+        """
+        Cerca una wake word nel segmento audio
+
+        Returns:
+            str | None: wake word rilevata, None se il segmento va scartato
+        """
+        start = time.perf_counter()
+        scores = self.score(audio_data)
+        self.total_time += time.perf_counter() - start
+        self.segments_checked += 1
+
+        matches = [(s / self.thresholds[w], w) for w, s in scores.items() if s <= self.thresholds[w]]
+        if not matches:
+            self.segments_rejected += 1
+            if DEBUG:
+                best = min(scores.items(), key=lambda item: item[1], default=None)
+                if best:
+                    print(f"[KWS] Nessuna wake word (migliore: '{best[0]}' {best[1]:.3f})")
+            return None
+
+        word = min(matches)[1]
+        self.detections += 1
+        if DEBUG:
+            print(f"[KWS] 🎯 Wake word '{word}' (costo {scores[word]:.3f})")
+        return word
+
+    def reset_stream(self):
+        """Svuota il buffer del rilevamento continuo"""
+        with self._stream_lock:
+            self._stream_buffer = np.zeros(0, dtype=np.float32)
+            self._stream_pending = 0
+
+    def append(self, audio_data, step_seconds=0.25):
+        """
+        Aggiunge audio alla finestra scorrevole, lunga quanto il template più
+        lungo, senza confrontarla (thread di cattura)
+
+        Returns:
+            bool: True se è arrivato abbastanza audio nuovo per un confronto
+        """
+        window = int((self.max_template_frames * 1.5 * HOP_LENGTH) + FRAME_LENGTH)
+        with self._stream_lock:
+            self._stream_buffer = np.concatenate([self._stream_buffer, audio_data])[-window:]
+            self._stream_pending += len(audio_data)
+            if self._stream_pending < step_seconds * SAMPLE_RATE:
+                return False
+            self._stream_pending = 0
+            return True
+
+    def detect_stream(self, wait=False):
+        """
+        Confronta la finestra corrente con i template (worker: MFCC e DTW)
+
+        Args:
+            wait (bool): attende un confronto già in corso invece di saltare la finestra
+
+        Returns:
+            str | None: wake word rilevata nell'ultima finestra
+        """
+        # Senza `wait`, un confronto già in corso coprirà anche questa finestra
+        if not self._detect_lock.acquire(blocking=wait):
+            return None
+        try:
+            with self._stream_lock:
+                window = self._stream_buffer
+            if not len(window):
+                return None
+            word = self.detect(window)
+            if word:
+                self.reset_stream()
+            return word
+        finally:
+            self._detect_lock.release()
+
+    def push(self, audio_data, step_seconds=0.25):
+        """Aggiunge audio e, se serve, confronta subito la finestra (uso sincrono)"""
+        if self.append(audio_data, step_seconds):
+            return self.detect_stream()
+        return None
+
+    def get_stats(self):
+        """Statistiche del filtro wake word"""
+        return {
+            'active': self.is_active,
+            'segments_checked': self.segments_checked,
+            'segments_rejected': self.segments_rejected,
+            'detections': self.detections,
+            'avg_ms': (self.total_time / self.segments_checked * 1000) if self.segments_checked else 0.0
+        }
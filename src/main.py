@@ -4,62 +4,159 @@ Jarvis Helmet - Assistente Personale AI - VERSIONE MIGLIORATA
 Main entry point per il sistema casco intelligente
 """
 
+import argparse
 import asyncio
 import signal
 import sys
 import time
-import keyboard
 from datetime import datetime
 
 from speech_handler import ImprovedWhisperSpeechHandler
 from claude_api import OllamaAssistant
 from audio_manager import AudioManager
+from audio_capture import configure_capture_hub, shutdown_capture_hub
+from audio_sources import create_audio_source
+from tracing import start_trace, current_trace, activate, span, finish_trace, get_trace_store
+from startup import StartupManager
+from intent_router import create_intent_router
 from websocket_server import start_websocket_server_thread
 from mobile_server import start_mobile_app_server
-from config.settings import DEBUG, WAKE_WORDS
+from config.settings import (
+    DEBUG, WAKE_WORDS, WHISPER_MODEL, OLLAMA_MODEL, SAMPLE_RATE, AUDIO_SOURCE, AUDIO_SOURCE_SPEED,
+    TRACE_EXPORT_PATH, LLM_STREAMING, OLLAMA_PREWARM, validate_settings
+)
+
+try:
+    import keyboard
+except ImportError:
+    keyboard = None  # Senza tastiera (headless): solo voce e app mobile
 
 
 class ImprovedJarvisHelmet:
-    def __init__(self):
-        """Inizializza il sistema Jarvis Helmet Migliorato"""
+    def __init__(self, speech_handler=None, ai_assistant=None, audio_manager=None,
+                 start_servers=True, keyboard_input=True):
+        """
+        Inizializza il sistema Jarvis Helmet Migliorato
+
+        I server per l'app mobile partono subito; gestore vocale, modello
+        Whisper, Ollama e AudioManager si inizializzano in parallelo
+        (StartupManager) e il casco resta in ascolto in stato "degradato"
+        finché le parti lente non sono pronte. I componenti possono essere
+        passati già pronti (benchmark, prove headless); con
+        start_servers=False non vengono avviati i server per l'app mobile.
+        """
         print("🤖 Inizializzando Jarvis Helmet...")
 
-        try:
-            # Inizializza componenti
-            self.speech_handler = ImprovedWhisperSpeechHandler()
-            self.ai_assistant = OllamaAssistant()
-            self.audio_manager = AudioManager()
+        # Componenti (None finché la relativa fase di avvio non è conclusa)
+        self.speech_handler = None
+        self.ai_assistant = None
+        self.audio_manager = None
+
+        # Loop asyncio principale (le callback arrivano dai thread di trascrizione)
+        self.loop = None
+        self.reply_lock = None  # Una risposta pronunciata alla volta (creato nel loop)
+        self.intent_router = create_intent_router(self)  # Comandi locali senza LLM
+        self.keyboard_input = keyboard_input and keyboard is not None
+
+        # Stato del sistema
+        self.is_active = False
+        self.is_running = True
+        self.session_start = datetime.now()
+
+        # Statistiche
+        self.commands_processed = 0
+        self.wake_words_detected = 0
+
+        # Avvio a fasi: i componenti già pronti vengono collegati subito
+        self.startup = StartupManager()
+        if speech_handler is not None:
+            self._attach_speech_handler(speech_handler)
+            self.startup.add_ready('speech', speech_handler)
+        else:
+            self.startup.add('speech', lambda: self._attach_speech_handler(ImprovedWhisperSpeechHandler(load_model=False)))
+        if self.speech_handler is not None and self.speech_handler.model_ready.is_set():
+            self.startup.add_ready('whisper', self.speech_handler.whisper_precision)
+        else:
+            self.startup.add('whisper', self._load_whisper, after=('speech',))
+        if ai_assistant is not None:
+            self.ai_assistant = ai_assistant
+            self.startup.add_ready('ollama', ai_assistant)
+        else:
+            self.startup.add('ollama', lambda: self._set_component('ai_assistant', OllamaAssistant()))
+        if OLLAMA_PREWARM:
+            # Modello caricato in memoria in background: il primo comando non paga il caricamento
+            self.startup.add('prewarm', lambda: self.ai_assistant.prewarm(), after=('ollama',), required=False)
+        if audio_manager is not None:
+            self.audio_manager = audio_manager
+            self.startup.add_ready('audio', audio_manager, required=False)
+        else:
+            self.startup.add('audio', lambda: self._set_component('audio_manager', AudioManager()), required=False)
+        # Validazione della configurazione (controlla anche Ollama): fuori dal percorso critico
+        self.startup.add('settings', validate_settings, required=False)
+        self.startup.add_listener(self._on_component_ready)
+        self.startup.add_complete_listener(self._on_startup_complete)
+
+        # Server per app mobile: attivi subito, riportano la prontezza dei componenti
+        self.mobile_server = None
+        self.websocket_thread = None
+        if start_servers:
+            self.mobile_server = start_mobile_app_server(port=8766, status_provider=self.get_status)
+            self.websocket_thread = start_websocket_server_thread(self, port=8765)
 
-            # Collega callback per speech handler
-            self.speech_handler.wake_word_callback = self._on_wake_word_detected
-            self.speech_handler.command_callback = self._on_command_received
+        self.startup.start()
 
-            # Avvia server per app mobile
-            self.mobile_server = start_mobile_app_server(port=8766)
-            self.websocket_thread = start_websocket_server_thread(self, port=8765)
+        print("✅ Jarvis Helmet avviato, componenti in caricamento...")
 
-            # Stato del sistema
-            self.is_active = False
-            self.is_running = True
-            self.session_start = datetime.now()
+        if self.mobile_server:
+            print("📱 App mobile disponibile:")
+            print(f"   🌐 http://{self.mobile_server.get_local_ip()}:8766")
+            print("   💡 Apri questo URL sul tuo smartphone!")
 
-            # Statistiche
-            self.commands_processed = 0
-            self.wake_words_detected = 0
+    def _attach_speech_handler(self, handler):
+        """Collega le callback del gestore vocale"""
+        handler.wake_word_callback = self._on_wake_word_detected
+        handler.command_callback = self._on_command_received
+        self.speech_handler = handler
+        return handler
 
-            print("✅ Jarvis Helmet inizializzato con successo!")
+    def _set_component(self, attribute, component):
+        setattr(self, attribute, component)
+        return component
 
-            if self.mobile_server:
-                print("📱 App mobile disponibile:")
-                print(f"   🌐 http://{self.mobile_server.get_local_ip()}:8766")
-                print("   💡 Apri questo URL sul tuo smartphone!")
+    def _load_whisper(self):
+        """Fase 'whisper': carica il modello dopo il gestore vocale (che intanto ascolta)"""
+        self.speech_handler.load_model()
+        return self.speech_handler.whisper_precision
 
-        except Exception as e:
-            print(f"❌ Errore inizializzazione: {e}")
-            sys.exit(1)
+    def _on_component_ready(self, component):
+        """Listener dell'avvio (thread della fase)"""
+        if component.state == 'failed':
+            print(f"❌ {component.name}: {component.error}")
+            return
+
+        print(f"✅ {component.name} pronto in {component.seconds:.1f}s")
+
+    def _on_startup_complete(self):
+        """Tutte le fasi concluse: tempi di avvio e suono di avvio"""
+        if self.startup.failed():
+            return
+
+        times = ', '.join(f"{name} {c.seconds:.1f}s" for name, c in self.startup.components.items())
+        print(f"🚀 Jarvis pronto in {self.startup.total_seconds:.1f}s ({times})")
+        if self.audio_manager is not None:
+            self.audio_manager.play_notification_sound(frequency=1000, duration=0.3)
+
+    def get_status(self):
+        """Prontezza per componente (app mobile, /health)"""
+        status = self.startup.get_status()
+        status['listening'] = self.speech_handler is not None and self.speech_handler.is_monitoring
+        return status
 
     async def start_system(self):
         """Avvia il sistema principale di Jarvis"""
+        self.loop = asyncio.get_running_loop()
+        self.reply_lock = asyncio.Lock()
+
         print("\n🚀 Avvio Jarvis Helmet...")
         print("📝 Comandi disponibili:")
         print("   - Parla normalmente, Jarvis ti ascolta sempre! 🎧")
@@ -70,23 +167,33 @@ class ImprovedJarvisHelmet:
         print("   - Premi 'm' per cambiare modello AI")
         print("   - Premi 'w' per aprire app mobile")
         print(f"   - Parole di attivazione: {', '.join(WAKE_WORDS)}")
-        print(f"   - Modello AI: {self.ai_assistant.model}")
+        print(f"   - Modello AI: {self.ai_assistant.model if self.ai_assistant else OLLAMA_MODEL}")
 
-        # Info microfono
-        mic_info = self.speech_handler.get_microphone_info()
-        if mic_info:
-            print(f"   - Microfono: {mic_info['name']} (Indice: {mic_info['index']})")
+        try:
+            # Il gestore vocale (cattura, VAD, TTS) è rapido: Whisper e Ollama continuano in background
+            await self.loop.run_in_executor(None, self.startup.wait, ['speech'])
+            if not self.startup.is_ready('speech'):
+                print("❌ Impossibile avviare il gestore vocale")
+                return
 
-        print("\n🎧 Sistema in ascolto continuo...\n")
+            # Info microfono
+            mic_info = self.speech_handler.get_microphone_info()
+            if mic_info:
+                print(f"   - Microfono: {mic_info['name']} (Indice: {mic_info['index']})")
 
-        # Avvia monitoraggio vocale intelligente
-        self.speech_handler.start_intelligent_monitoring()
+            # Avvia monitoraggio vocale intelligente (gli enunciati attendono Whisper in coda)
+            self.speech_handler.start_intelligent_monitoring()
 
-        # Suono di avvio
-        self.audio_manager.play_notification_sound(frequency=1000, duration=0.3)
+            pending = self.startup.pending()
+            if pending:
+                print(f"\n🎧 In ascolto, in caricamento: {', '.join(pending)}...\n")
+            else:
+                print("\n🎧 Sistema in ascolto continuo...\n")
 
-        try:
             while self.is_running:
+                if self.startup.failed():
+                    print("❌ Avvio fallito: " + ", ".join(f"{c.name} ({c.error})" for c in self.startup.failed()))
+                    break
                 await self._main_loop()
                 await asyncio.sleep(0.1)  # Piccola pausa per non sovraccaricare CPU
 
@@ -107,6 +214,9 @@ class ImprovedJarvisHelmet:
 
     async def _handle_keyboard_input(self):
         """Gestisce input da tastiera"""
+        if not self.keyboard_input:
+            return
+
         try:
             if keyboard.is_pressed('esc'):
                 print("\n🛑 Uscita tramite ESC...")
@@ -134,7 +244,7 @@ class ImprovedJarvisHelmet:
                 time.sleep(0.5)
 
             if keyboard.is_pressed('m'):
-                self._change_ai_model()
+                await self._change_ai_model()
                 time.sleep(0.5)
 
             if keyboard.is_pressed('w'):
@@ -145,107 +255,228 @@ class ImprovedJarvisHelmet:
             if DEBUG:
                 print(f"[MAIN] Errore gestione tastiera: {e}")
 
+    def _run_on_loop(self, coro):
+        """Esegue una coroutine sul loop principale (chiamabile da qualsiasi thread)"""
+        if self.loop is None or self.loop.is_closed():
+            coro.close()
+            if DEBUG:
+                print("[MAIN] Loop principale non attivo, evento ignorato")
+            return
+        asyncio.run_coroutine_threadsafe(coro, self.loop)
+
     def _on_wake_word_detected(self, text):
-        """Callback per wake word rilevata"""
-        asyncio.create_task(self._handle_wake_word(text))
+        """Callback per wake word rilevata (thread di trascrizione)"""
+        trace = current_trace()
+        if trace is not None:
+            trace.mark('wake_word_callback')
+        self._run_on_loop(self._handle_wake_word(text, trace))
 
     def _on_command_received(self, text):
-        """Callback per comando ricevuto"""
-        asyncio.create_task(self._handle_voice_command(text))
+        """Callback per comando ricevuto (thread di trascrizione)"""
+        trace = current_trace()
+        if trace is not None:
+            trace.mark('command_callback')
+        self._run_on_loop(self._handle_voice_command(text, trace))
 
-    async def _handle_wake_word(self, text):
+    async def _handle_wake_word(self, text, trace=None):
         """Gestisce wake word rilevata"""
         try:
-            self.wake_words_detected += 1
-            print(f"🎯 Wake word rilevata! Audio: '{text}'")
+            with activate(trace):
+                self.wake_words_detected += 1
+                print(f"🎯 Wake word rilevata! Audio: '{text}'")
 
-            # Suono di conferma
-            self.audio_manager.play_notification_sound(frequency=1200, duration=0.2)
+                # Suono di conferma
+                if self.audio_manager is not None:
+                    self.audio_manager.play_notification_sound(frequency=1200, duration=0.2)
 
-            # Attiva modalità comando
-            self.speech_handler.wait_for_command(timeout=10)
+                # Attiva modalità comando
+                self.speech_handler.wait_for_command(timeout=10)
 
-            # Conferma vocale
-            self.speech_handler.speak("Sì?")
+                # Conferma vocale
+                with span('speak', text="Sì?"):
+                    self.speech_handler.speak("Sì?")
 
         except Exception as e:
             if DEBUG:
                 print(f"[MAIN] Errore gestione wake word: {e}")
+        finally:
+            finish_trace(trace, 'wake')
 
-    async def _handle_voice_command(self, command):
+    async def _handle_voice_command(self, command, trace=None):
         """Gestisce comando vocale ricevuto"""
         try:
-            print(f"📝 Comando ricevuto: '{command}'")
-
-            # Processa con AI
-            print("🤖 Elaborando risposta...")
-            response = await self.ai_assistant.process_command(command)
-
-            if response:
-                print(f"💬 Risposta: {response}")
-                self.speech_handler.speak(response)
-                self.commands_processed += 1
-
-                # Suono completamento
-                self.audio_manager.play_notification_sound(frequency=800, duration=0.2)
-            else:
-                print("❌ Errore nell'elaborazione")
-                self.speech_handler.speak("Mi dispiace, non sono riuscito a elaborare la richiesta.")
+            with activate(trace):
+                print(f"📝 Comando ricevuto: '{command}'")
+
+                if self.ai_assistant is None and self.intent_router.match(command) is None:
+                    # Avvio ancora in corso: Ollama non è pronto
+                    print("⏳ Modello AI in caricamento")
+                    self.speech_handler.speak("Sto ancora avviando il modello AI, riprova tra poco.")
+                    return
+
+                # Processa con AI
+                print("🤖 Elaborando risposta...")
+                async with self.reply_lock:
+                    response = await self._generate_and_speak(command, trace)
+
+                if response:
+                    self.commands_processed += 1
+
+                    # Suono completamento
+                    if self.audio_manager is not None:
+                        self.audio_manager.play_notification_sound(frequency=800, duration=0.2)
+                else:
+                    print("❌ Errore nell'elaborazione")
+                    self.speech_handler.speak("Mi dispiace, non sono riuscito a elaborare la richiesta.")
 
         except Exception as e:
             print(f"❌ Errore comando: {e}")
             self.speech_handler.speak("Si è verificato un errore tecnico.")
+        finally:
+            finish_trace(trace, 'command')
+
+    async def _generate_and_speak(self, command, trace=None):
+        """
+        Risposta (intent locale o Ollama) pronunciata dalla coda frasi del gestore vocale
+
+        In streaming ogni frase viene accodata appena completa: la sintesi
+        parte mentre Ollama genera il resto. Restituisce il testo pronunciato.
+        """
+        speech_queue = self.speech_handler.speech_queue
+        reply = speech_queue.begin_reply(trace)
+
+        # Ora, data, calcoli, stato, modello, volume: risposta locale immediata
+        response = await self.intent_router.handle(command)
+        if response is not None:
+            speech_queue.put(response, reply)
+        elif self.ai_assistant is None:
+            # Intent non riuscito durante l'avvio: Ollama non è ancora pronto
+            print("⏳ Modello AI in caricamento")
+            response = "Sto ancora avviando il modello AI, riprova tra poco."
+            speech_queue.put(response, reply)
+        elif LLM_STREAMING:
+            sentences = []
+            with span('llm', stream=True):
+                async for sentence in self.ai_assistant.stream_command(command):
+                    sentences.append(sentence)
+                    speech_queue.put(sentence, reply)
+            response = ' '.join(sentences)
+        else:
+            with span('llm'):
+                response = await self.ai_assistant.process_command(command)
+            if response:
+                speech_queue.put(response, reply)
+
+        if response:
+            print(f"💬 Risposta: {response}")
+            # Attende la fine del parlato senza bloccare il loop
+            with span('speak', chars=len(response)) as attrs:
+                await self.loop.run_in_executor(None, speech_queue.wait)
+                attrs['sentences'] = reply.sentences
+        return response
 
     async def _process_manual_voice_command(self):
         """Processa un comando vocale manuale (SPAZIO)"""
+        trace = start_trace('manual')
         try:
             print("🎙️  In ascolto per comando manuale...")
 
             # Usa il nuovo metodo per comando manuale
-            command = self.speech_handler.manual_voice_command()
+            with activate(trace):
+                command = self.speech_handler.manual_voice_command()
 
             if not command.strip():
                 print("❌ Nessun comando rilevato")
+                finish_trace(trace, 'ignored')
                 self.speech_handler.speak("Non ho sentito nulla. Riprova.")
                 return
 
-            await self._handle_voice_command(command)
+            await self._handle_voice_command(command, trace)
 
         except Exception as e:
             error_msg = f"Errore nel processare il comando: {e}"
             print(f"❌ {error_msg}")
             if DEBUG:
                 print(f"[MAIN] Dettagli errore: {e}")
+            finish_trace(trace, 'error')
             self.speech_handler.speak("Si è verificato un errore tecnico.")
 
     def _show_statistics(self):
         """Mostra statistiche del sistema"""
         uptime = datetime.now() - self.session_start
-        mic_info = self.speech_handler.get_microphone_info()
 
         print("\n📊 STATISTICHE JARVIS HELMET")
         print("=" * 40)
         print(f"⏱️  Tempo attivo: {uptime}")
+        startup = self.startup.get_status()
+        print(f"🚦 Avvio ({startup['state']}): " + ", ".join(
+            f"{name} {c['state']}" + (f" {c['seconds']:.1f}s" if c['seconds'] is not None else "")
+            for name, c in startup['components'].items()
+        ))
         print(f"🎯 Wake words rilevate: {self.wake_words_detected}")
         print(f"📝 Comandi processati: {self.commands_processed}")
-        print(f"🔊 Livello audio corrente: {self.audio_manager.get_audio_level():.2%}")
-        print(f"🤖 Modello AI: {self.ai_assistant.model}")
+        if self.audio_manager is not None:
+            print(f"🔊 Livello audio corrente: {self.audio_manager.get_audio_level():.2%}")
+        print(f"🤖 Modello AI: {self.ai_assistant.model if self.ai_assistant else 'in caricamento'}")
+        if self.ai_assistant is not None:
+            conversation = self.ai_assistant.conversation.get_stats()
+            residency = self.ai_assistant.residency.get_stats()
+            print("📦 Modelli in memoria: " + (", ".join(residency['loaded']) or "nessuno") + "".join(
+                f", ultimo {t['action']} {t['model']} {t['seconds']:.1f}s" for t in residency['timings'][-1:]
+            ))
+            print(f"💭 Conversazione: {conversation['turns']} turni (~{conversation['history_tokens']} token), "
+                  f"ultimo prompt valutato: {conversation['last_prompt_eval_count']} token")
+            if self.ai_assistant.response_cache is not None:
+                cache = self.ai_assistant.response_cache.get_stats()
+                print(f"🗃️  Cache risposte: {cache['entries']} voci, hit rate {cache['hit_rate']:.0%} "
+                      f"({cache['hits_exact']} esatti, {cache['hits_semantic']} simili, {cache['misses']} miss)")
+        intents = self.intent_router.get_stats()
+        print("⚡ Comandi locali: " + (", ".join(
+            f"{name} {i['hits']}" + (f" ({i['avg_ms']} ms)" if i['avg_ms'] is not None else "")
+            for name, i in intents.items() if i['hits']
+        ) or "nessuno"))
+
+        if self.speech_handler is None:
+            print("=" * 40 + "\n")
+            return
+
+        mic_info = self.speech_handler.get_microphone_info()
+        print(f"🗣️  Whisper: {WHISPER_MODEL} ({self.speech_handler.whisper_precision or 'in caricamento'})")
 
         if mic_info:
             print(f"🎤 Microfono: {mic_info['name']} (Indice: {mic_info['index']})")
             print(f"   Canali: {mic_info['channels']}, Sample Rate: {mic_info['sample_rate']}")
 
         print(f"🎧 Monitoraggio: {'Attivo' if self.speech_handler.is_monitoring else 'Inattivo'}")
+
+        capture_stats = self.speech_handler.capture_hub.get_stats()
+        print(f"🎚️  Cattura ({capture_stats['backend']}): {capture_stats['xruns']} xrun, "
+              f"{capture_stats['input_overflows']} overflow, "
+              f"{capture_stats['deficit_samples'] / SAMPLE_RATE * 1000:.0f} ms mancanti")
+
+        queue_stats = self.speech_handler.get_transcription_stats()
+        print(f"🧵 Coda trascrizione: {queue_stats['depth']} in attesa (max {queue_stats['max_depth']}), "
+              f"{queue_stats['dropped']} scartati, {queue_stats['coalesced']} uniti, "
+              f"worker {queue_stats['busy_workers']}/{queue_stats['workers']}")
+
+        if self.speech_handler.speculative_enabled:
+            spec = self.speech_handler.get_speculation_stats()
+            print(f"⚡ Endpointing speculativo: {spec['hits']} hit, {spec['misses']} miss "
+                  f"({spec['hit_rate']:.0%}), pronti a fine silenzio: {spec['ready_at_commit']}")
         print(f"🎙️  Modalità comando: {'Attiva' if self.speech_handler.waiting_for_command else 'Wake Word'}")
         print("=" * 40 + "\n")
 
-    def _change_ai_model(self):
+    async def _change_ai_model(self):
         """Permette di cambiare il modello AI"""
         try:
+            if self.ai_assistant is None:
+                print("⏳ Modello AI in caricamento")
+                return
+
             print("\n🤖 MODELLI AI DISPONIBILI")
             print("=" * 30)
 
-            available_models = self.ai_assistant.list_available_models()
+            available_models = await self.ai_assistant.list_available_models()
             if not available_models:
                 print("❌ Nessun modello trovato in Ollama")
                 print("💡 Scarica un modello con: ollama pull llama3.2:1b")
@@ -262,6 +493,24 @@ class ImprovedJarvisHelmet:
 
             print(f"\n✅ Modello attuale: {self.ai_assistant.model}")
 
+            # Lettura bloccante in un thread: il loop continua a servire voce e WebSocket
+            choice = await self.loop.run_in_executor(None, input, "🔢 Numero del modello (invio per annullare): ")
+            choice = choice.strip()
+            if not choice:
+                return
+            if not choice.isdigit() or not 1 <= int(choice) <= len(available_models):
+                print("❌ Scelta non valida")
+                return
+
+            target = available_models[int(choice) - 1]
+            print(f"⏳ Caricamento {target}...")
+            if await self.ai_assistant.switch_model(target):
+                timings = ', '.join(f"{t['action']} {t['model']} {t['seconds']:.1f}s"
+                                    for t in self.ai_assistant.residency.get_stats()['timings'][-2:])
+                print(f"✅ Modello cambiato: {target} ({timings})")
+            else:
+                print(f"❌ Impossibile caricare {target}, resta {self.ai_assistant.model}")
+
         except Exception as e:
             print(f"❌ Errore cambio modello: {e}")
 
@@ -281,10 +530,14 @@ class ImprovedJarvisHelmet:
     # Metodi per integrazione con WebSocket (chiamati dall'app mobile)
     async def _on_mobile_wake_word(self):
         """Gestisce attivazione da app mobile"""
+        if self.speech_handler is None:
+            return
         await self._handle_wake_word("Attivazione da app mobile")
 
     async def _on_mobile_listening_start(self):
         """Gestisce inizio ascolto da app mobile"""
+        if self.speech_handler is None:
+            return
         self.speech_handler.wait_for_command(timeout=15)
 
     async def _shutdown(self):
@@ -292,17 +545,26 @@ class ImprovedJarvisHelmet:
         print("🔄 Arresto sistema in corso...")
 
         try:
-            # Ferma monitoraggio vocale
-            self.speech_handler.stop_monitoring()
-
-            # Ferma tutti i componenti
-            self.speech_handler.stop_all()
-            self.audio_manager.cleanup()
+            # Ferma monitoraggio vocale e tutti i componenti già avviati
+            if self.speech_handler is not None:
+                self.speech_handler.stop_monitoring()
+                self.speech_handler.stop_all()
+            if self.audio_manager is not None:
+                self.audio_manager.cleanup()
+            if self.ai_assistant is not None:
+                await self.ai_assistant.close()
+
+            # Chiude il dispositivo audio condiviso
+            shutdown_capture_hub()
 
             # Ferma server mobile
             if hasattr(self, 'mobile_server') and self.mobile_server:
                 self.mobile_server.stop_server()
 
+            # Esporta le timeline degli enunciati (chrome://tracing, ui.perfetto.dev)
+            if TRACE_EXPORT_PATH and get_trace_store().latest() is not None:
+                get_trace_store().export_chrome(TRACE_EXPORT_PATH)
+
             # Mostra statistiche finali
             self._show_statistics()
 
@@ -343,7 +605,26 @@ async def main():
         sys.exit(1)
 
 
+def parse_args():
+    """Opzioni da riga di comando (sovrascrivono config/settings.py)"""
+    parser = argparse.ArgumentParser(description="Jarvis Helmet - Assistente Personale AI")
+    parser.add_argument('--audio-source', default=AUDIO_SOURCE,
+                        help="device[:indice], wav:<file|cartella>[,...], tcp:[host:]porta, noise")
+    parser.add_argument('--audio-speed', type=float, default=AUDIO_SOURCE_SPEED,
+                        help="velocità di replay dei WAV (1 = tempo reale, 0 = massima)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
+
+    # Sorgente audio condivisa da tutti i componenti
+    try:
+        configure_capture_hub(create_audio_source(args.audio_source, speed=args.audio_speed))
+    except Exception as e:
+        print(f"❌ Sorgente audio non valida: {e}")
+        sys.exit(1)
+
     # Avvia il sistema con asyncio
     try:
         asyncio.run(main())
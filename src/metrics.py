@@ -0,0 +1,310 @@
+"""
+Metriche aggregate: contatori, gauge e istogrammi a bucket fissi
+
+Gli aggiornamenti sui percorsi caldi (cattura, VAD, Whisper, invii WebSocket)
+non prendono lock: ogni thread scrive nel proprio shard e solo la lettura
+(endpoint Prometheus, messaggio `metrics_update`) somma gli shard.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# Secondi: da pochi millisecondi (invii WebSocket) a decine di secondi (Ollama, TTS)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Shards:
+    def __init__(self, size):
+        """
+        Valori numerici divisi per thread
+
+        Ogni thread incrementa solo la propria lista, quindi `values[i] += x`
+        non perde aggiornamenti anche senza lock. Il lock serve solo alla
+        creazione di uno shard e alla lettura; gli shard dei thread terminati
+        vengono sommati in `_retired`.
+        """
+        self.size = size
+        self._local = threading.local()
+        self._shards = []  # (thread, valori)
+        self._retired = [0] * size
+        self._lock = threading.Lock()
+
+    def local(self):
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = [0] * self.size
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            self._local.values = values
+        return values
+
+    def totals(self):
+        with self._lock:
+            alive = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    self._retired = [a + b for a, b in zip(self._retired, values)]
+            self._shards = alive
+            totals = list(self._retired)
+            for _, values in alive:
+                totals = [a + b for a, b in zip(totals, values)]
+        return totals
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help_text='', labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.function = None
+
+    def set_function(self, function):
+        """Il valore viene letto da `function()` al momento dell'esportazione"""
+        self.function = function
+        return self
+
+    def _read_function(self):
+        try:
+            return float(self.function())
+        except Exception:
+            return 0.0
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name, help_text='', labels=None):
+        super().__init__(name, help_text, labels)
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.local()[0] += amount
+
+    @property
+    def value(self):
+        if self.function is not None:
+            return self._read_function()
+        return self._shards.totals()[0]
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def __init__(self, name, help_text='', labels=None):
+        super().__init__(name, help_text, labels)
+        self._value = 0.0
+
+    def set(self, value):
+        # Una sola assegnazione: atomica, nessun lock
+        self._value = value
+
+    @property
+    def value(self):
+        if self.function is not None:
+            return self._read_function()
+        return self._value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help_text='', labels=None, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Un conteggio per bucket, uno per +Inf, poi la somma
+        self._shards = _Shards(len(self.buckets) + 2)
+
+    def observe(self, value):
+        values = self._shards.local()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    @contextmanager
+    def time(self):
+        """Osserva la durata del blocco `with` in secondi"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        """(conteggi cumulativi per bucket incluso +Inf, somma, numero di osservazioni)"""
+        totals = self._shards.totals()
+        cumulative = []
+        running = 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1], running
+
+    def quantile(self, q, snapshot=None):
+        """Stima del quantile per interpolazione lineare dentro il bucket"""
+        cumulative, _, count = snapshot or self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        lower = 0.0
+        previous = 0
+        for bound, cum in zip(self.buckets, cumulative):
+            if cum >= rank:
+                return lower + (bound - lower) * (rank - previous) / max(cum - previous, 1)
+            lower, previous = bound, cum
+        return self.buckets[-1]
+
+
+class RateWindow:
+    def __init__(self, window=60.0, maxlen=10000):
+        """Eventi negli ultimi `window` secondi (deque.append è atomico)"""
+        self.window = window
+        self._events = deque(maxlen=maxlen)
+
+    def record(self):
+        self._events.append(time.monotonic())
+
+    def count(self):
+        cutoff = time.monotonic() - self.window
+        return sum(1 for t in list(self._events) if t >= cutoff)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Raccolta delle metriche per nome ed etichette"""
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = cls(name, help_text, labels, **kwargs)
+                    self._metrics[key] = metric
+        return metric
+
+    def counter(self, name, help_text='', labels=None):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text='', labels=None):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text='', labels=None, buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def remove(self, metric):
+        with self._lock:
+            key = (metric.name, tuple(sorted(metric.labels.items())))
+            self._metrics.pop(key, None)
+
+    def _families(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+        return families
+
+    @staticmethod
+    def _format_labels(labels, extra=None):
+        items = list(labels.items()) + list((extra or {}).items())
+        if not items:
+            return ''
+        escaped = ('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items)
+        return '{' + ','.join(escaped) + '}'
+
+    def render_prometheus(self):
+        """Formato testo di Prometheus (text/plain; version=0.0.4)"""
+        lines = []
+        for name, metrics in sorted(self._families().items()):
+            first = metrics[0]
+            if first.help:
+                lines.append(f"# HELP {name} {first.help}")
+            lines.append(f"# TYPE {name} {first.type}")
+
+            for metric in metrics:
+                if isinstance(metric, Histogram):
+                    cumulative, total, count = metric.snapshot()
+                    for bound, cum in zip(metric.buckets + ('+Inf',), cumulative):
+                        le = bound if isinstance(bound, str) else repr(float(bound))
+                        lines.append(f"{name}_bucket{self._format_labels(metric.labels, {'le': le})} {cum}")
+                    lines.append(f"{name}_sum{self._format_labels(metric.labels)} {total}")
+                    lines.append(f"{name}_count{self._format_labels(metric.labels)} {count}")
+                else:
+                    lines.append(f"{name}{self._format_labels(metric.labels)} {metric.value}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Vista compatta per l'app mobile: valori e, per gli istogrammi, conteggio/media/p50/p95 in ms"""
+        result = {'counters': {}, 'gauges': {}, 'histograms': {}}
+        for name, metrics in sorted(self._families().items()):
+            for metric in metrics:
+                key = name + self._format_labels(metric.labels)
+                if isinstance(metric, Histogram):
+                    snapshot = metric.snapshot()
+                    _, total, count = snapshot
+                    p50, p95 = metric.quantile(0.5, snapshot), metric.quantile(0.95, snapshot)
+                    result['histograms'][key] = {
+                        'count': count,
+                        'avg_ms': round(total / count * 1000, 1) if count else None,
+                        'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                        'p95_ms': round(p95 * 1000, 1) if p95 is not None else None
+                    }
+                else:
+                    result[metric.type + 's'][key] = round(metric.value, 3)
+        return result
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry():
+    return _registry
+
+
+# Metriche di Jarvis (le etichette si ottengono con le funzioni qui sotto)
+VAD_TRIGGERS = _registry.counter('jarvis_vad_triggers_total', 'Enunciati confermati dal VAD')
+VAD_TRIGGER_WINDOW = RateWindow(60.0)
+_registry.gauge('jarvis_vad_triggers_per_minute', 'Enunciati confermati dal VAD nell\'ultimo minuto').set_function(
+    VAD_TRIGGER_WINDOW.count
+)
+CAPTURE_XRUNS = _registry.counter('jarvis_capture_xruns_total', 'Overflow/xrun segnalati da PortAudio')
+CAPTURE_DEFICIT = _registry.gauge('jarvis_capture_deficit_samples',
+                                  'Campioni mancanti rispetto al tempo trascorso (stima dei frame persi)')
+TRANSCRIPTION_JOBS_DROPPED = _registry.counter('jarvis_transcription_jobs_dropped_total',
+                                               'Lavori di trascrizione scartati a coda piena')
+LLM_SECONDS = _registry.histogram('jarvis_llm_seconds', 'Durata delle richieste a Ollama')
+LLM_ERRORS = _registry.counter('jarvis_llm_errors_total', 'Richieste a Ollama fallite')
+TTS_SECONDS = _registry.histogram('jarvis_tts_seconds', 'Durata della sintesi vocale')
+TIME_TO_FIRST_AUDIO = _registry.histogram('jarvis_time_to_first_audio_seconds',
+                                          'Dalla fine del parlato all\'inizio della prima frase pronunciata')
+WS_SEND_SECONDS = _registry.histogram('jarvis_ws_send_seconds', 'Latenza di invio dei messaggi WebSocket')
+
+
+def transcription_seconds(path):
+    """Istogramma della durata di Whisper per percorso ('fast', 'transcribe', 'streaming_final')"""
+    return _registry.histogram('jarvis_transcription_seconds', 'Durata della trascrizione Whisper',
+                               {'path': path})
+
+
+def dropped_samples(stage):
+    """Campioni audio persi per fase ('capture' o nome del consumatore del buffer)"""
+    return _registry.counter('jarvis_dropped_samples_total', 'Campioni audio persi', {'stage': stage})
+
+
+def queue_depth(queue):
+    """Profondità di una coda (lavori di trascrizione, ritardo dei consumatori dell'hub)"""
+    return _registry.gauge('jarvis_queue_depth', 'Elementi in attesa per coda', {'queue': queue})
+
+
+def record_vad_trigger():
+    VAD_TRIGGERS.inc()
+    VAD_TRIGGER_WINDOW.record()
@@ -4,17 +4,47 @@ Server HTTP per servire l'app mobile Jarvis Helmet Controller
 """
 
 import http.server
+import json
 import socketserver
 import os
 import threading
 import webbrowser
 import socket
 from config.settings import DEBUG
+from metrics import get_metrics_registry
+
+
+class MobileRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """File statici dell'app mobile più gli endpoint /metrics (Prometheus) e /health"""
+
+    status_provider = None  # Funzione che restituisce lo stato di avvio dei componenti
+
+    def _send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = get_metrics_registry().render_prometheus().encode('utf-8')
+            self._send_body(200, 'text/plain; version=0.0.4; charset=utf-8', body)
+            return
+        if path == '/health':
+            status = self.status_provider() if self.status_provider else {'state': 'ready', 'components': {}}
+            # 200 solo a sistema completamente pronto: "degraded" è in ascolto ma non ancora operativo
+            code = 200 if status['state'] == 'ready' else 503
+            self._send_body(code, 'application/json', json.dumps(status).encode('utf-8'))
+            return
+        super().do_GET()
 
 
 class JarvisMobileServer:
-    def __init__(self, port=8766, mobile_app_dir="mobile_app"):
+    def __init__(self, port=8766, mobile_app_dir="mobile_app", status_provider=None):
         self.port = port
+        self.status_provider = status_provider
         self.mobile_app_dir = mobile_app_dir
         self.server = None
         self.thread = None
@@ -34,7 +64,9 @@ class JarvisMobileServer:
                     # Cambia directory di lavoro per servire i file
                     os.chdir(self.mobile_app_dir)
 
-                    with socketserver.TCPServer(("", self.port), http.server.SimpleHTTPRequestHandler) as httpd:
+                    handler = type('JarvisRequestHandler', (MobileRequestHandler,),
+                                   {'status_provider': staticmethod(self.status_provider)})
+                    with socketserver.TCPServer(("", self.port), handler) as httpd:
                         self.server = httpd
 
                         if DEBUG:
@@ -872,9 +904,9 @@ self.addEventListener('fetch', function(event) {
 console.log('[SW] Jarvis Helmet Service Worker v1.0.0 caricato');'''
 
 
-def start_mobile_app_server(port=8766):
+def start_mobile_app_server(port=8766, status_provider=None):
     """Funzione di utility per avviare il server mobile"""
-    server = JarvisMobileServer(port)
+    server = JarvisMobileServer(port, status_provider=status_provider)
 
     # Crea i file se non esistono
     server.create_mobile_files()
@@ -0,0 +1,120 @@
+"""
+Permanenza in memoria dei modelli di Ollama: precaricamento, keep-alive e cambio modello
+
+Ollama carica un modello alla prima richiesta e lo scarica dopo 5 minuti di
+inattività: senza precaricamento il primo comando dopo l'avvio (o dopo un
+cambio di modello) paga l'intero caricamento. Una richiesta senza prompt
+con `keep_alive` carica il modello e lo tiene in memoria per quella durata
+(negativa = sempre); con `keep_alive: 0` lo scarica subito. Ogni richiesta
+di chat ripete lo stesso `keep_alive`, altrimenti Ollama tornerebbe al
+default di 5 minuti.
+"""
+
+import threading
+import time
+import requests
+from config.settings import DEBUG, OLLAMA_KEEP_ALIVE, OLLAMA_LOAD_TIMEOUT, OLLAMA_UNLOAD_PREVIOUS
+from metrics import get_metrics_registry
+
+
+def keep_alive_value(value=OLLAMA_KEEP_ALIVE):
+    """Durata per Ollama: i numeri sono secondi ('-1' → -1), il resto una durata ('30m')"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class ModelResidency:
+    def __init__(self, client, host, keep_alive=OLLAMA_KEEP_ALIVE, load_timeout=OLLAMA_LOAD_TIMEOUT,
+                 unload_previous=OLLAMA_UNLOAD_PREVIOUS):
+        """
+        Args:
+            client (AsyncOllamaClient): per caricamenti e cambi dagli event loop
+            host (str): indirizzo di Ollama (precaricamento sincrono nel thread di avvio)
+            keep_alive (str): permanenza in memoria dopo ogni richiesta
+            load_timeout (float): secondi massimi per caricare un modello
+            unload_previous (bool): dopo un cambio scarica il modello precedente
+        """
+        self.client = client
+        self.host = host
+        self.keep_alive = keep_alive_value(keep_alive)
+        self.load_timeout = load_timeout
+        self.unload_previous = unload_previous
+        self.loaded = set()  # Modelli caricati da noi e non ancora scaricati
+        self.timings = []  # {'model', 'action', 'seconds', 'load_ms'} (ultimi 20)
+        self._lock = threading.Lock()
+
+    def _payload(self, model, keep_alive):
+        # Nessun prompt: Ollama carica (o scarica) il modello senza generare
+        return {'model': model, 'keep_alive': keep_alive, 'stream': False}
+
+    def _record(self, model, action, seconds, result=None):
+        load_ns = (result or {}).get('load_duration')
+        timing = {
+            'model': model,
+            'action': action,
+            'seconds': round(seconds, 3),
+            'load_ms': round(load_ns / 1e6, 1) if load_ns else None
+        }
+        get_metrics_registry().histogram('jarvis_model_residency_seconds', 'Caricamento e scaricamento dei modelli',
+                                         {'action': action}).observe(seconds)
+        with self._lock:
+            if action == 'unload':
+                self.loaded.discard(model)
+            else:
+                self.loaded.add(model)
+            self.timings.append(timing)
+            del self.timings[:-20]
+        if DEBUG:
+            print(f"[OLLAMA] Modello {model}: {action} in {seconds:.2f}s")
+        return timing
+
+    def prewarm(self, model):
+        """Carica il modello e lo tiene in memoria (sincrono: gira in una fase di avvio)"""
+        start = time.perf_counter()
+        response = requests.post(f"{self.host}/api/generate", json=self._payload(model, self.keep_alive),
+                                 timeout=self.load_timeout)
+        if response.status_code != 200:
+            raise Exception(f"Precaricamento {model} fallito (status: {response.status_code})")
+        return self._record(model, 'prewarm', time.perf_counter() - start, response.json())
+
+    async def load(self, model):
+        """Carica il modello (immediato se è già in memoria)"""
+        start = time.perf_counter()
+        result = await self.client.post_json('/api/generate', self._payload(model, self.keep_alive),
+                                             timeout=self.load_timeout)
+        return self._record(model, 'load', time.perf_counter() - start, result)
+
+    async def unload(self, model):
+        start = time.perf_counter()
+        result = await self.client.post_json('/api/generate', self._payload(model, 0), timeout=30)
+        return self._record(model, 'unload', time.perf_counter() - start, result)
+
+    async def switch(self, current, target):
+        """
+        Precarica `target` prima del cambio, poi (facoltativo) scarica `current`
+
+        Se il caricamento fallisce solleva l'eccezione: il chiamante continua
+        con il modello attuale. Un errore nello scaricamento non annulla il cambio.
+        """
+        await self.load(target)
+        if self.unload_previous and current and current != target:
+            try:
+                await self.unload(current)
+            except Exception as e:
+                if DEBUG:
+                    print(f"[OLLAMA] Errore scaricamento {current}: {e}")
+
+    async def resident_models(self):
+        """Modelli attualmente in memoria secondo Ollama (/api/ps)"""
+        data = await self.client.get_json('/api/ps', timeout=5)
+        return [m['name'] for m in data.get('models', [])]
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'keep_alive': self.keep_alive,
+                'loaded': sorted(self.loaded),
+                'timings': list(self.timings)
+            }
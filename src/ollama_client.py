@@ -0,0 +1,110 @@
+"""
+Client HTTP asincrono per l'API di Ollama (aiohttp, connessioni persistenti)
+
+Le richieste non bloccano l'event loop: mentre Ollama genera, il loop
+principale continua a servire callback, tastiera e WebSocket. Le connessioni
+TCP restano aperte tra una richiesta e l'altra (keep-alive); ogni event loop
+che usa il client (loop principale, thread del server WebSocket) ha la propria
+sessione, perché una sessione aiohttp appartiene al loop che l'ha creata.
+"""
+
+import asyncio
+import json
+import threading
+import aiohttp
+from config.settings import DEBUG, OLLAMA_HOST, OLLAMA_REQUEST_TIMEOUT, OLLAMA_MAX_CONNECTIONS
+
+
+class OllamaError(Exception):
+    """Risposta di errore da Ollama (status HTTP diverso da 200)"""
+
+    def __init__(self, status, message=''):
+        super().__init__(f"Ollama ha risposto {status}: {message}".rstrip(': '))
+        self.status = status
+
+
+class AsyncOllamaClient:
+    def __init__(self, host=None, timeout=OLLAMA_REQUEST_TIMEOUT, max_connections=OLLAMA_MAX_CONNECTIONS):
+        """
+        Args:
+            host (str): indirizzo di Ollama (default da config/settings.py)
+            timeout (float): timeout di default per richiesta, in secondi
+            max_connections (int): connessioni aperte al massimo per event loop
+        """
+        self.host = (host or OLLAMA_HOST).rstrip('/')
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._sessions = {}  # event loop -> aiohttp.ClientSession
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _session(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                # Sessioni di loop già chiusi: le connessioni sono già state abbandonate
+                for stale in [l for l in self._sessions if l.is_closed()]:
+                    del self._sessions[stale]
+                connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+                session = aiohttp.ClientSession(connector=connector)
+                self._sessions[loop] = session
+        return session
+
+    def _timeout(self, timeout):
+        return aiohttp.ClientTimeout(total=self.timeout if timeout is None else timeout)
+
+    async def get_json(self, path, timeout=None):
+        """GET su `path` (es. '/api/tags'); OllamaError se lo status non è 200"""
+        self.requests += 1
+        async with self._session().get(self.host + path, timeout=self._timeout(timeout)) as response:
+            if response.status != 200:
+                raise OllamaError(response.status, await response.text())
+            return await response.json(content_type=None)
+
+    async def post_json(self, path, payload, timeout=None):
+        """POST JSON con risposta unica (`stream` deve essere False)"""
+        self.requests += 1
+        async with self._session().post(self.host + path, json=payload, timeout=self._timeout(timeout)) as response:
+            if response.status != 200:
+                raise OllamaError(response.status, await response.text())
+            return await response.json(content_type=None)
+
+    async def stream_json(self, path, payload, timeout=None):
+        """
+        POST con risposta in streaming NDJSON: un dizionario per riga
+
+        Il timeout vale per l'intera risposta. Se il chiamante interrompe
+        l'iterazione (o il task viene cancellato) la connessione viene chiusa
+        e Ollama smette di generare.
+        """
+        self.requests += 1
+        async with self._session().post(self.host + path, json=payload, timeout=self._timeout(timeout)) as response:
+            if response.status != 200:
+                raise OllamaError(response.status, await response.text())
+            async for line in response.content:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    async def list_models(self, timeout=5):
+        data = await self.get_json('/api/tags', timeout=timeout)
+        return [m['name'] for m in data.get('models', [])]
+
+    async def close(self):
+        """Chiude le sessioni: quella del loop corrente subito, le altre nel proprio loop"""
+        with self._lock:
+            sessions = list(self._sessions.items())
+            self._sessions.clear()
+
+        current = asyncio.get_running_loop()
+        for loop, session in sessions:
+            if session.closed:
+                continue
+            if loop is current:
+                await session.close()
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
+
+        if DEBUG and sessions:
+            print(f"[OLLAMA] Client chiuso ({self.requests} richieste)")
@@ -0,0 +1,222 @@
+"""
+Cache delle risposte di Ollama per le domande ricorrenti
+
+Prima il confronto esatto sul testo normalizzato, poi la ricerca per
+similarità: l'embedding della domanda (Ollama /api/embed) viene confrontato
+con quelli in cache in un'unica moltiplicazione matrice-vettore. Le voci
+scadono dopo un TTL e oltre la capacità si scarta la meno usata di recente.
+Le domande che dipendono dal momento (ora, data, stato) o dalla
+conversazione in corso non vengono mai messe in cache.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from config.settings import (
+    DEBUG, WAKE_WORDS, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_EMBED_MODEL
+)
+from metrics import get_metrics_registry
+
+# Dipendono dal momento: mai in cache se compaiono nella domanda o nella risposta
+TIME_DEPENDENT = [
+    re.compile(r"\b(ora|ore|orario|adesso|oggi|domani|ieri|stasera|stamattina|meteo|temperatura|"
+               r"notizie|attualmente)\b"),
+    re.compile(r"\b\d{1,2}[:.]\d{2}\b"),  # Orari
+]
+# Dipendono dallo stato del casco o dalla conversazione in corso: mai in cache se compaiono nella domanda
+CONTEXT_DEPENDENT = [
+    re.compile(r"\b(data|giorno|settimana|mese|anno|stato|sistema|batteria|volume|modello)\b"),
+    re.compile(r"^(e|ma|anche|invece|quindi|allora)\b"),  # Domande di seguito
+    re.compile(r"\b(lui|lei|loro|questo|questa|quello|quella|prima|precedente|hai detto|ripeti)\b"),
+]
+# TTL per domanda (la prima regola che corrisponde), altrimenti RESPONSE_CACHE_TTL
+CACHE_RULES = [
+    # Conversioni e definizioni: stabili
+    (re.compile(r"\b(quant[io]|convert\w*|in (metri|chili|chilometri|litri|gradi|miglia|piedi|libbre))\b"),
+     24 * 3600),
+]
+
+# Risposte da non memorizzare (errori del sistema)
+_ERROR_REPLY = re.compile(r"^mi dispiace")
+
+CACHE_REQUESTS = 'jarvis_response_cache_requests_total'
+
+
+def normalize(text):
+    """Minuscolo, senza punteggiatura, spazi uniformi e senza wake word iniziale"""
+    text = unicodedata.normalize('NFC', text).lower()
+    text = re.sub(r"[^\w\s']", ' ', text)
+    text = ' '.join(text.replace("'", "' ").split())
+    for wake_word in sorted(WAKE_WORDS, key=len, reverse=True):
+        if text.startswith(wake_word + ' '):
+            text = text[len(wake_word) + 1:]
+            break
+    return text
+
+
+def is_cacheable_question(question):
+    question = normalize(question)
+    return bool(question) and not any(p.search(question) for p in TIME_DEPENDENT + CONTEXT_DEPENDENT)
+
+
+def cache_ttl(question, answer, default=RESPONSE_CACHE_TTL):
+    """TTL in secondi per la coppia domanda/risposta (0 = non memorizzare)"""
+    if not is_cacheable_question(question) or not answer:
+        return 0
+    answer = normalize(answer)
+    if _ERROR_REPLY.match(answer) or any(p.search(answer) for p in TIME_DEPENDENT):
+        return 0
+    question = normalize(question)
+    return next((ttl for pattern, ttl in CACHE_RULES if pattern.search(question)), default)
+
+
+class ResponseCache:
+    def __init__(self, client=None, capacity=RESPONSE_CACHE_SIZE, similarity=RESPONSE_CACHE_SIMILARITY,
+                 embed_model=RESPONSE_CACHE_EMBED_MODEL):
+        """
+        Args:
+            client (AsyncOllamaClient | None): per gli embedding; None = solo confronto esatto
+            capacity (int): voci massime
+            similarity (float): similarità coseno minima per un hit semantico
+            embed_model (str): modello di embedding di Ollama ('' = solo confronto esatto)
+        """
+        self.client = client if embed_model else None
+        self.capacity = capacity
+        self.similarity = similarity
+        self.embed_model = embed_model
+        self.entries = OrderedDict()  # testo normalizzato -> voce, dalla meno recente
+        self.matrix = None  # Embedding normalizzati, una riga per voce
+        self.row_keys = [None] * capacity
+        self.free_rows = list(range(capacity - 1, -1, -1))
+        self.embeddings_failed_at = None
+        self.stats = {'hits_exact': 0, 'hits_semantic': 0, 'misses': 0, 'skipped': 0, 'stored': 0, 'evicted': 0}
+        self._last_embedding = (None, None)
+        self._lock = threading.Lock()
+
+    def _count(self, result):
+        self.stats[result] += 1
+        get_metrics_registry().counter(CACHE_REQUESTS, 'Ricerche nella cache delle risposte',
+                                       {'result': result}).inc()
+
+    async def _embed(self, key):
+        """Embedding normalizzato (None se il modello non è disponibile: riprova dopo 5 minuti)"""
+        if self.client is None:
+            return None
+        if self.embeddings_failed_at is not None and time.monotonic() - self.embeddings_failed_at < 300:
+            return None
+        if self._last_embedding[0] == key:
+            return self._last_embedding[1]
+        try:
+            data = await self.client.post_json('/api/embed', {'model': self.embed_model, 'input': key}, timeout=5)
+            vector = np.asarray(data['embeddings'][0], dtype=np.float32)
+        except Exception as e:
+            self.embeddings_failed_at = time.monotonic()
+            if DEBUG:
+                print(f"[CACHE] Embedding non disponibili ({self.embed_model}): {e}")
+            return None
+        self.embeddings_failed_at = None
+        vector /= max(np.linalg.norm(vector), 1e-12)
+        self._last_embedding = (key, vector)
+        return vector
+
+    def _expire(self, now):
+        for key in [k for k, entry in self.entries.items() if entry['expires'] <= now]:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        if entry['row'] is not None:
+            self.row_keys[entry['row']] = None
+            self.free_rows.append(entry['row'])
+
+    async def lookup(self, question):
+        """Risposta in cache per la domanda, o None"""
+        key = normalize(question)
+        if not is_cacheable_question(question):
+            with self._lock:
+                self._count('skipped')
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                entry['hits'] += 1
+                self._count('hits_exact')
+                return entry['answer']
+            has_vectors = self.matrix is not None and any(k is not None for k in self.row_keys)
+
+        vector = await self._embed(key) if has_vectors else None
+        if vector is not None:
+            with self._lock:
+                rows = [i for i, k in enumerate(self.row_keys) if k is not None]
+                if rows and self.matrix.shape[1] == len(vector):
+                    scores = self.matrix[rows] @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        match = self.row_keys[rows[best]]
+                        entry = self.entries[match]
+                        self.entries.move_to_end(match)
+                        entry['hits'] += 1
+                        self._count('hits_semantic')
+                        if DEBUG:
+                            print(f"[CACHE] Simile a '{match}' ({scores[best]:.3f})")
+                        return entry['answer']
+
+        with self._lock:
+            self._count('misses')
+        return None
+
+    async def store(self, question, answer):
+        """Memorizza la risposta se le regole lo consentono"""
+        key = normalize(question)
+        ttl = cache_ttl(question, answer)
+        if not key or ttl <= 0:
+            return False
+        vector = await self._embed(key)
+
+        with self._lock:
+            if key in self.entries:
+                self._remove(key)
+            while len(self.entries) >= self.capacity:
+                self._remove(next(iter(self.entries)))  # Meno usata di recente
+                self.stats['evicted'] += 1
+
+            row = None
+            if vector is not None:
+                if self.matrix is None or self.matrix.shape[1] != len(vector):
+                    # Primo embedding (o modello cambiato): le righe esistenti non sono confrontabili
+                    self.matrix = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+                    for entry in self.entries.values():
+                        entry['row'] = None
+                    self.row_keys = [None] * self.capacity
+                    self.free_rows = list(range(self.capacity - 1, -1, -1))
+                row = self.free_rows.pop()
+                self.matrix[row] = vector
+                self.row_keys[row] = key
+
+            self.entries[key] = {'answer': answer, 'expires': time.monotonic() + ttl, 'row': row, 'hits': 0}
+            self.stats['stored'] += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            for key in list(self.entries):
+                self._remove(key)
+
+    def get_stats(self):
+        with self._lock:
+            hits = self.stats['hits_exact'] + self.stats['hits_semantic']
+            lookups = hits + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self.entries),
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'semantic': self.client is not None and self.embeddings_failed_at is None
+            }
@@ -0,0 +1,162 @@
+"""
+Buffer circolare NumPy preallocato per la cattura audio
+"""
+
+import numpy as np
+from config.settings import SAMPLE_RATE, AUDIO_BUFFER_SIZE
+
+
+class AudioRingBuffer:
+    def __init__(self, seconds=AUDIO_BUFFER_SIZE, sample_rate=SAMPLE_RATE, dtype=np.int16):
+        """
+        Buffer circolare con cursori assoluti (in campioni)
+
+        Ogni campione è scritto due volte (in posizione p e p + capacità), così
+        qualsiasi intervallo lungo al massimo `capacity` è contiguo in memoria
+        e può essere restituito come vista senza copie. Un solo thread scrive;
+        i lettori non prendono lock e verificano dopo la lettura che i dati
+        non siano stati sovrascritti nel frattempo.
+        """
+        self.sample_rate = sample_rate
+        self.capacity = int(seconds * sample_rate)
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros(self.capacity * 2, dtype=self.dtype)
+        self.write_pos = 0  # Campioni totali scritti dall'avvio
+        self._write_end = 0  # Fine della scrittura in corso (annunciata prima di copiare)
+        self._valid_from = 0  # Primo cursore con dati validi (dopo un seek)
+
+    def write(self, samples):
+        """
+        Scrive un blocco di campioni (bytes o array)
+
+        Returns:
+            np.ndarray: vista sui campioni appena scritti
+        """
+        if isinstance(samples, (bytes, bytearray, memoryview)):
+            samples = np.frombuffer(samples, dtype=self.dtype)
+
+        n = len(samples)
+        if n > self.capacity:
+            # Si conserva solo la coda che entra nel buffer
+            self.write_pos += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        cap = self.capacity
+        idx = self.write_pos % cap
+        self._write_end = self.write_pos + n
+        self._data[idx:idx + n] = samples
+        if idx + n <= cap:
+            self._data[idx + cap:idx + cap + n] = samples
+        else:
+            split = cap - idx
+            self._data[idx + cap:] = samples[:split]
+            self._data[:n - split] = samples[split:]
+
+        self.write_pos += n
+        return self._data[idx:idx + n]
+
+    def seek(self, position):
+        """
+        Sposta il cursore di scrittura (es. per restare allineati a un altro buffer)
+
+        I dati scritti prima non sono più leggibili.
+        """
+        self._write_end = position
+        self.write_pos = position
+        self._valid_from = position
+
+    @property
+    def oldest_pos(self):
+        """Cursore del campione più vecchio ancora disponibile"""
+        return max(self._valid_from, self.write_pos - self.capacity)
+
+    def is_available(self, start):
+        """True se i campioni da `start` in poi non sono ancora stati sovrascritti"""
+        return start >= self.oldest_pos
+
+    def read(self, start, end=None):
+        """
+        Vista (senza copie) sui campioni [start, end)
+
+        La vista resta valida finché il writer non avanza di `capacity` campioni
+        oltre `start`: chi la usa a lungo deve ricontrollare `is_available(start)`.
+
+        Returns:
+            np.ndarray | None: None se l'intervallo è già stato sovrascritto
+        """
+        end = self.write_pos if end is None else min(end, self.write_pos)
+        if not self.is_available(start) or end < start:
+            return None
+        idx = start % self.capacity
+        return self._data[idx:idx + (end - start)]
+
+    def latest(self, n):
+        """Vista sugli ultimi `n` campioni scritti"""
+        n = min(n, self.write_pos, self.capacity)
+        return self.read(self.write_pos - n)
+
+    def read_float32(self, start, end=None):
+        """
+        Copia float32 normalizzata di [start, end), verificata dopo la conversione
+
+        Returns:
+            np.ndarray | None: None se il writer ha sovrascritto i dati durante la copia
+        """
+        view = self.read(start, end)
+        if view is None:
+            return None
+        audio_data = view.astype(np.float32)
+        if start < self._write_end - self.capacity:
+            return None  # Sovrascritto durante la copia
+        if self.dtype == np.int16:
+            audio_data /= 32768.0
+        return audio_data
+
+    def segment(self, start, end=None, peak=None):
+        """Riferimento leggero a un intervallo del buffer"""
+        return AudioSegment(self, start, self.write_pos if end is None else end, peak)
+
+
+class AudioSegment:
+    def __init__(self, ring, start, end, peak=None):
+        """
+        Intervallo [start, end) di un AudioRingBuffer, senza copiare l'audio
+
+        `peak` è il picco assoluto già misurato durante la cattura (se noto),
+        usato per normalizzare senza ripassare tutto l'audio.
+        """
+        self.ring = ring
+        self.start = start
+        self.end = end
+        self.peak = peak
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def duration(self):
+        return len(self) / self.ring.sample_rate
+
+    def merge(self, other):
+        """
+        Unisce due segmenti dello stesso buffer (incluso l'eventuale intervallo tra i due)
+
+        Returns:
+            AudioSegment | None: None se il segmento unito non entra nel buffer
+        """
+        if other.ring is not self.ring:
+            return None
+        start, end = min(self.start, other.start), max(self.end, other.end)
+        if end - start > self.ring.capacity:
+            return None
+        peak = None
+        if self.peak is not None and other.peak is not None:
+            peak = max(self.peak, other.peak)
+        return AudioSegment(self.ring, start, end, peak)
+
+    def view(self):
+        return self.ring.read(self.start, self.end)
+
+    def to_float32(self):
+        return self.ring.read_float32(self.start, self.end)
@@ -1,50 +1,81 @@
-import whisper
-import pyttsx3
 import threading
 import time
 import numpy as np
-import pyaudio
 import wave
 import io
 import tempfile
 import os
-from collections import deque
 from config.settings import (
-    MICROPHONE_INDEX, SPEECH_TIMEOUT, SPEECH_PHRASE_TIMEOUT,
+    TTS_ENABLED,
+    SPEECH_TIMEOUT, SPEECH_PHRASE_TIMEOUT,
     TTS_RATE, TTS_VOLUME, TTS_VOICE, WAKE_WORDS, DEBUG,
     WHISPER_MODEL, WHISPER_LANGUAGE, MINIMUM_AUDIO_LENGTH,
-    SAMPLE_RATE, CHUNK_SIZE
+    SAMPLE_RATE, CHUNK_SIZE, STREAMING_TRANSCRIPTION, WAKE_WORD_SPOTTER_VERIFY,
+    WHISPER_FAST_DECODE, WHISPER_NO_SPEECH_THRESHOLD, WHISPER_LOGPROB_THRESHOLD,
+    SPECULATIVE_ENDPOINTING, SPECULATIVE_SILENCE_CHUNKS, STT_BACKEND
 )
+from streaming_transcriber import StreamingWhisperTranscriber
+from keyword_spotter import KeywordSpotter
+from transcription_queue import TranscriptionJob, TranscriptionWorkQueue, SpeculativeTranscription
+from ring_buffer import AudioRingBuffer
+from audio_capture import get_capture_hub
+from tracing import start_trace, current_trace, activate, span, finish_trace
+from metrics import TTS_SECONDS, transcription_seconds, queue_depth, record_vad_trigger
+from speech_queue import SpeechQueue
+from vad import create_vad
+from audio_preprocessing import StreamingPreprocessor
+from whisper_engine import CommandTranscriber, load_whisper_model
+from stt_worker import STTWorkerPool, STT_BACKENDS
+
+try:
+    import pyttsx3
+except ImportError:
+    pyttsx3 = None  # Esecuzione senza sintesi vocale (headless, CI)
 
 
 class ImprovedWhisperSpeechHandler:
-    def __init__(self):
-        """Inizializza il gestore per speech-to-text con Whisper e text-to-speech"""
-
-        # Inizializza Whisper
-        if DEBUG:
-            print(f"[WHISPER] Caricando modello {WHISPER_MODEL}...")
-
-        try:
-            self.whisper_model = whisper.load_model(WHISPER_MODEL)
-            if DEBUG:
-                print(f"[WHISPER] Modello {WHISPER_MODEL} caricato con successo")
-        except Exception as e:
-            if DEBUG:
-                print(f"[WHISPER] Errore caricamento modello: {e}")
-            raise Exception(f"Impossibile caricare Whisper: {e}")
-
-        # Inizializza PyAudio per registrazione
-        self.audio = pyaudio.PyAudio()
-        self.microphone_index = self._get_best_microphone()
+    def __init__(self, load_model=True):
+        """
+        Inizializza il gestore per speech-to-text con Whisper e text-to-speech
+
+        Con load_model=False Whisper va caricato dopo con `load_model()`
+        (avvio parallelo): nel frattempo la cattura e il VAD funzionano e gli
+        enunciati restano in coda finché il modello non è pronto.
+        """
+        if STT_BACKEND not in STT_BACKENDS:
+            raise ValueError(f"STT_BACKEND sconosciuto: {STT_BACKEND} (validi: {', '.join(STT_BACKENDS)})")
+
+        self.whisper_model = None
+        self.whisper_precision = None
+        self.stt_pool = None
+        self.command_transcriber = None  # Decodifica veloce per comandi brevi (sessione persistente)
+        self.model_ready = threading.Event()
+        self.model_error = None
+
+        # Hub di cattura condiviso: un solo dispositivo aperto per tutto il processo
+        self.capture_hub = get_capture_hub()
+        self.audio = self.capture_hub.pyaudio
+        self.microphone_index = self.capture_hub.device_index
+        self.monitor_subscription = None
+
+        # Inizializza Text-to-Speech (facoltativo: senza, le risposte vanno solo a video)
+        self.tts_engine = None
+        self.tts_volume = TTS_VOLUME
+        if TTS_ENABLED and pyttsx3 is not None:
+            try:
+                self.tts_engine = pyttsx3.init()
+                self.tts_engine.setProperty('rate', TTS_RATE)
+                self.tts_engine.setProperty('volume', TTS_VOLUME)
 
-        # Inizializza Text-to-Speech
-        self.tts_engine = pyttsx3.init()
-        self.tts_engine.setProperty('rate', TTS_RATE)
-        self.tts_engine.setProperty('volume', TTS_VOLUME)
+                # Configura voce italiana se disponibile
+                self._setup_italian_voice()
+            except Exception as e:
+                self.tts_engine = None
+                if DEBUG:
+                    print(f"[TTS] Sintesi vocale non disponibile: {e}")
 
-        # Configura voce italiana se disponibile
-        self._setup_italian_voice()
+        # Risposte a frasi: la prima si pronuncia mentre Ollama genera le successive
+        self.speech_queue = SpeechQueue(lambda text: self.speak(text)).start()
 
         # Stato del sistema
         self.is_listening = False
@@ -55,88 +86,83 @@ class ImprovedWhisperSpeechHandler:
         # Nuovo: Sistema ascolto intelligente
         self.voice_detected = False
         self.waiting_for_command = False
-        self.silence_threshold = 300  # Soglia per rilevare voce (più sensibile)
+        self.command_mode_id = 0  # Incrementato a ogni wait_for_command
+        self.vad = create_vad()  # Motore VAD configurato (VAD_ENGINE)
         self.voice_chunks_needed = 3  # Chunks consecutivi per confermare voce
         self.silence_chunks_max = 15  # Chunks silenzio per fermare registrazione
 
         # Callbacks per sistema principale
         self.wake_word_callback = None
         self.command_callback = None
+        self.partial_callback = None  # Ipotesi parziali in modalità comando
 
-        # Buffer per registrazione
-        self.audio_buffer = deque(maxlen=int(SAMPLE_RATE * 10))  # 10 secondi max
+        # Trascrizione streaming (ipotesi parziali mentre si parla)
+        self.streaming_enabled = STREAMING_TRANSCRIPTION
+        self.streaming_transcriber = None  # Trascrittore dell'enunciato corrente
 
-        if DEBUG:
-            print("[WHISPER] ImprovedWhisperSpeechHandler inizializzato")
-            print(f"[WHISPER] Microfono selezionato: {self.microphone_index}")
-            self._list_audio_devices()
+        # Endpointing speculativo: trascrive alla prima pausa, conferma a fine silenzio
+        self.speculative_enabled = SPECULATIVE_ENDPOINTING and not self.streaming_enabled
+        self.speculation_stats = {'started': 0, 'hits': 0, 'misses': 0, 'ready_at_commit': 0}
 
-    def _get_best_microphone(self):
-        """Trova il microfono migliore disponibile"""
-        if MICROPHONE_INDEX is not None:
-            if DEBUG:
-                print(f"[WHISPER] Uso microfono configurato: {MICROPHONE_INDEX}")
-            return MICROPHONE_INDEX
+        # Coda di trascrizione: la cattura non aspetta mai Whisper
+        self.transcription_queue = TranscriptionWorkQueue(self._run_transcription_job)
+        queue_depth('transcription').set_function(lambda: self.transcription_queue.depth)
 
-        # Priorità microfoni (dal migliore al peggiore)
-        preferred_keywords = [
-            "realtek",
-            "microphone",
-            "mic",
-            "input"
-        ]
+        # Filtro wake word leggero (evita Whisper sul parlato di sottofondo)
+        self.keyword_spotter = KeywordSpotter()
 
-        # Parole da evitare (dispositivi con latenza)
-        avoid_keywords = [
-            "bluetooth", "bt", "airpods", "wireless", "hands-free"
-        ]
+        # Buffer circolare condiviso dell'hub (AUDIO_BUFFER_SIZE secondi)
+        self.audio_buffer = self.capture_hub.ring
 
-        best_mic = None
-        best_score = -1
+        # Preprocessing in streaming: copia filtrata allineata al buffer grezzo
+        self.preprocessor = StreamingPreprocessor()
+        self.processed_buffer = None
+        if self.preprocessor.enabled:
+            self.processed_buffer = AudioRingBuffer(dtype=np.float32)
 
-        for i in range(self.audio.get_device_count()):
-            try:
-                info = self.audio.get_device_info_by_index(i)
-                if info['maxInputChannels'] == 0:
-                    continue
-
-                name = info['name'].lower()
-                score = 0
-
-                # Bonus per parole preferite
-                for j, keyword in enumerate(preferred_keywords):
-                    if keyword in name:
-                        score += (len(preferred_keywords) - j) * 2
-                        break
+        if DEBUG:
+            print("[WHISPER] ImprovedWhisperSpeechHandler inizializzato")
+            print(f"[WHISPER] Microfono selezionato: {self.microphone_index}")
+            self._list_audio_devices()
 
-                # Bonus per canali stereo
-                if info['maxInputChannels'] >= 2:
-                    score += 3
+        if load_model:
+            self.load_model()
 
-                # Malus per dispositivi da evitare
-                for keyword in avoid_keywords:
-                    if keyword in name:
-                        score -= 5
-                        break
+    def load_model(self):
+        """Carica Whisper (in-process o nei worker STT); bloccante"""
+        if DEBUG:
+            print(f"[WHISPER] Caricando modello {WHISPER_MODEL}...")
 
-                if DEBUG:
-                    print(f"[WHISPER] Mic {i}: {info['name']} - Score: {score}")
+        try:
+            if STT_BACKEND == 'process':
+                # Il pool ha la stessa interfaccia del modello (transcribe)
+                self.stt_pool = STTWorkerPool().start()
+                model, precision = self.stt_pool, self.stt_pool.precision
+            else:
+                model, precision = load_whisper_model(WHISPER_MODEL)
+            if DEBUG:
+                print(f"[WHISPER] Modello {WHISPER_MODEL} ({precision}) caricato con successo")
+        except Exception as e:
+            self.model_error = str(e)
+            if DEBUG:
+                print(f"[WHISPER] Errore caricamento modello: {e}")
+            raise Exception(f"Impossibile caricare Whisper: {e}")
 
-                if score > best_score:
-                    best_score = score
-                    best_mic = i
+        if WHISPER_FAST_DECODE:
+            if self.stt_pool is not None:
+                self.command_transcriber = self.stt_pool.command_transcriber()
+            else:
+                self.command_transcriber = CommandTranscriber(model, fp16=precision == 'fp16')
 
-            except Exception as e:
-                continue
+        self.whisper_model, self.whisper_precision = model, precision
+        self.model_ready.set()
 
-        if best_mic is not None:
-            if DEBUG:
-                print(f"[WHISPER] Microfono auto-selezionato: {best_mic}")
-            return best_mic
-        else:
-            if DEBUG:
-                print("[WHISPER] Uso microfono di default")
-            return None
+    def _wait_model_ready(self):
+        """Attende Whisper (avvio in corso); False se il caricamento è fallito o la coda è ferma"""
+        while not self.model_ready.wait(0.5):
+            if self.model_error is not None or not self.transcription_queue.is_running:
+                return False
+        return True
 
     def _setup_italian_voice(self):
         """Configura voce italiana se disponibile"""
@@ -171,7 +197,7 @@ class ImprovedWhisperSpeechHandler:
 
     def _list_audio_devices(self):
         """Lista tutti i dispositivi audio disponibili"""
-        if not DEBUG:
+        if not DEBUG or self.audio is None:
             return
 
         print("\n[WHISPER] Dispositivi audio disponibili:")
@@ -190,65 +216,130 @@ class ImprovedWhisperSpeechHandler:
             return
 
         self.is_monitoring = True
+        self.transcription_queue.start()
 
         def monitor_voice():
             try:
-                stream = self.audio.open(
-                    format=pyaudio.paInt16,
-                    channels=1,
-                    rate=SAMPLE_RATE,
-                    input=True,
-                    input_device_index=self.microphone_index,
-                    frames_per_buffer=CHUNK_SIZE
-                )
+                subscription = self.capture_hub.subscribe('vad')
+                self.monitor_subscription = subscription
 
                 if DEBUG:
                     print("[WHISPER] 🎧 Monitoraggio vocale intelligente avviato")
 
+                self.vad.reset()
+                self.preprocessor.reset()
                 silence_chunks = 0
                 voice_chunks = 0
-                audio_frames = []
-                recording_voice = False
-
-                while self.is_monitoring and not self.is_speaking:
+                utterance_start = None  # Cursore di inizio enunciato nel buffer circolare
+                speculation = None  # Trascrizione speculativa in corso
+                trace = None  # Traccia dell'enunciato in corso
+                last_voice_time = 0.0
+                preprocess_time = 0.0  # Filtro in streaming accumulato sull'enunciato
+                chunk_seconds = CHUNK_SIZE / SAMPLE_RATE
+
+                while self.is_monitoring:
                     try:
-                        data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-                        audio_chunk = np.frombuffer(data, dtype=np.int16)
-                        volume = np.sqrt(np.mean(audio_chunk ** 2))
+                        audio_chunk = subscription.read(CHUNK_SIZE, timeout=0.5)
+                        if audio_chunk is None:
+                            if not self.capture_hub.is_running:
+                                break
+                            continue
+
+                        if self.is_speaking:
+                            # Non ascoltare la propria voce: l'enunciato in corso viene scartato
+                            if speculation is not None:
+                                self._cancel_speculation(speculation)
+                            finish_trace(trace, 'discarded')
+                            trace = None
+                            utterance_start = None
+                            speculation = None
+                            self.streaming_transcriber = None
+                            silence_chunks = 0
+                            voice_chunks = 0
+                            continue
+
+                        if self.processed_buffer is not None:
+                            if self.processed_buffer.write_pos != subscription.last_start:
+                                # Primo chunk o audio perso: riallinea la copia filtrata
+                                self.processed_buffer.seek(subscription.last_start)
+                                self.preprocessor.reset()
+                            preprocess_start = time.perf_counter()
+                            processed_chunk = self.processed_buffer.write(self.preprocessor.process(audio_chunk))
+                            preprocess_time += time.perf_counter() - preprocess_start
+                        else:
+                            processed_chunk = audio_chunk
 
                         # Rileva se c'è voce
-                        if volume > self.silence_threshold:
+                        if self.vad.is_speech(audio_chunk):
                             silence_chunks = 0
                             voice_chunks += 1
+                            last_voice_time = time.perf_counter()
+
+                            if speculation is not None:
+                                self._cancel_speculation(speculation)
+                                speculation = None
 
                             # Inizia registrazione quando rileva voce consistente
-                            if not recording_voice and voice_chunks >= self.voice_chunks_needed:
-                                recording_voice = True
-                                audio_frames = []  # Reset buffer
+                            if utterance_start is None and voice_chunks >= self.voice_chunks_needed:
+                                # I chunk che hanno confermato la voce sono già nel buffer
+                                utterance_start = max(
+                                    self._capture_buffer().oldest_pos,
+                                    subscription.cursor - voice_chunks * len(audio_chunk)
+                                )
+                                preroll = self._capture_view(utterance_start, subscription.cursor)
+                                self.preprocessor.begin_segment(preroll)
+
+                                # La traccia parte dal primo chunk con voce
+                                now = time.perf_counter()
+                                trace = start_trace('utterance', start=now - voice_chunks * chunk_seconds)
+                                if trace is not None:
+                                    trace.add_span('vad_onset', trace.start, now, chunks=voice_chunks)
+                                preprocess_time = 0.0
+                                record_vad_trigger()
+
+                                if self.streaming_enabled:
+                                    self._begin_streaming_utterance(trace)
+                                    self._feed_streaming(preroll)
                                 if DEBUG:
                                     print("[WHISPER] 🎤 Voce rilevata, registrazione avviata...")
 
-                            # Se stiamo registrando, aggiungi frame
-                            if recording_voice:
-                                audio_frames.append(data)
+                            # Se stiamo registrando, il chunk è già nel buffer
+                            elif utterance_start is not None and self.streaming_enabled:
+                                self._feed_streaming(processed_chunk)
 
                         else:
                             # Silenzio rilevato
                             voice_chunks = max(0, voice_chunks - 1)  # Decremento graduale
 
-                            if recording_voice:
+                            if utterance_start is not None:
                                 silence_chunks += 1
                                 # Continua a registrare per un po' in caso di pause
                                 if silence_chunks < self.silence_chunks_max:
-                                    audio_frames.append(data)
+                                    if self.streaming_enabled:
+                                        self._feed_streaming(processed_chunk)
+                                    elif (self.speculative_enabled and speculation is None and
+                                          silence_chunks == SPECULATIVE_SILENCE_CHUNKS):
+                                        speculation = self._start_speculation(utterance_start, subscription.cursor, trace)
                                 else:
                                     # Fine registrazione - processa audio
-                                    if len(audio_frames) > 0:
-                                        self._process_voice_buffer(audio_frames)
+                                    if trace is not None:
+                                        now = time.perf_counter()
+                                        trace.add_span('capture', trace.start, now,
+                                                       audio_ms=round((subscription.cursor - utterance_start) / SAMPLE_RATE * 1000),
+                                                       preprocess_ms=round(preprocess_time * 1000, 2))
+                                        trace.add_span('endpointing', last_voice_time, now, silence_chunks=silence_chunks)
+
+                                    if self.streaming_enabled:
+                                        self._finish_streaming()
+                                    elif speculation is None or not self._commit_speculation(speculation):
+                                        self.transcription_queue.submit(TranscriptionJob(
+                                            'utterance', self._capture_segment(utterance_start, subscription.cursor), trace
+                                        ))
 
                                     # Reset stato
-                                    audio_frames = []
-                                    recording_voice = False
+                                    utterance_start = None
+                                    speculation = None
+                                    trace = None
                                     silence_chunks = 0
                                     voice_chunks = 0
 
@@ -257,9 +348,6 @@ class ImprovedWhisperSpeechHandler:
                             print(f"[WHISPER] Errore chunk audio: {e}")
                         continue
 
-                stream.stop_stream()
-                stream.close()
-
                 if DEBUG:
                     print("[WHISPER] Monitoraggio vocale fermato")
 
@@ -267,88 +355,349 @@ class ImprovedWhisperSpeechHandler:
                 if DEBUG:
                     print(f"[WHISPER] Errore monitoraggio: {e}")
             finally:
+                if self.monitor_subscription is not None:
+                    self.monitor_subscription.close()
+                    self.monitor_subscription = None
                 self.is_monitoring = False
 
         self.monitor_thread = threading.Thread(target=monitor_voice, daemon=True)
         self.monitor_thread.start()
 
-    def _process_voice_buffer(self, audio_frames):
-        """Processa buffer audio quando rileva fine parlato"""
+    def _capture_buffer(self):
+        """Buffer da cui si trascrive (copia preprocessata se il preprocessing è attivo)"""
+        if self.processed_buffer is not None:
+            return self.processed_buffer
+        return self.audio_buffer
+
+    def _capture_view(self, start, end):
+        """Vista sull'audio catturato [start, end)"""
+        return self._capture_buffer().read(start, end)
+
+    def _capture_segment(self, start, end):
+        """Enunciato [start, end), con il picco misurato durante la cattura"""
+        if self.processed_buffer is not None:
+            return self.processed_buffer.segment(start, end, peak=self.preprocessor.segment_peak)
+        return self.audio_buffer.segment(start, end)
+
+    def transcribe_audio(self, audio_data):
+        """Trascrive un comando con il percorso veloce (se attivo) o con `transcribe`"""
+        audio_ms = round(len(audio_data) / SAMPLE_RATE * 1000)
+
+        if self.command_transcriber is not None:
+            with span('whisper', path='fast', audio_ms=audio_ms), transcription_seconds('fast').time():
+                return self.command_transcriber.transcribe(audio_data)
+
+        with span('whisper', path='transcribe', audio_ms=audio_ms), transcription_seconds('transcribe').time():
+            result = self.whisper_model.transcribe(
+                audio_data,
+                language=WHISPER_LANGUAGE,
+                fp16=self.whisper_precision == 'fp16',
+                verbose=False,
+                no_speech_threshold=WHISPER_NO_SPEECH_THRESHOLD,
+                logprob_threshold=WHISPER_LOGPROB_THRESHOLD,
+                condition_on_previous_text=False  # Non condizionare su testo precedente
+            )
+        return result["text"].strip()
+
+    def _process_voice_buffer(self, segment):
+        """Processa un enunciato (AudioSegment del buffer circolare) quando rileva fine parlato"""
+        self._dispatch_result(self._transcribe_segment(segment))
+
+    def _transcribe_segment(self, segment):
+        """
+        Trascrive un enunciato senza inoltrarlo
+
+        Returns:
+            tuple | None: ('wake', wake_word) dallo spotter, ('text', testo) da Whisper,
+            None se l'enunciato va ignorato
+        """
         try:
-            if not audio_frames:
-                return
+            if not len(segment):
+                return None
 
-            # Converti in numpy array
-            audio_data = np.frombuffer(b''.join(audio_frames), dtype=np.int16)
-            audio_data = audio_data.astype(np.float32) / 32768.0
+            # Unica copia: conversione float32 dalla vista sul buffer circolare
+            with span('to_float32', samples=len(segment)):
+                audio_data = segment.to_float32()
+            if audio_data is None:
+                if DEBUG:
+                    print("[WHISPER] ⚠️ Audio sovrascritto nel buffer prima della trascrizione, ignorato")
+                return None
 
             duration = len(audio_data) / SAMPLE_RATE
             if duration < 0.5:  # Troppo breve, probabilmente rumore
                 if DEBUG:
                     print(f"[WHISPER] Audio troppo breve ({duration:.1f}s), ignorato")
-                return
+                return None
+
+            # Fuori dalla modalità comando, Whisper parte solo se lo spotter
+            # riconosce una wake word
+            if not self.waiting_for_command and self.keyword_spotter.is_active:
+                with span('keyword_spotter') as attrs:
+                    wake_word = self.keyword_spotter.detect(audio_data)
+                    attrs['wake_word'] = wake_word
+                if wake_word is None:
+                    return None
+                if not WAKE_WORD_SPOTTER_VERIFY:
+                    return ('wake', wake_word)
 
             if DEBUG:
                 print(f"[WHISPER] 🤖 Processando audio ({duration:.1f}s)...")
 
-            # Preprocessing audio per migliorare riconoscimento
-            audio_data = self._preprocess_audio(audio_data)
+            # Filtro già applicato in cattura: resta solo la normalizzazione
+            if segment.peak:
+                with span('preprocess', stage='gain'):
+                    audio_data *= self.preprocessor.gain(segment.peak)
 
             # Trascrivi con Whisper
-            result = self.whisper_model.transcribe(
-                audio_data,
-                language=WHISPER_LANGUAGE,
-                fp16=False,
-                verbose=False,
-                no_speech_threshold=0.5,  # Più permissivo
-                logprob_threshold=-1.0,  # Filtro per risultati incerti
-                condition_on_previous_text=False  # Non condizionare su testo precedente
-            )
-
-            text = result["text"].strip()
+            text = self.transcribe_audio(audio_data)
             if not text or len(text) < 2:
                 if DEBUG:
                     print("[WHISPER] Testo troppo breve o vuoto, ignorato")
-                return
+                return None
 
             if DEBUG:
                 print(f"[WHISPER] 📝 Trascrizione: '{text}'")
 
-            # Controlla wake words
-            if not self.waiting_for_command:
-                for wake_word in WAKE_WORDS:
-                    if wake_word.lower() in text.lower():
-                        if DEBUG:
-                            print(f"[WHISPER] 🎯 Wake word '{wake_word}' rilevata!")
-                        self._notify_wake_word_detected(text)
-                        return
+            return ('text', text)
+
+        except Exception as e:
+            if DEBUG:
+                print(f"[WHISPER] Errore processamento buffer: {e}")
+            return None
+
+    def _dispatch_result(self, result):
+        """Inoltra il risultato di _transcribe_segment al sistema principale"""
+        if result is None:
+            finish_trace(current_trace(), 'ignored')
+            return
+        kind, value = result
+        if kind == 'wake':
+            self._notify_wake_word_detected(value)
+        else:
+            self._dispatch_transcription(value)
+
+    def _start_speculation(self, start, end, trace=None):
+        """Avvia la trascrizione dell'enunciato alla prima pausa, senza inoltrarla"""
+        speculation = SpeculativeTranscription(self._capture_segment(start, end))
+        speculation.trace = trace
+        self.speculation_stats['started'] += 1
+        self.transcription_queue.submit(TranscriptionJob('speculative', speculation, trace))
+        return speculation
+
+    def _cancel_speculation(self, speculation):
+        """Il parlato è ripreso: il risultato speculativo non vale più"""
+        if speculation.cancel():
+            self.speculation_stats['misses'] += 1
+            if DEBUG:
+                print("[WHISPER] ↩️ Parlato ripreso, speculazione annullata")
+
+    def _commit_speculation(self, speculation):
+        """
+        Silenzio confermato: usa il risultato speculativo
+
+        Returns:
+            bool: False se la speculazione era stata annullata o scartata dalla coda
+        """
+        committed, ready, result = speculation.commit()
+        if not committed:
+            return False
+
+        self.speculation_stats['hits'] += 1
+        if ready:
+            # Trascrizione già pronta: nessuna attesa dopo il timeout di silenzio
+            self.speculation_stats['ready_at_commit'] += 1
+            with activate(speculation.trace):
+                self._dispatch_result(result)
+        return True
+
+    def _run_speculation(self, speculation):
+        """Esegue una trascrizione speculativa (worker)"""
+        if not speculation.begin():
+            return
+        result = self._transcribe_segment(speculation.segment)
+        if speculation.complete(result):
+            # Silenzio confermato mentre il worker trascriveva
+            self._dispatch_result(result)
+
+    def get_speculation_stats(self):
+        """Contatori dell'endpointing speculativo"""
+        stats = dict(self.speculation_stats)
+        decided = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / decided if decided else 0.0
+        return stats
+
+    def _dispatch_transcription(self, text):
+        """Inoltra una trascrizione finale come wake word o comando"""
+        # Controlla wake words
+        if not self.waiting_for_command:
+            if self._find_wake_word(text):
+                self._notify_wake_word_detected(text)
             else:
-                # Siamo in modalità comando - processa come comando
+                finish_trace(current_trace(), 'ignored')
+        else:
+            # Siamo in modalità comando - processa come comando
+            if DEBUG:
+                print(f"[WHISPER] 📋 Comando ricevuto: '{text}'")
+            self._notify_command_received(text)
+
+    def _find_wake_word(self, text):
+        """Restituisce la wake word contenuta nel testo, se presente"""
+        for wake_word in WAKE_WORDS:
+            if wake_word.lower() in text.lower():
                 if DEBUG:
-                    print(f"[WHISPER] 📋 Comando ricevuto: '{text}'")
-                self._notify_command_received(text)
+                    print(f"[WHISPER] 🎯 Wake word '{wake_word}' rilevata!")
+                return wake_word
+        return None
+
+    def _spotter_gates_wake_word(self):
+        """True se in attesa di wake word basta lo spotter, senza Whisper"""
+        return (not self.waiting_for_command and self.keyword_spotter.is_active
+                and not WAKE_WORD_SPOTTER_VERIFY)
+
+    def _begin_streaming_utterance(self, trace=None):
+        """Inizia un nuovo enunciato in modalità streaming"""
+        self.streaming_transcriber = StreamingWhisperTranscriber(self.whisper_model,
+                                                                 fp16=self.whisper_precision == 'fp16')
+        self.streaming_transcriber.trace = trace
+        self.keyword_spotter.reset_stream()
+
+    def _feed_streaming(self, audio_chunk):
+        """Passa un chunk al trascrittore streaming (thread di cattura, nessuna decodifica)"""
+        transcriber = self.streaming_transcriber
+        if transcriber is None or transcriber.consumed:
+            return
+
+        try:
+            # Copia: la vista sul buffer circolare verrà sovrascritta
+            if audio_chunk.dtype == np.int16:
+                audio_data = audio_chunk.astype(np.float32) / 32768.0
+            else:
+                audio_data = audio_chunk.copy()
+
+            # In attesa di wake word basta lo spotter, Whisper non viene lanciato.
+            # Qui solo il buffer: MFCC e DTW girano sui worker di trascrizione
+            if self._spotter_gates_wake_word():
+                if self.keyword_spotter.append(audio_data):
+                    self.transcription_queue.submit(TranscriptionJob('spot', transcriber, transcriber.trace))
+                return
+
+            if transcriber.append(audio_data):
+                self.transcription_queue.submit(TranscriptionJob('partial', transcriber, transcriber.trace))
 
         except Exception as e:
             if DEBUG:
-                print(f"[WHISPER] Errore processamento buffer: {e}")
+                print(f"[WHISPER] Errore trascrizione streaming: {e}")
 
-    def _preprocess_audio(self, audio_data):
-        """Preprocessing audio per migliorare riconoscimento"""
+    def _finish_streaming(self):
+        """Chiude l'enunciato streaming e accoda la decodifica finale"""
+        transcriber, self.streaming_transcriber = self.streaming_transcriber, None
+        if transcriber is None or transcriber.consumed:
+            return
+
+        if self._spotter_gates_wake_word():
+            # Ultimo confronto dello spotter: senza wake word l'enunciato viene ignorato
+            transcriber.finished = True
+            self.transcription_queue.submit(TranscriptionJob('spot', transcriber, transcriber.trace))
+            return
+
+        self.transcription_queue.submit(TranscriptionJob('final', transcriber, transcriber.trace))
+
+    def _run_transcription_job(self, job):
+        """Eseguito dai worker della coda di trascrizione"""
+        if job.kind == 'spot':
+            # Lo spotter non usa Whisper: nessuna attesa del modello
+            with activate(job.trace), span('keyword_spotter', stream=True):
+                self._run_stream_spotter(job.payload)
+            return
+
+        if not self._wait_model_ready():
+            job.discard()
+            return
+
+        if job.trace is not None:
+            job.trace.add_span('queue_wait', job.created_at, job=job.kind)
+
+        if job.kind in ('partial', 'final') and job.payload.whisper_model is None:
+            # Enunciato iniziato mentre Whisper si stava caricando
+            job.payload.whisper_model = self.whisper_model
+
+        with activate(job.trace):
+            if job.kind == 'utterance':
+                self._process_voice_buffer(job.payload)
+            elif job.kind == 'partial':
+                with span('streaming_partial'):
+                    self._decode_streaming_partial(job.payload)
+            elif job.kind == 'final':
+                self._decode_streaming_final(job.payload)
+            elif job.kind == 'speculative':
+                with span('speculation'):
+                    self._run_speculation(job.payload)
+
+    def _run_stream_spotter(self, transcriber):
+        """Confronto dello spotter sulla finestra scorrevole (worker)"""
+        if transcriber.consumed:
+            return
         try:
-            # Normalizza volume
-            max_val = np.max(np.abs(audio_data))
-            if max_val > 0:
-                audio_data = audio_data / max_val * 0.8
+            # A fine enunciato il confronto non può essere saltato
+            wake_word = self.keyword_spotter.detect_stream(wait=transcriber.finished)
+            if wake_word and not transcriber.consumed:
+                transcriber.consumed = True
+                self._notify_wake_word_detected(wake_word)
+            elif transcriber.finished and not transcriber.consumed:
+                # Nessuna wake word trovata dallo spotter durante l'enunciato
+                finish_trace(transcriber.trace, 'ignored')
+        except Exception as e:
+            if DEBUG:
+                print(f"[KWS] Errore rilevamento continuo: {e}")
 
-            # Applica filtro passa-alto per rimuovere rumori bassi
-            try:
-                from scipy import signal
-                b, a = signal.butter(3, 300, 'high', fs=SAMPLE_RATE)
-                audio_data = signal.filtfilt(b, a, audio_data)
-            except ImportError:
-                pass  # Scipy non disponibile, salta filtro
+    def _decode_streaming_partial(self, transcriber):
+        """Decodifica parziale e gestione dell'ipotesi (worker)"""
+        try:
+            partial = transcriber.decode_partial()
+            if not partial:
+                return
 
-            return audio_data
+            if DEBUG:
+                print(f"[WHISPER] ✏️ Parziale: '{partial}'")
+
+            if not self.waiting_for_command:
+                # La wake word basta: non serve aspettare la fine della frase
+                if self._find_wake_word(partial):
+                    transcriber.consumed = True
+                    self._notify_wake_word_detected(partial)
+            elif self.partial_callback:
+                self.partial_callback(partial)
+
+        except Exception as e:
+            if DEBUG:
+                print(f"[WHISPER] Errore trascrizione streaming: {e}")
+
+    def _decode_streaming_final(self, transcriber):
+        """Decodifica finale dell'enunciato streaming (worker)"""
+        try:
+            with span('whisper', path='streaming_final'), transcription_seconds('streaming_final').time():
+                text = transcriber.finish()
+            if not text or len(text) < 2:
+                if not transcriber.consumed:
+                    finish_trace(transcriber.trace, 'ignored')
+                    if DEBUG:
+                        print("[WHISPER] Testo troppo breve o vuoto, ignorato")
+                return
+
+            if DEBUG:
+                print(f"[WHISPER] 📝 Trascrizione finale: '{text}'")
+
+            self._dispatch_transcription(text)
+
+        except Exception as e:
+            if DEBUG:
+                print(f"[WHISPER] Errore fine streaming: {e}")
+
+    def _preprocess_audio(self, audio_data):
+        """Preprocessing di una registrazione completa (comando manuale, test microfono)"""
+        try:
+            with span('preprocess', stage='clip'):
+                return StreamingPreprocessor().process_clip(audio_data)
 
         except Exception as e:
             if DEBUG:
@@ -356,38 +705,58 @@ class ImprovedWhisperSpeechHandler:
             return audio_data
 
     def _notify_wake_word_detected(self, text):
-        """Notifica rilevazione wake word al sistema principale"""
+        """Notifica rilevazione wake word al sistema principale (che chiude la traccia corrente)"""
         if self.wake_word_callback:
             self.wake_word_callback(text)
+        else:
+            finish_trace(current_trace(), 'wake')
 
     def _notify_command_received(self, text):
-        """Notifica comando ricevuto al sistema principale"""
+        """Notifica comando ricevuto al sistema principale (che chiude la traccia corrente)"""
         if self.command_callback:
             self.command_callback(text)
+        else:
+            finish_trace(current_trace(), 'command')
         self.waiting_for_command = False
 
     def wait_for_command(self, timeout=10):
         """Attiva modalità ascolto comando dopo wake word"""
         self.waiting_for_command = True
+        self.command_mode_id += 1
+        command_mode_id = self.command_mode_id
         if DEBUG:
             print("[WHISPER] 🎤 Modalità comando attivata...")
 
-        # Auto-reset dopo timeout
+        # Auto-reset dopo timeout (solo se nel frattempo non è iniziata un'altra attesa)
         def reset_command_mode():
             time.sleep(timeout)
-            if self.waiting_for_command:
+            if self.waiting_for_command and self.command_mode_id == command_mode_id:
                 self.waiting_for_command = False
                 if DEBUG:
                     print("[WHISPER] Timeout comando - ritorno a modalità wake word")
 
         threading.Thread(target=reset_command_mode, daemon=True).start()
 
+    def set_tts_volume(self, volume):
+        """Imposta il volume della voce (0.0 - 1.0) e restituisce quello applicato"""
+        self.tts_volume = min(1.0, max(0.0, volume))
+        if self.tts_engine is not None:
+            try:
+                self.tts_engine.setProperty('volume', self.tts_volume)
+            except Exception as e:
+                if DEBUG:
+                    print(f"[TTS] Errore impostazione volume: {e}")
+        return self.tts_volume
+
     def speak(self, text: str):
         """Pronuncia un testo usando text-to-speech"""
         try:
             if DEBUG:
                 print(f"[TTS] Pronunciando: '{text}'")
 
+            if self.tts_engine is None:
+                return
+
             self.is_speaking = True
 
             # Avvia TTS in un thread separato per non bloccare
@@ -401,12 +770,14 @@ class ImprovedWhisperSpeechHandler:
                 finally:
                     self.is_speaking = False
 
+            tts_start = time.perf_counter()
             thread = threading.Thread(target=speak_thread, daemon=True)
             thread.start()
 
             # Aspetta che finisca di parlare
             while self.is_speaking:
                 time.sleep(0.1)
+            TTS_SECONDS.observe(time.perf_counter() - tts_start)
 
         except Exception as e:
             if DEBUG:
@@ -427,59 +798,56 @@ class ImprovedWhisperSpeechHandler:
 
     def _record_audio_manual(self, duration=5, listen_for_silence=True):
         """Registra audio manualmente per test o comandi forzati"""
+        subscription = None
         try:
             if DEBUG:
                 print(f"[WHISPER] Registrazione manuale per {duration}s...")
 
-            stream = self.audio.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=SAMPLE_RATE,
-                input=True,
-                input_device_index=self.microphone_index,
-                frames_per_buffer=CHUNK_SIZE
-            )
+            # Consumatore dell'hub: il monitoraggio continua in parallelo
+            subscription = self.capture_hub.subscribe('recorder')
 
-            frames = []
             silent_chunks = 0
             max_silent_chunks = int(SPEECH_TIMEOUT * SAMPLE_RATE / CHUNK_SIZE)
             max_frames = int(duration * SAMPLE_RATE / CHUNK_SIZE)
 
+            # Registrazione preallocata: nessuna allocazione per chunk
+            recording = np.empty(max_frames * CHUNK_SIZE, dtype=np.int16)
+            frames = 0
+            vad = create_vad()
+
             self.is_recording = True
 
             for i in range(max_frames):
                 if not self.is_recording:
                     break
 
-                data = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-                frames.append(data)
+                data = subscription.read(CHUNK_SIZE, timeout=1.0)
+                if data is None:
+                    break
+                audio_chunk = recording[frames * CHUNK_SIZE:(frames + 1) * CHUNK_SIZE]
+                audio_chunk[:] = data
+                frames += 1
 
                 # Rilevazione silenzio per stop automatico
-                if listen_for_silence and len(frames) > 10:
-                    audio_chunk = np.frombuffer(data, dtype=np.int16)
-                    volume = np.sqrt(np.mean(audio_chunk ** 2))
-
-                    if volume < self.silence_threshold:
+                if listen_for_silence and frames > 10:
+                    if not vad.is_speech(audio_chunk):
                         silent_chunks += 1
                     else:
                         silent_chunks = 0
 
                     # Se silenzio troppo lungo, ferma
-                    if silent_chunks > max_silent_chunks and len(frames) > 20:
+                    if silent_chunks > max_silent_chunks and frames > 20:
                         if DEBUG:
                             print("[WHISPER] Silenzio rilevato, stop registrazione")
                         break
 
-            stream.stop_stream()
-            stream.close()
+            subscription.close()
             self.is_recording = False
 
             if not frames:
                 return None
 
-            # Converti in numpy array
-            audio_data = np.frombuffer(b''.join(frames), dtype=np.int16)
-            audio_data = audio_data.astype(np.float32) / 32768.0
+            audio_data = recording[:frames * CHUNK_SIZE].astype(np.float32) / 32768.0
 
             # Controlla durata minima
             duration_seconds = len(audio_data) / SAMPLE_RATE
@@ -496,6 +864,8 @@ class ImprovedWhisperSpeechHandler:
         except Exception as e:
             if DEBUG:
                 print(f"[WHISPER] Errore registrazione: {e}")
+            if subscription is not None:
+                subscription.close()
             self.is_recording = False
             return None
 
@@ -506,7 +876,8 @@ class ImprovedWhisperSpeechHandler:
                 print("[WHISPER] 🎤 Comando vocale manuale...")
 
             # Registra audio
-            audio_data = self._record_audio_manual(duration=SPEECH_PHRASE_TIMEOUT)
+            with span('record'):
+                audio_data = self._record_audio_manual(duration=SPEECH_PHRASE_TIMEOUT)
 
             if audio_data is None:
                 return ""
@@ -514,15 +885,10 @@ class ImprovedWhisperSpeechHandler:
             # Preprocessing
             audio_data = self._preprocess_audio(audio_data)
 
-            # Trascrivi
-            result = self.whisper_model.transcribe(
-                audio_data,
-                language=WHISPER_LANGUAGE,
-                fp16=False,
-                verbose=False
-            )
-
-            command = result["text"].strip()
+            # Trascrivi (all'avvio il comando aspetta che Whisper sia pronto)
+            if not self._wait_model_ready():
+                return ""
+            command = self.transcribe_audio(audio_data)
 
             if DEBUG:
                 print(f"[WHISPER] Comando manuale: '{command}'")
@@ -551,10 +917,15 @@ class ImprovedWhisperSpeechHandler:
             self.is_listening = False
             self.is_monitoring = False
             self.waiting_for_command = False
+            self.transcription_queue.stop()
+            self.speech_queue.stop()
+            if self.stt_pool is not None:
+                self.stt_pool.stop()
 
             # Ferma TTS
             try:
-                self.tts_engine.stop()
+                if self.tts_engine is not None:
+                    self.tts_engine.stop()
             except:
                 pass
             self.is_speaking = False
@@ -571,12 +942,7 @@ class ImprovedWhisperSpeechHandler:
             print(f"🎤 Test microfono per {duration} secondi...")
             print("   📢 Parla ora!")
 
-            # Ferma temporaneamente il monitoraggio
-            was_monitoring = self.is_monitoring
-            if was_monitoring:
-                self.stop_monitoring()
-                time.sleep(0.5)
-
+            # Il test è un consumatore dell'hub: il monitoraggio resta attivo
             audio_data = self._record_audio_manual(duration=duration, listen_for_silence=False)
 
             if audio_data is None:
@@ -588,13 +954,12 @@ class ImprovedWhisperSpeechHandler:
             # Preprocessing
             audio_data = self._preprocess_audio(audio_data)
 
-            result = self.whisper_model.transcribe(
-                audio_data,
-                language=WHISPER_LANGUAGE,
-                fp16=False
-            )
-
-            transcription = result["text"]
+            if not self.model_ready.is_set():
+                print("⏳ Whisper in caricamento, attendo...")
+            if not self._wait_model_ready():
+                print("❌ Whisper non disponibile")
+                return
+            transcription = self.transcribe_audio(audio_data)
             print(f"📝 Trascrizione: '{transcription}'")
 
             if transcription.strip():
@@ -606,33 +971,26 @@ class ImprovedWhisperSpeechHandler:
             else:
                 print("⚠️  Nessun parlato rilevato")
 
-            # Riavvia monitoraggio se era attivo
-            if was_monitoring:
-                time.sleep(1)
-                self.start_intelligent_monitoring()
-
         except Exception as e:
             print(f"❌ Errore test microfono: {e}")
 
+    def get_transcription_stats(self):
+        """Statistiche della coda di trascrizione (profondità, scarti, worker)"""
+        stats = self.transcription_queue.get_stats()
+        if self.stt_pool is not None:
+            stats['stt_processes'] = self.stt_pool.get_stats()
+        return stats
+
     def get_microphone_info(self):
-        """Restituisce informazioni sul microfono in uso"""
+        """Restituisce informazioni sul microfono (o sulla sorgente audio) in uso"""
         try:
-            if self.microphone_index is not None:
-                info = self.audio.get_device_info_by_index(self.microphone_index)
-                return {
-                    'index': self.microphone_index,
-                    'name': info['name'],
-                    'channels': info['maxInputChannels'],
-                    'sample_rate': info['defaultSampleRate']
-                }
-            else:
-                default_info = self.audio.get_default_input_device_info()
-                return {
-                    'index': None,
-                    'name': default_info['name'],
-                    'channels': default_info['maxInputChannels'],
-                    'sample_rate': default_info['defaultSampleRate']
-                }
+            info = self.capture_hub.get_device_info()
+            return {
+                'index': self.microphone_index,
+                'name': info['name'],
+                'channels': info['maxInputChannels'],
+                'sample_rate': info['defaultSampleRate']
+            }
         except Exception as e:
             if DEBUG:
                 print(f"[WHISPER] Errore info microfono: {e}")
@@ -642,8 +1000,7 @@ class ImprovedWhisperSpeechHandler:
         """Pulisce le risorse"""
         try:
             self.stop_all()
-            if hasattr(self, 'audio'):
-                self.audio.terminate()
+            # PyAudio appartiene all'hub di cattura condiviso (shutdown_capture_hub)
             if DEBUG:
                 print("[WHISPER] Risorse pulite")
         except Exception as e:
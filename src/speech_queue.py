@@ -0,0 +1,117 @@
+"""
+Coda di frasi da pronunciare: la sintesi parte appena la prima frase è pronta
+"""
+
+import queue
+import threading
+import time
+from config.settings import DEBUG
+from metrics import TIME_TO_FIRST_AUDIO
+
+
+class SpokenReply:
+    def __init__(self, trace=None):
+        """
+        Una risposta pronunciata a frasi, per misurare il tempo al primo audio
+
+        Il tempo parte dalla fine del parlato dell'utente (inizio dello span
+        'endpointing' della traccia) o, senza traccia, da ora.
+        """
+        self.trace = trace
+        end_of_speech = trace.span_start('endpointing') if trace is not None else None
+        self.started_at = end_of_speech if end_of_speech is not None else time.perf_counter()
+        self.first_audio_at = None
+        self.sentences = 0
+
+    @property
+    def time_to_first_audio(self):
+        if self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.started_at
+
+
+class SpeechQueue:
+    def __init__(self, speak):
+        """
+        Pronuncia le frasi in ordine in un thread dedicato
+
+        Args:
+            speak (callable): `speak(testo)` bloccante (sintesi di una frase)
+        """
+        self.speak = speak
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread = None
+        self.is_running = False
+        self.sentences_spoken = 0
+
+    def start(self):
+        if self.is_running:
+            return self
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name="tts-queue", daemon=True)
+        self._thread.start()
+        return self
+
+    def begin_reply(self, trace=None):
+        return SpokenReply(trace)
+
+    def put(self, text, reply=None):
+        """Accoda una frase (non blocca)"""
+        with self._idle:
+            self._pending += 1
+        self._queue.put((text, reply))
+
+    def wait(self, timeout=None):
+        """Attende che tutte le frasi accodate siano state pronunciate; False se scade il timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def clear(self):
+        """Scarta le frasi non ancora iniziate"""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._done()
+
+    def _done(self):
+        with self._idle:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def _run(self):
+        while self.is_running:
+            item = self._queue.get()
+            if item is None:
+                break
+            text, reply = item
+            try:
+                if reply is not None:
+                    self._start_sentence(reply, text)
+                self.speak(text)
+                self.sentences_spoken += 1
+            except Exception as e:
+                if DEBUG:
+                    print(f"[TTS] Errore coda frasi: {e}")
+            finally:
+                self._done()
+
+    def _start_sentence(self, reply, text):
+        reply.sentences += 1
+        if reply.first_audio_at is not None:
+            return
+        reply.first_audio_at = time.perf_counter()
+        TIME_TO_FIRST_AUDIO.observe(reply.time_to_first_audio)
+        if reply.trace is not None:
+            reply.trace.mark('first_audio', ttfa_ms=round(reply.time_to_first_audio * 1000, 1), chars=len(text))
+        if DEBUG:
+            print(f"[TTS] Primo audio dopo {reply.time_to_first_audio * 1000:.0f} ms")
+
+    def stop(self):
+        self.clear()
+        self.is_running = False
+        self._queue.put(None)
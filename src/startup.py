@@ -0,0 +1,193 @@
+"""
+Avvio a fasi dei componenti di Jarvis, in parallelo e con stato di prontezza
+"""
+
+import threading
+import time
+from config.settings import DEBUG
+from metrics import get_metrics_registry
+
+
+class Component:
+    def __init__(self, name, loader, after=(), required=True):
+        """Un componente da inizializzare: `loader()` restituisce l'oggetto pronto"""
+        self.name = name
+        self.loader = loader
+        self.after = tuple(after)
+        self.required = required
+        self.state = 'pending'
+        self.value = None
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+        self.done = threading.Event()
+
+    @property
+    def seconds(self):
+        if self.started_at is None:
+            return None
+        return (self.ready_at or time.perf_counter()) - self.started_at
+
+    def to_dict(self):
+        seconds = self.seconds
+        return {
+            'state': self.state,
+            'required': self.required,
+            'seconds': round(seconds, 2) if seconds is not None else None,
+            'error': self.error
+        }
+
+
+class StartupManager:
+    def __init__(self):
+        """
+        Inizializza i componenti ciascuno nel proprio thread
+
+        Le fasi dipendenti (`after`) partono appena le loro dipendenze sono
+        pronte; le altre partono subito. Lo stato complessivo è 'starting'
+        finché nessuna fase richiesta è pronta, 'degraded' se il sistema
+        funziona solo in parte, 'ready' a caricamento completato e 'failed'
+        se una fase richiesta non è riuscita.
+        """
+        self.components = {}
+        self.listeners = []
+        self.complete_listeners = []
+        self.started_at = None
+        self.ready_at = None
+        self._lock = threading.Lock()
+
+    def add(self, name, loader, after=(), required=True):
+        self.components[name] = Component(name, loader, after, required)
+        return self
+
+    def add_ready(self, name, value, required=True):
+        """Componente già inizializzato dal chiamante"""
+        component = Component(name, None, required=required)
+        component.state = 'ready'
+        component.value = value
+        component.started_at = component.ready_at = time.perf_counter()
+        component.done.set()
+        self.components[name] = component
+        return self
+
+    def add_listener(self, callback):
+        """`callback(component)` a ogni fase conclusa (nel thread della fase)"""
+        self.listeners.append(callback)
+
+    def add_complete_listener(self, callback):
+        """`callback()` una sola volta, quando tutte le fasi sono concluse"""
+        self.complete_listeners.append(callback)
+
+    def start(self):
+        """Avvia tutte le fasi in attesa (non blocca)"""
+        self.started_at = time.perf_counter()
+        for component in self.components.values():
+            if component.state == 'pending':
+                threading.Thread(target=self._load, args=(component,),
+                                 name=f"startup-{component.name}", daemon=True).start()
+        self._check_complete()
+        return self
+
+    def _load(self, component):
+        for dependency in component.after:
+            required = self.components[dependency]
+            required.done.wait()
+            if required.state != 'ready':
+                self._finish(component, None, f"dipendenza '{dependency}' non disponibile")
+                return
+
+        component.state = 'loading'
+        component.started_at = time.perf_counter()
+        try:
+            value = component.loader()
+        except Exception as e:
+            self._finish(component, None, str(e))
+        else:
+            self._finish(component, value)
+
+    def _finish(self, component, value, error=None):
+        component.ready_at = time.perf_counter()
+        if component.started_at is None:
+            component.started_at = component.ready_at
+        component.value = value
+        component.error = error
+        component.state = 'failed' if error else 'ready'
+
+        get_metrics_registry().gauge('jarvis_startup_seconds', 'Durata di inizializzazione per componente',
+                                     {'component': component.name}).set(component.seconds)
+        if DEBUG:
+            print(f"[STARTUP] {component.name}: {component.state} in {component.seconds:.2f}s"
+                  + (f" ({error})" if error else ""))
+
+        for listener in list(self.listeners):
+            try:
+                listener(component)
+            except Exception as e:
+                if DEBUG:
+                    print(f"[STARTUP] Errore listener: {e}")
+        # Dopo i listener: chi attende la fase trova già il componente collegato
+        component.done.set()
+        self._check_complete()
+
+    def _check_complete(self):
+        with self._lock:
+            if self.ready_at is not None or not all(c.done.is_set() for c in self.components.values()):
+                return
+            self.ready_at = time.perf_counter()
+
+        for callback in list(self.complete_listeners):
+            try:
+                callback()
+            except Exception as e:
+                if DEBUG:
+                    print(f"[STARTUP] Errore listener: {e}")
+
+    def is_ready(self, name):
+        component = self.components.get(name)
+        return component is not None and component.state == 'ready'
+
+    def get(self, name):
+        component = self.components.get(name)
+        return component.value if component is not None else None
+
+    def wait(self, names=None, timeout=None):
+        """Attende le fasi indicate (tutte se None); True se sono tutte pronte"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for name in names or list(self.components):
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            if not self.components[name].done.wait(remaining):
+                return False
+        return all(self.is_ready(name) for name in names or self.components)
+
+    def failed(self):
+        """Fasi richieste non riuscite"""
+        return [c for c in self.components.values() if c.required and c.state == 'failed']
+
+    def pending(self):
+        return [name for name, c in self.components.items() if not c.done.is_set()]
+
+    @property
+    def state(self):
+        components = self.components.values()
+        if any(c.required and c.state == 'failed' for c in components):
+            return 'failed'
+        if all(c.state == 'ready' for c in components):
+            return 'ready'
+        if any(c.state == 'ready' for c in components):
+            return 'degraded'
+        return 'starting'
+
+    @property
+    def total_seconds(self):
+        if self.started_at is None:
+            return None
+        return (self.ready_at or time.perf_counter()) - self.started_at
+
+    def get_status(self):
+        """Stato di prontezza per app mobile ed endpoint /health"""
+        total = self.total_seconds
+        return {
+            'state': self.state,
+            'seconds': round(total, 2) if total is not None else None,
+            'components': {name: c.to_dict() for name, c in self.components.items()}
+        }
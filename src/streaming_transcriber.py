@@ -0,0 +1,183 @@
+"""
+Trascrizione Whisper in streaming con ipotesi parziali su finestra scorrevole
+"""
+
+import re
+import threading
+import numpy as np
+from config.settings import (
+    DEBUG, WHISPER_LANGUAGE, SAMPLE_RATE, MINIMUM_AUDIO_LENGTH,
+    STREAMING_STEP_SECONDS, STREAMING_WINDOW_SECONDS,
+    WHISPER_NO_SPEECH_THRESHOLD, WHISPER_LOGPROB_THRESHOLD
+)
+
+
+class StreamingWhisperTranscriber:
+    def __init__(self, whisper_model, language=WHISPER_LANGUAGE,
+                 step_seconds=STREAMING_STEP_SECONDS,
+                 window_seconds=STREAMING_WINDOW_SECONDS, fp16=False, temperature=0.0,
+                 no_speech_threshold=WHISPER_NO_SPEECH_THRESHOLD, logprob_threshold=WHISPER_LOGPROB_THRESHOLD):
+        """
+        Trascrive l'audio mentre l'utente parla.
+
+        Il modello viene rilanciato ogni `step_seconds` di audio nuovo sulla
+        parte non ancora confermata dell'enunciato. I segmenti che restano
+        identici tra due passate consecutive vengono confermati (LocalAgreement):
+        il loro audio esce dalla finestra e il testo viene riusato come prompt,
+        così ogni passata decodifica solo la coda ancora incerta.
+
+        `fp16` segue la precisione con cui è stato caricato il modello; le
+        soglie di silenzio sono le stesse della trascrizione non in streaming.
+        """
+        self.whisper_model = whisper_model
+        self.language = language
+        self.fp16 = fp16
+        self.temperature = temperature  # Una sola temperatura: nessuna ridecodifica a ogni passata
+        self.no_speech_threshold = no_speech_threshold
+        self.logprob_threshold = logprob_threshold
+        self.step_samples = int(step_seconds * SAMPLE_RATE)
+        self.window_samples = int(window_seconds * SAMPLE_RATE)
+        self.min_samples = int(MINIMUM_AUDIO_LENGTH * SAMPLE_RATE)
+
+        # La cattura aggiunge audio mentre un worker decodifica: il lock dei
+        # chunk è tenuto per poche istruzioni, quello di decodifica per tutta la passata
+        self._chunk_lock = threading.Lock()
+        self._decode_lock = threading.Lock()
+
+        self.reset()
+
+    def reset(self):
+        """Prepara il trascrittore per un nuovo enunciato"""
+        self.finished = False
+        self.consumed = False  # Enunciato già gestito (es. wake word su parziale)
+        self.trace = None  # Traccia dell'enunciato (tracing.Trace)
+        self._chunks = []
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._pending_samples = 0
+        self._committed = []
+        self._previous_segments = []
+        self._tentative = ""
+
+    @property
+    def committed_text(self):
+        return " ".join(self._committed).strip()
+
+    @property
+    def hypothesis(self):
+        """Testo corrente: parte confermata + coda provvisoria"""
+        return " ".join(t for t in (self.committed_text, self._tentative) if t).strip()
+
+    def append(self, audio_data):
+        """
+        Aggiunge audio (float32 normalizzato) all'enunciato corrente senza decodificare
+
+        Returns:
+            bool: True se è arrivato abbastanza audio nuovo per una decodifica parziale
+        """
+        with self._chunk_lock:
+            self._chunks.append(audio_data)
+            self._pending_samples += len(audio_data)
+            return self._pending_samples >= self.step_samples
+
+    def decode_partial(self):
+        """
+        Rilancia il modello su tutto l'audio arrivato finora
+
+        Returns:
+            str | None: nuova ipotesi parziale, None se non c'è nulla da decodificare
+        """
+        with self._decode_lock:
+            if self.finished or self.consumed or self._pending_samples < self.step_samples:
+                return None
+
+            self._flush_chunks()
+            if len(self._buffer) < self.min_samples:
+                return None
+
+            self._decode(final=False)
+            return self.hypothesis
+
+    def push(self, audio_data):
+        """Aggiunge audio e, se serve, decodifica subito (uso sincrono)"""
+        if self.append(audio_data):
+            return self.decode_partial()
+        return None
+
+    def finish(self):
+        """Decodifica la coda rimanente e restituisce l'ipotesi finale"""
+        with self._decode_lock:
+            if self.finished or self.consumed:
+                return ""
+            self._flush_chunks()
+            if len(self._buffer) >= self.min_samples // 2:
+                self._decode(final=True)
+            text = self.hypothesis
+            self.finished = True
+            return text
+
+    def _flush_chunks(self):
+        with self._chunk_lock:
+            chunks, self._chunks = self._chunks, []
+            self._pending_samples = 0
+        if chunks:
+            self._buffer = np.concatenate([self._buffer] + chunks)
+
+    def _decode(self, final):
+        """Esegue una passata del modello sulla finestra non confermata"""
+        try:
+            result = self.whisper_model.transcribe(
+                self._buffer,
+                language=self.language,
+                fp16=self.fp16,
+                verbose=None,
+                temperature=self.temperature,
+                no_speech_threshold=self.no_speech_threshold,
+                logprob_threshold=self.logprob_threshold,
+                condition_on_previous_text=False,
+                initial_prompt=self.committed_text or None
+            )
+        except Exception as e:
+            if DEBUG:
+                print(f"[STREAM] Errore decodifica: {e}")
+            return
+
+        segments = [
+            (seg['start'], seg['end'], seg['text'].strip())
+            for seg in result.get('segments', [])
+            if seg['text'].strip()
+        ]
+
+        if final:
+            self._committed.extend(text for _, _, text in segments)
+            self._tentative = ""
+            self._buffer = np.zeros(0, dtype=np.float32)
+            return
+
+        # Conferma i segmenti stabili tra due passate, lasciando sempre
+        # l'ultimo passo di audio come coda provvisoria
+        horizon = (len(self._buffer) - self.step_samples) / SAMPLE_RATE
+        stable = 0
+        for current, previous in zip(segments, self._previous_segments):
+            if current[1] > horizon or _normalize(current[2]) != _normalize(previous[2]):
+                break
+            stable += 1
+
+        # Finestra piena senza accordo: conferma forzata di tutto tranne l'ultimo
+        if stable == 0 and len(self._buffer) > self.window_samples:
+            stable = max(0, len(segments) - 1)
+
+        if stable:
+            self._committed.extend(text for _, _, text in segments[:stable])
+            cut = int(segments[stable - 1][1] * SAMPLE_RATE)
+            self._buffer = self._buffer[cut:]
+            segments = [
+                (start - cut / SAMPLE_RATE, end - cut / SAMPLE_RATE, text)
+                for start, end, text in segments[stable:]
+            ]
+
+        self._previous_segments = segments
+        self._tentative = " ".join(text for _, _, text in segments)
+
+
+def _normalize(text):
+    return re.sub(r'[^\w\s]', '', text.lower()).strip()
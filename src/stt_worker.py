@@ -0,0 +1,359 @@
+"""
+Trascrizione Whisper in processi separati (fuori dal GIL del processo principale)
+
+Con STT_BACKEND='process' il modello vive in uno o più processi worker:
+cattura, VAD, TTS e server WebSocket non competono più con l'inferenza per
+il GIL. L'audio passa in memoria condivisa (un segmento per worker), sulla
+pipe viaggiano solo lunghezza, opzioni e il testo trascritto.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from config.settings import (
+    DEBUG, SAMPLE_RATE, AUDIO_BUFFER_SIZE, WHISPER_MODEL, WHISPER_PRECISION, WHISPER_FAST_DECODE,
+    STT_WORKERS, STT_MAX_RESTARTS, STT_LOAD_TIMEOUT, STT_REQUEST_TIMEOUT
+)
+from metrics import get_metrics_registry
+
+STT_BACKENDS = ('inprocess', 'process')
+
+STT_WORKER_RESTARTS = get_metrics_registry().counter('jarvis_stt_worker_restarts_total',
+                                                     'Riavvii dei processi di trascrizione')
+
+
+class STTWorkerError(Exception):
+    """Il worker è terminato o non ha risposto in tempo"""
+
+
+def _result_dict(result):
+    """Solo i campi usati dal chiamante: il resto non attraversa la pipe"""
+    return {
+        'text': result.get('text', ''),
+        'language': result.get('language'),
+        'segments': [
+            {'start': seg['start'], 'end': seg['end'], 'text': seg['text']}
+            for seg in result.get('segments', [])
+        ]
+    }
+
+
+def _worker_main(conn, shm_name, slot_samples, model_name, precision, fast_decode, threads):
+    """Processo worker: carica il modello e serve richieste finché la pipe è aperta"""
+    shm = None
+    try:
+        try:
+            import torch
+            from whisper_engine import CommandTranscriber, load_whisper_model
+
+            if threads:
+                torch.set_num_threads(threads)
+
+            shm = shared_memory.SharedMemory(name=shm_name)
+            slot = np.ndarray((slot_samples,), dtype=np.float32, buffer=shm.buf)
+
+            model, precision = load_whisper_model(model_name, precision)
+            command_transcriber = CommandTranscriber(model, fp16=precision == 'fp16') if fast_decode else None
+            conn.send(('ready', precision))
+        except Exception as e:
+            conn.send(('error', f"caricamento modello fallito: {e}"))
+            return
+
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if request is None:
+                break
+
+            method, samples, options, inline = request
+            # Copia: il segmento viene riscritto per la richiesta successiva
+            audio = np.array(inline if inline is not None else slot[:samples], dtype=np.float32)
+
+            try:
+                if method == 'fast':
+                    if command_transcriber is None:
+                        conn.send(('error', "decodifica veloce non attiva in questo worker (fast_decode=False)"))
+                    else:
+                        conn.send(('ok', command_transcriber.transcribe(audio)))
+                else:
+                    conn.send(('ok', _result_dict(model.transcribe(audio, **(options or {})))))
+            except Exception as e:
+                conn.send(('error', str(e)))
+    finally:
+        # Anche se il caricamento fallisce: il segmento resta del processo principale
+        if shm is not None:
+            shm.close()
+
+
+class STTWorker:
+    def __init__(self, index, model_name, precision, fast_decode, slot_seconds, threads):
+        """
+        Un processo worker con il proprio segmento di memoria condivisa
+
+        Il segmento appartiene al processo principale e sopravvive ai
+        riavvii del worker.
+        """
+        self.index = index
+        self.model_name = model_name
+        self.requested_precision = precision
+        self.fast_decode = fast_decode
+        self.threads = threads
+        self.slot_samples = int(slot_seconds * SAMPLE_RATE)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_samples * 4)
+        self.slot = np.ndarray((self.slot_samples,), dtype=np.float32, buffer=self.shm.buf)
+
+        self.process = None
+        self.conn = None
+        self.lock = threading.Lock()  # Una richiesta (o un riavvio) alla volta
+        self.precision = None
+        self.ready = threading.Event()
+        self.load_error = None
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.requests = 0
+
+    @property
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """Avvia il processo (il modello si carica in background)"""
+        context = multiprocessing.get_context('spawn')  # Niente fork dopo PortAudio e i thread di torch
+        parent_conn, child_conn = context.Pipe()
+        self.ready.clear()
+        self.load_error = None
+        self.conn = parent_conn
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.shm.name, self.slot_samples, self.model_name,
+                  self.requested_precision, self.fast_decode, self.threads),
+            name=f"stt-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+        if DEBUG:
+            print(f"[STT] Worker {self.index} avviato (pid {self.process.pid})")
+
+    def wait_ready(self, timeout=STT_LOAD_TIMEOUT):
+        """Attende il caricamento del modello; False se il worker è morto o ha fallito"""
+        if self.ready.is_set():
+            return True
+        if self.conn is None:
+            return False
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.conn.poll(0.1):
+                try:
+                    status, value = self.conn.recv()
+                except EOFError:
+                    break
+                if status == 'ready':
+                    self.precision = value
+                    self.consecutive_failures = 0
+                    self.ready.set()
+                    if DEBUG:
+                        print(f"[STT] Worker {self.index} pronto ({value})")
+                    return True
+                self.load_error = value
+                break
+            if not self.is_alive:
+                break
+
+        if self.load_error is None:
+            self.load_error = 'worker terminato durante il caricamento' if not self.is_alive else 'timeout caricamento'
+        if DEBUG:
+            print(f"[STT] Worker {self.index}: {self.load_error}")
+        return False
+
+    def restart(self):
+        """Sostituisce un worker terminato o bloccato (con attesa crescente)"""
+        self.kill()
+        self.restarts += 1
+        self.consecutive_failures += 1
+        STT_WORKER_RESTARTS.inc()
+        if self.consecutive_failures > STT_MAX_RESTARTS:
+            raise STTWorkerError(f"worker {self.index}: troppi riavvii consecutivi ({self.load_error})")
+
+        time.sleep(min(0.5 * 2 ** (self.consecutive_failures - 1), 10))
+        if self.slot is None:
+            raise STTWorkerError(f"worker {self.index} fermato")
+        if DEBUG:
+            print(f"[STT] ♻️ Riavvio worker {self.index} (tentativo {self.consecutive_failures})")
+        self.start()
+
+    def request(self, method, audio_data, options, timeout=STT_REQUEST_TIMEOUT):
+        """Esegue una richiesta; STTWorkerError se il processo muore o non risponde"""
+        while not self.wait_ready():
+            self.restart()
+
+        audio = np.asarray(audio_data, dtype=np.float32)
+        inline = None
+        if len(audio) <= self.slot_samples:
+            self.slot[:len(audio)] = audio
+        else:
+            inline = audio  # Oltre la capacità del segmento: copia sulla pipe
+
+        try:
+            self.conn.send((method, len(audio), options, inline))
+            deadline = time.monotonic() + timeout
+            while not self.conn.poll(0.1):
+                if not self.is_alive:
+                    raise STTWorkerError(f"worker {self.index} terminato (exit {self.process.exitcode})")
+                if time.monotonic() > deadline:
+                    raise STTWorkerError(f"worker {self.index} non risponde da {timeout}s")
+            status, value = self.conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError) as e:
+            raise STTWorkerError(f"worker {self.index} terminato: {e}")
+
+        self.requests += 1
+        if status != 'ok':
+            raise Exception(value)
+        return value
+
+    def kill(self):
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join(timeout=2)
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+        self.ready.clear()
+
+    def stop(self, timeout=2):
+        """Chiude il worker e rilascia la memoria condivisa"""
+        if self.is_alive:
+            try:
+                self.conn.send(None)
+                self.process.join(timeout)
+            except Exception:
+                pass
+        self.kill()
+        self.slot = None
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except Exception:
+            pass
+
+
+class STTWorkerPool:
+    def __init__(self, workers=STT_WORKERS, model_name=WHISPER_MODEL, precision=WHISPER_PRECISION,
+                 fast_decode=WHISPER_FAST_DECODE, slot_seconds=AUDIO_BUFFER_SIZE):
+        """
+        Pool di processi Whisper con la stessa interfaccia del modello in-process
+
+        `transcribe(audio, **opzioni)` restituisce il dizionario di Whisper
+        (testo e segmenti), quindi il pool può sostituire il modello in
+        StreamingWhisperTranscriber e nel gestore vocale; `command_transcriber()`
+        fa le veci di CommandTranscriber. Un worker che muore viene riavviato e
+        la richiesta ripetuta una volta.
+        """
+        threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+        self.workers = [
+            STTWorker(i, model_name, precision, fast_decode, slot_seconds, threads)
+            for i in range(max(1, workers))
+        ]
+        self.fast_decode = fast_decode
+        self._idle = queue.Queue()
+        self.is_running = False
+
+    @property
+    def precision(self):
+        return next((w.precision for w in self.workers if w.precision), None)
+
+    def start(self, wait=True):
+        """Avvia i worker; con `wait` attende che almeno uno abbia caricato il modello"""
+        if self.is_running:
+            return self
+        for worker in self.workers:
+            worker.start()
+            self._idle.put(worker)
+        self.is_running = True
+        threading.Thread(target=self._supervise, name="stt-supervisor", daemon=True).start()
+
+        if wait and not any([worker.wait_ready() for worker in self.workers]):
+            errors = '; '.join(w.load_error or '' for w in self.workers)
+            self.stop()
+            raise Exception(f"Nessun worker di trascrizione disponibile: {errors}")
+        return self
+
+    def _request(self, method, audio_data, options):
+        worker = self._idle.get()
+        try:
+            with worker.lock:
+                for attempt in range(2):
+                    try:
+                        return worker.request(method, audio_data, options)
+                    except STTWorkerError as e:
+                        if DEBUG:
+                            print(f"[STT] ⚠️ {e}")
+                        if not self.is_running:
+                            raise
+                        worker.restart()
+                        if attempt:
+                            raise
+        finally:
+            self._idle.put(worker)
+
+    def _supervise(self):
+        """Riavvia i worker inattivi terminati, così il modello è già carico al prossimo enunciato"""
+        while self.is_running:
+            time.sleep(1.0)
+            for worker in self.workers:
+                if not self.is_running or worker.is_alive or not worker.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if worker.consecutive_failures <= STT_MAX_RESTARTS:
+                        worker.restart()
+                        worker.wait_ready()
+                except Exception as e:
+                    if DEBUG:
+                        print(f"[STT] Riavvio worker {worker.index} fallito: {e}")
+                finally:
+                    worker.lock.release()
+
+    def transcribe(self, audio_data, **options):
+        """Come `whisper_model.transcribe`, eseguito in un worker"""
+        options['verbose'] = None
+        return self._request('transcribe', audio_data, options)
+
+    def command_transcriber(self):
+        """Trascrittore veloce sui worker; None se i worker non hanno la decodifica veloce"""
+        return RemoteCommandTranscriber(self) if self.fast_decode else None
+
+    def get_stats(self):
+        return {
+            'workers': len(self.workers),
+            'alive': sum(1 for w in self.workers if w.is_alive),
+            'ready': sum(1 for w in self.workers if w.ready.is_set()),
+            'requests': sum(w.requests for w in self.workers),
+            'restarts': sum(w.restarts for w in self.workers),
+            'shared_memory_bytes': sum(w.shm.size for w in self.workers if w.slot is not None)
+        }
+
+    def stop(self):
+        self.is_running = False
+        for worker in self.workers:
+            worker.stop()
+        if DEBUG:
+            print("[STT] Worker di trascrizione fermati")
+
+
+class RemoteCommandTranscriber:
+    def __init__(self, pool):
+        """Percorso veloce per comandi brevi (CommandTranscriber nel worker)"""
+        self.pool = pool
+
+    def transcribe(self, audio_data):
+        return self.pool._request('fast', audio_data, None)
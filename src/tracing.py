@@ -0,0 +1,234 @@
+"""
+Tracciamento per enunciato: timeline delle fasi dal parlato alla risposta
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config.settings import DEBUG, TRACING_ENABLED, TRACE_HISTORY
+
+_current_trace = ContextVar('jarvis_trace', default=None)
+
+
+class Trace:
+    def __init__(self, kind='utterance', start=None):
+        """
+        Timeline di un enunciato, identificata da `trace_id`
+
+        Nasce quando il VAD conferma l'inizio del parlato (o con il comando
+        manuale) e segue l'enunciato attraverso coda, Whisper, callback,
+        Ollama e TTS. Gli span sono in secondi di `time.perf_counter()`.
+        """
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.start = time.perf_counter() if start is None else start
+        self.wall_time = time.time() - (time.perf_counter() - self.start)
+        self.spans = []
+        self.outcome = None
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, end=None, **attrs):
+        """Registra uno span già misurato"""
+        span = {
+            'name': name,
+            'start': start,
+            'end': time.perf_counter() if end is None else end,
+            'thread': threading.current_thread().name,
+            'tid': threading.get_ident(),
+            'attrs': attrs
+        }
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Misura il blocco `with` come span (gli attributi si possono aggiornare dentro)"""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.add_span(name, start, **attrs)
+
+    def mark(self, name, **attrs):
+        """Evento istantaneo"""
+        now = time.perf_counter()
+        return self.add_span(name, now, now, **attrs)
+
+    def finish(self, outcome=None):
+        """Chiude la traccia e la consegna allo store (idempotente)"""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            self.outcome = outcome
+        get_trace_store().add(self)
+
+    def span_start(self, name):
+        """Inizio del primo span con questo nome (None se assente)"""
+        with self._lock:
+            return next((s['start'] for s in self.spans if s['name'] == name), None)
+
+    @property
+    def duration(self):
+        with self._lock:
+            end = max((s['end'] for s in self.spans), default=self.start)
+        return end - self.start
+
+    def to_dict(self):
+        """Timeline compatta (millisecondi relativi all'inizio) per log e app mobile"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['start'])
+        return {
+            'trace_id': self.trace_id,
+            'kind': self.kind,
+            'outcome': self.outcome,
+            'started_at': self.wall_time,
+            'duration_ms': round(self.duration * 1000, 1),
+            'spans': [{
+                'name': s['name'],
+                'start_ms': round((s['start'] - self.start) * 1000, 1),
+                'duration_ms': round((s['end'] - s['start']) * 1000, 1),
+                'thread': s['thread'],
+                **s['attrs']
+            } for s in spans]
+        }
+
+    def to_chrome_events(self, pid):
+        """Eventi 'X' del formato Chrome trace-event (microsecondi)"""
+        with self._lock:
+            spans = list(self.spans)
+        return [{
+            'name': s['name'],
+            'cat': self.kind,
+            'ph': 'X' if s['end'] > s['start'] else 'i',
+            'ts': s['start'] * 1e6,
+            'dur': (s['end'] - s['start']) * 1e6,
+            'pid': pid,
+            'tid': s['tid'],
+            's': 't',
+            'args': {'trace_id': self.trace_id, 'outcome': self.outcome, **s['attrs']}
+        } for s in spans]
+
+
+class TraceStore:
+    def __init__(self, maxlen=TRACE_HISTORY):
+        """Ultime `maxlen` tracce completate, con notifica ai listener"""
+        self.traces = deque(maxlen=maxlen)
+        self.listeners = []
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        with self._lock:
+            self.traces.append(trace)
+            listeners = list(self.listeners)
+
+        if DEBUG:
+            timeline = ', '.join(f"{s['name']} {(s['end'] - s['start']) * 1000:.0f}ms"
+                                 for s in sorted(trace.spans, key=lambda s: s['start']))
+            print(f"[TRACE] {trace.trace_id} ({trace.kind}, {trace.outcome}): {timeline}")
+
+        for listener in listeners:
+            try:
+                listener(trace)
+            except Exception as e:
+                if DEBUG:
+                    print(f"[TRACE] Errore listener: {e}")
+
+    def add_listener(self, callback):
+        """`callback(trace)` viene chiamata (nel thread che chiude la traccia) a ogni traccia completata"""
+        with self._lock:
+            self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self.listeners:
+                self.listeners.remove(callback)
+
+    def latest(self):
+        with self._lock:
+            return self.traces[-1] if self.traces else None
+
+    def get(self, trace_id):
+        with self._lock:
+            return next((t for t in self.traces if t.trace_id == trace_id), None)
+
+    def to_chrome_trace(self):
+        """Tutte le tracce in formato Chrome trace-event (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        with self._lock:
+            traces = list(self.traces)
+
+        events = []
+        threads = {}
+        for trace in traces:
+            events.extend(trace.to_chrome_events(pid))
+            for s in trace.spans:
+                threads[s['tid']] = s['thread']
+
+        events.extend({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                      for tid, name in threads.items())
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome(self, path):
+        """Scrive le tracce in un file JSON apribile con chrome://tracing o ui.perfetto.dev"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+        if DEBUG:
+            print(f"[TRACE] {len(self.traces)} tracce esportate in {path}")
+        return path
+
+
+_store = TraceStore()
+
+
+def get_trace_store():
+    return _store
+
+
+def start_trace(kind='utterance', start=None):
+    """Nuova traccia (None se il tracciamento è disattivato)"""
+    if not TRACING_ENABLED:
+        return None
+    return Trace(kind, start)
+
+
+def current_trace():
+    """Traccia attiva nel contesto corrente (thread o task asyncio)"""
+    return _current_trace.get()
+
+
+@contextmanager
+def activate(trace):
+    """Rende `trace` la traccia corrente per il blocco `with` (None è ammesso)"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Span sulla traccia corrente; nessun costo se non c'è una traccia attiva"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield attrs
+        return
+    with trace.span(name, **attrs) as span_attrs:
+        yield span_attrs
+
+
+def finish_trace(trace, outcome=None):
+    """Chiude una traccia se presente"""
+    if trace is not None:
+        trace.finish(outcome)
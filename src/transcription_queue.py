@@ -0,0 +1,262 @@
+"""
+Coda limitata di lavori di trascrizione consumata da un pool di worker
+"""
+
+import threading
+import time
+from collections import deque
+from config.settings import (
+    DEBUG, TRANSCRIPTION_THREADS, TRANSCRIPTION_QUEUE_SIZE, TRANSCRIPTION_QUEUE_POLICY
+)
+from tracing import finish_trace
+from metrics import TRANSCRIPTION_JOBS_DROPPED
+
+QUEUE_POLICIES = ('drop_oldest', 'drop_newest', 'coalesce')
+
+
+class TranscriptionJob:
+    def __init__(self, kind, payload, trace=None):
+        """
+        Lavoro di trascrizione
+
+        Args:
+            kind (str): 'utterance' (enunciato completo), 'speculative' (enunciato
+                forse incompleto), 'partial' o 'final' (streaming), 'spot' (spotter
+                wake word sulla finestra scorrevole)
+            payload: dati del lavoro (AudioSegment, SpeculativeTranscription o trascrittore streaming)
+            trace (Trace | None): traccia dell'enunciato
+        """
+        self.kind = kind
+        self.payload = payload
+        self.trace = trace
+        self.created_at = time.perf_counter()
+
+    def coalesce(self, other):
+        """
+        Prova ad assorbire un lavoro successivo in questo
+
+        Returns:
+            bool: True se `other` è stato assorbito e non va accodato
+        """
+        if self.kind == other.kind == 'utterance':
+            # Enunciati consecutivi: un solo passaggio di Whisper su entrambi
+            merged = self.payload.merge(other.payload)
+            if merged is None:
+                return False
+            self.payload = merged
+            finish_trace(other.trace, 'coalesced')
+            return True
+        if self.kind == other.kind and self.kind in ('partial', 'spot') and self.payload is other.payload:
+            # La decodifica parziale (o il confronto) già in coda userà anche l'audio nuovo
+            return True
+        return False
+
+    def discard(self):
+        """Chiamato quando la coda scarta il lavoro"""
+        if self.kind == 'speculative':
+            # Chi attende il risultato ricadrà sulla trascrizione normale
+            self.payload.cancel()
+        elif self.kind in ('utterance', 'final') or (self.kind == 'spot' and self.payload.finished):
+            finish_trace(self.trace, 'dropped')
+
+
+class SpeculativeTranscription:
+    def __init__(self, segment):
+        """
+        Trascrizione avviata alla prima pausa, prima che il silenzio sia confermato
+
+        La cattura la annulla se il parlato riprende o la conferma a fine
+        silenzio; il worker la esegue e la inoltra solo se confermata.
+        """
+        self.segment = segment
+        self.state = 'pending'  # pending, running, done, cancelled
+        self.committed = False
+        self.result = None
+        self.trace = None  # Traccia dell'enunciato (tracing.Trace)
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Il worker inizia: False se nel frattempo è stata annullata"""
+        with self._lock:
+            if self.state == 'cancelled':
+                return False
+            self.state = 'running'
+            return True
+
+    def complete(self, result):
+        """
+        Il worker ha finito
+
+        Returns:
+            bool: True se la speculazione era già confermata e il worker deve inoltrare
+        """
+        with self._lock:
+            if self.state == 'cancelled':
+                return False
+            self.state = 'done'
+            self.result = result
+            return self.committed
+
+    def cancel(self):
+        """Annulla la speculazione (parlato ripreso o lavoro scartato)"""
+        with self._lock:
+            if self.committed or self.state == 'cancelled':
+                return False
+            self.state = 'cancelled'
+            return True
+
+    def commit(self):
+        """
+        Conferma la speculazione a fine silenzio
+
+        Returns:
+            tuple: (confermata, risultato pronto, risultato)
+        """
+        with self._lock:
+            if self.state == 'cancelled':
+                return False, False, None
+            self.committed = True
+            ready = self.state == 'done'
+            return True, ready, self.result if ready else None
+
+
+class TranscriptionWorkQueue:
+    def __init__(self, handler, workers=TRANSCRIPTION_THREADS,
+                 maxsize=TRANSCRIPTION_QUEUE_SIZE, policy=TRANSCRIPTION_QUEUE_POLICY):
+        """
+        Disaccoppia la cattura audio dalla trascrizione
+
+        Args:
+            handler (callable): funzione eseguita dai worker per ogni TranscriptionJob
+            workers (int): numero di thread di trascrizione
+            maxsize (int): lavori massimi in attesa
+            policy (str): comportamento a coda piena ('drop_oldest', 'drop_newest', 'coalesce')
+        """
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Policy coda sconosciuta: {policy} (valide: {', '.join(QUEUE_POLICIES)})")
+
+        self.handler = handler
+        self.num_workers = max(1, int(workers))
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+
+        self._jobs = deque()
+        self._condition = threading.Condition()
+        self._workers = []
+        self.is_running = False
+
+        # Contatori
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.busy_workers = 0
+        self.total_wait_time = 0.0
+
+    def start(self):
+        """Avvia i worker"""
+        with self._condition:
+            if self.is_running:
+                return
+            self.is_running = True
+
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"transcriber-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        if DEBUG:
+            print(f"[QUEUE] {self.num_workers} worker di trascrizione avviati "
+                  f"(coda {self.maxsize}, policy {self.policy})")
+
+    def stop(self, timeout=2):
+        """Ferma i worker scartando i lavori in attesa"""
+        with self._condition:
+            self.is_running = False
+            for job in self._jobs:
+                job.discard()
+            self._jobs.clear()
+            self._condition.notify_all()
+
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+
+    def submit(self, job):
+        """
+        Accoda un lavoro senza mai bloccare il chiamante (thread di cattura)
+
+        Returns:
+            bool: True se il lavoro è stato accodato o assorbito
+        """
+        with self._condition:
+            self.submitted += 1
+
+            if len(self._jobs) >= self.maxsize:
+                if self.policy == 'coalesce' and self._jobs[-1].coalesce(job):
+                    self.coalesced += 1
+                    return True
+                if self.policy == 'drop_newest':
+                    job.discard()
+                    self.dropped += 1
+                    TRANSCRIPTION_JOBS_DROPPED.inc()
+                    if DEBUG:
+                        print("[QUEUE] ⚠️ Coda piena, lavoro scartato")
+                    return False
+                # drop_oldest (e coalesce quando non è possibile unire)
+                self._jobs.popleft().discard()
+                self.dropped += 1
+                TRANSCRIPTION_JOBS_DROPPED.inc()
+                if DEBUG:
+                    print("[QUEUE] ⚠️ Coda piena, scartato il lavoro più vecchio")
+
+            self._jobs.append(job)
+            self.max_depth = max(self.max_depth, len(self._jobs))
+            self._condition.notify()
+            return True
+
+    def _worker_loop(self):
+        """Consuma lavori finché la coda è attiva"""
+        while True:
+            with self._condition:
+                while self.is_running and not self._jobs:
+                    self._condition.wait()
+                if not self.is_running:
+                    return
+                job = self._jobs.popleft()
+                self.busy_workers += 1
+                self.total_wait_time += time.perf_counter() - job.created_at
+
+            try:
+                self.handler(job)
+            except Exception as e:
+                with self._condition:
+                    self.failed += 1
+                if DEBUG:
+                    print(f"[QUEUE] Errore lavoro {job.kind}: {e}")
+            finally:
+                with self._condition:
+                    self.busy_workers -= 1
+                    self.processed += 1
+
+    @property
+    def depth(self):
+        return len(self._jobs)
+
+    def get_stats(self):
+        """Statistiche della coda di trascrizione"""
+        with self._condition:
+            return {
+                'workers': self.num_workers,
+                'busy_workers': self.busy_workers,
+                'depth': len(self._jobs),
+                'max_depth': self.max_depth,
+                'submitted': self.submitted,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'failed': self.failed,
+                'avg_wait_ms': (self.total_wait_time / self.processed * 1000) if self.processed else 0.0
+            }
@@ -0,0 +1,163 @@
+"""
+Voice Activity Detection: motori selezionabili da config/settings.py
+"""
+
+import numpy as np
+from config.settings import (
+    DEBUG, SAMPLE_RATE, VAD_ENGINE, VOICE_DETECTION_THRESHOLD,
+    VAD_FRAME_SIZE, VAD_SPEECH_BAND, VAD_ENERGY_RATIO, VAD_FLATNESS_MAX,
+    VAD_BAND_RATIO_MIN, VAD_ZCR_MAX, VAD_HANGOVER_CHUNKS
+)
+
+
+class VoiceActivityDetector:
+    """Interfaccia comune dei motori VAD"""
+
+    def __init__(self, frame_size=VAD_FRAME_SIZE, hangover_chunks=VAD_HANGOVER_CHUNKS):
+        self.frame_size = frame_size
+        self.hangover_chunks = hangover_chunks
+        self.speech_onsets = 0  # Transizioni silenzio -> voce
+        self.reset()
+
+    def reset(self):
+        """Azzera lo stato tra una sessione di ascolto e l'altra"""
+        self._hangover = 0
+        self._in_speech = False
+
+    def score_frames(self, frames):
+        """
+        Classifica un blocco di frame in un'unica chiamata vettoriale
+
+        Args:
+            frames (np.ndarray): matrice (n_frame x frame_size), int16 o float
+
+        Returns:
+            np.ndarray: maschera booleana, True per i frame con voce
+        """
+        raise NotImplementedError
+
+    def score_block(self, samples):
+        """Divide un blocco di campioni contigui in frame e li classifica tutti insieme"""
+        samples = np.asarray(samples)
+        n_frames = len(samples) // self.frame_size
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+        frames = samples[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+        return self.score_frames(frames)
+
+    def is_speech(self, chunk):
+        """
+        Decisione per un chunk di cattura, con hangover sulla fine del parlato
+
+        L'attacco non ha ritardo: basta che metà dei frame del chunk siano voce.
+        Dopo l'ultimo chunk con voce la decisione resta positiva per
+        `hangover_chunks` chunk, per non spezzare le frasi sulle pause brevi.
+        """
+        voiced = self.score_block(chunk)
+        active = bool(len(voiced)) and voiced.mean() >= 0.5
+
+        if active:
+            if not self._in_speech:
+                self.speech_onsets += 1
+            self._in_speech = True
+            self._hangover = self.hangover_chunks
+            return True
+
+        if self._hangover > 0:
+            self._hangover -= 1
+            return True
+
+        self._in_speech = False
+        return False
+
+
+class RMSVoiceActivityDetector(VoiceActivityDetector):
+    def __init__(self, threshold=VOICE_DETECTION_THRESHOLD, **kwargs):
+        """VAD a soglia di volume (comportamento storico, senza overflow int16)"""
+        self.threshold = threshold
+        super().__init__(**kwargs)
+
+    def score_frames(self, frames):
+        frames = np.asarray(frames, dtype=np.float32)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        return rms > self.threshold
+
+
+class SpectralVoiceActivityDetector(VoiceActivityDetector):
+    def __init__(self, sample_rate=SAMPLE_RATE, speech_band=VAD_SPEECH_BAND,
+                 energy_ratio=VAD_ENERGY_RATIO, flatness_max=VAD_FLATNESS_MAX,
+                 band_ratio_min=VAD_BAND_RATIO_MIN, zcr_max=VAD_ZCR_MAX,
+                 min_rms=VOICE_DETECTION_THRESHOLD, **kwargs):
+        """
+        VAD su feature spettrali
+
+        Un frame è voce se la sua energia supera il rumore di fondo stimato
+        e lo spettro è "da parlato": energia concentrata nella banda vocale,
+        bassa piattezza spettrale (armoniche, non rumore a banda larga come
+        ventole e vento) e tasso di attraversamenti dello zero contenuto.
+        """
+        super().__init__(**kwargs)
+        self.energy_ratio = energy_ratio
+        self.flatness_max = flatness_max
+        self.band_ratio_min = band_ratio_min
+        self.zcr_max = zcr_max
+        self.min_energy = float(min_rms) ** 2
+
+        freqs = np.fft.rfftfreq(self.frame_size, d=1.0 / sample_rate)
+        self._band = (freqs >= speech_band[0]) & (freqs <= speech_band[1])
+        self._window = np.hanning(self.frame_size).astype(np.float32)
+
+        self.noise_energy = None  # Rumore di fondo (energia media per campione)
+
+    def reset(self):
+        super().reset()
+        self.noise_energy = None
+
+    def score_frames(self, frames):
+        frames = np.asarray(frames, dtype=np.float32)
+        energy = np.mean(frames * frames, axis=1)
+
+        spectrum = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2 + 1e-10
+        band = spectrum[:, self._band]
+        band_ratio = band.sum(axis=1) / spectrum.sum(axis=1)
+        flatness = np.exp(np.mean(np.log(band), axis=1)) / np.mean(band, axis=1)
+
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_size
+
+        if self.noise_energy is None:
+            # Primo blocco: stima iniziale dal frame più silenzioso
+            self.noise_energy = max(float(energy.min()), 1.0)
+
+        voiced = (
+            (energy > self.min_energy) &
+            (energy > self.noise_energy * self.energy_ratio) &
+            (band_ratio >= self.band_ratio_min) &
+            (flatness <= self.flatness_max) &
+            (zcr <= self.zcr_max)
+        )
+
+        # Il rumore di fondo segue i frame classificati come non voce:
+        # scende subito, sale lentamente (un attacco di voce non lo alza)
+        if not voiced.all():
+            noise = float(energy[~voiced].mean())
+            rate = 0.5 if noise < self.noise_energy else 0.05
+            self.noise_energy += rate * (noise - self.noise_energy)
+
+        return voiced
+
+
+VAD_ENGINES = {
+    'rms': RMSVoiceActivityDetector,
+    'spectral': SpectralVoiceActivityDetector,
+}
+
+
+def create_vad(engine=VAD_ENGINE, **kwargs):
+    """Crea il motore VAD configurato (fallback su 'rms' se sconosciuto)"""
+    vad_class = VAD_ENGINES.get(engine)
+    if vad_class is None:
+        if DEBUG:
+            print(f"[VAD] Motore '{engine}' sconosciuto, uso 'rms'")
+        vad_class = RMSVoiceActivityDetector
+    return vad_class(**kwargs)
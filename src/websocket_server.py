@@ -9,7 +9,9 @@ import json
 import threading
 import time
 from datetime import datetime
-from config.settings import DEBUG
+from config.settings import DEBUG, WHISPER_MODEL
+from tracing import get_trace_store
+from metrics import WS_SEND_SECONDS, get_metrics_registry
 
 
 class JarvisWebSocketServer:
@@ -19,6 +21,7 @@ class JarvisWebSocketServer:
         self.connected_clients = set()
         self.server = None
         self.is_running = False
+        self.loop = None
 
         # Statistiche da condividere
         self.stats = {
@@ -26,7 +29,10 @@ class JarvisWebSocketServer:
             'wake_words_detected': 0,
             'start_time': datetime.now(),
             'ai_model': 'llama3.2:1b',
-            'status': 'online'
+            'whisper_model': None,
+            'whisper_precision': None,
+            'status': 'online',
+            'startup': None
         }
 
         if DEBUG:
@@ -44,6 +50,10 @@ class JarvisWebSocketServer:
             )
 
             self.is_running = True
+            self.loop = asyncio.get_running_loop()
+
+            # Timeline degli enunciati verso l'app mobile
+            get_trace_store().add_listener(self._on_trace_finished)
 
             if DEBUG:
                 print(f"[WEBSOCKET] Server avviato su {host}:{port}")
@@ -71,7 +81,9 @@ class JarvisWebSocketServer:
                 print(f"[WEBSOCKET] Client connesso: {client_ip}")
                 print(f"[WEBSOCKET] Client totali: {len(self.connected_clients)}")
 
-            # Invia stato iniziale
+            # Invia stato iniziale (con la prontezza dei componenti durante l'avvio)
+            if self.main_system:
+                self.update_stats_from_main()
             await self.send_to_client(websocket, {
                 'type': 'connection_established',
                 'message': 'Connesso al casco Jarvis',
@@ -120,7 +132,7 @@ class JarvisWebSocketServer:
                 await self.handle_emergency_stop(websocket)
 
             elif message_type == 'list_models':
-                await self.handle_list_models(websocket)
+                await self.handle_list_models(websocket, data)
 
             elif message_type == 'setting_change':
                 await self.handle_setting_change(websocket, data)
@@ -128,6 +140,18 @@ class JarvisWebSocketServer:
             elif message_type == 'get_stats':
                 await self.send_stats_update(websocket)
 
+            elif message_type == 'get_metrics':
+                await self.send_metrics_update(websocket)
+
+            elif message_type == 'get_trace':
+                await self.handle_get_trace(websocket, data)
+
+            elif message_type == 'export_traces':
+                await self.send_to_client(websocket, {
+                    'type': 'traces_export',
+                    'trace': get_trace_store().to_chrome_trace()
+                })
+
             elif message_type == 'ping':
                 await self.send_to_client(websocket, {'type': 'pong'})
 
@@ -192,19 +216,22 @@ class JarvisWebSocketServer:
         })
 
         # Esegui test microfono se sistema principale disponibile
-        if self.main_system and hasattr(self.main_system, 'speech_handler'):
+        if self.main_system and getattr(self.main_system, 'speech_handler', None) is not None:
+            # Il test gira in un thread: le risposte tornano sul loop del server
+            loop = asyncio.get_running_loop()
+
             def test_mic():
                 try:
                     self.main_system.speech_handler.test_microphone(3)
-                    asyncio.create_task(self.send_to_client(websocket, {
+                    asyncio.run_coroutine_threadsafe(self.send_to_client(websocket, {
                         'type': 'microphone_test_completed',
                         'message': 'Test microfono completato con successo'
-                    }))
+                    }), loop)
                 except Exception as e:
-                    asyncio.create_task(self.send_to_client(websocket, {
+                    asyncio.run_coroutine_threadsafe(self.send_to_client(websocket, {
                         'type': 'microphone_test_failed',
                         'message': f'Test microfono fallito: {str(e)}'
-                    }))
+                    }), loop)
 
             threading.Thread(target=test_mic, daemon=True).start()
 
@@ -222,21 +249,37 @@ class JarvisWebSocketServer:
         if self.main_system:
             self.main_system.is_running = False
 
-    async def handle_list_models(self, websocket):
-        """Gestisce richiesta lista modelli AI"""
+    async def handle_list_models(self, websocket, data=None):
+        """
+        Gestisce richiesta lista modelli AI
+
+        Con `model` nel messaggio cambia modello: il nuovo viene caricato in
+        memoria prima del cambio e la risposta riporta i tempi di caricamento.
+        """
         models = ['llama3.2:1b', 'llama3.2:3b', 'qwen2.5:1.5b', 'mistral:7b']
+        assistant = getattr(self.main_system, 'ai_assistant', None) if self.main_system else None
+        target = (data or {}).get('model')
+        switched = None
+        residency = None
 
         # Se sistema principale disponibile, usa modelli reali
-        if self.main_system and hasattr(self.main_system, 'ai_assistant'):
+        if assistant is not None:
             try:
-                models = self.main_system.ai_assistant.list_available_models()
-            except:
-                pass
+                if target:
+                    switched = await assistant.switch_model(target)
+                    self.stats['ai_model'] = assistant.model
+                residency = assistant.residency.get_stats()
+                models = await assistant.list_available_models()
+            except Exception as e:
+                if DEBUG:
+                    print(f"[WEBSOCKET] Errore modelli: {e}")
 
         await self.send_to_client(websocket, {
             'type': 'models_list',
             'models': models,
-            'current_model': self.stats['ai_model']
+            'current_model': self.stats['ai_model'],
+            'switched': switched,
+            'residency': residency
         })
 
     async def handle_setting_change(self, websocket, data):
@@ -254,10 +297,32 @@ class JarvisWebSocketServer:
             'message': f'Impostazione {setting} aggiornata'
         })
 
+    async def handle_get_trace(self, websocket, data):
+        """Invia la timeline richiesta (o l'ultima completata)"""
+        store = get_trace_store()
+        trace_id = data.get('trace_id')
+        trace = store.get(trace_id) if trace_id else store.latest()
+
+        await self.send_to_client(websocket, {
+            'type': 'trace_timeline',
+            'trace': trace.to_dict() if trace else None
+        })
+
+    def _on_trace_finished(self, trace):
+        """Listener dello store tracce (thread qualsiasi): inoltra la timeline ai client"""
+        if not self.connected_clients or not self.loop or self.loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.broadcast_to_all({
+            'type': 'trace_timeline',
+            'trace': trace.to_dict()
+        }), self.loop)
+
     async def send_to_client(self, websocket, data):
         """Invia messaggio a un client specifico"""
         try:
-            await websocket.send(json.dumps(data))
+            message = json.dumps(data)
+            with WS_SEND_SECONDS.time():
+                await websocket.send(message)
         except websockets.exceptions.ConnectionClosed:
             self.connected_clients.discard(websocket)
         except Exception as e:
@@ -274,7 +339,8 @@ class JarvisWebSocketServer:
 
         for websocket in self.connected_clients:
             try:
-                await websocket.send(message)
+                with WS_SEND_SECONDS.time():
+                    await websocket.send(message)
             except websockets.exceptions.ConnectionClosed:
                 disconnected.add(websocket)
             except Exception as e:
@@ -299,6 +365,10 @@ class JarvisWebSocketServer:
                     'type': 'stats_update',
                     'stats': self.get_current_stats()
                 })
+                await self.broadcast_to_all({
+                    'type': 'metrics_update',
+                    'metrics': get_metrics_registry().snapshot()
+                })
 
     async def send_stats_update(self, websocket):
         """Invia aggiornamento statistiche a client specifico"""
@@ -307,14 +377,26 @@ class JarvisWebSocketServer:
             'stats': self.get_current_stats()
         })
 
+    async def send_metrics_update(self, websocket):
+        """Invia le metriche aggregate (forma compatta) a client specifico"""
+        await self.send_to_client(websocket, {
+            'type': 'metrics_update',
+            'metrics': get_metrics_registry().snapshot()
+        })
+
     def update_stats_from_main(self):
         """Aggiorna statistiche dal sistema principale"""
         if self.main_system:
             try:
                 self.stats['commands_processed'] = self.main_system.commands_processed
                 self.stats['wake_words_detected'] = self.main_system.wake_words_detected
-                if hasattr(self.main_system, 'ai_assistant'):
+                if getattr(self.main_system, 'ai_assistant', None) is not None:
                     self.stats['ai_model'] = self.main_system.ai_assistant.model
+                if getattr(self.main_system, 'speech_handler', None) is not None:
+                    self.stats['whisper_model'] = WHISPER_MODEL
+                    self.stats['whisper_precision'] = self.main_system.speech_handler.whisper_precision
+                if hasattr(self.main_system, 'get_status'):
+                    self.stats['startup'] = self.main_system.get_status()
                 self.stats['status'] = 'online' if self.main_system.is_running else 'offline'
             except:
                 pass
@@ -328,7 +410,10 @@ class JarvisWebSocketServer:
             'wake_words_detected': self.stats['wake_words_detected'],
             'uptime_seconds': int(uptime.total_seconds()),
             'ai_model': self.stats['ai_model'],
+            'whisper_model': self.stats['whisper_model'],
+            'whisper_precision': self.stats['whisper_precision'],
             'status': self.stats['status'],
+            'startup': self.stats['startup'],
             'connected_clients': len(self.connected_clients)
         }
 
@@ -354,6 +439,7 @@ class JarvisWebSocketServer:
     async def stop_server(self):
         """Ferma il server WebSocket"""
         self.is_running = False
+        get_trace_store().remove_listener(self._on_trace_finished)
 
         if self.server:
             self.server.close()
@@ -0,0 +1,344 @@
+"""
+Motore di trascrizione Whisper ottimizzato per comandi vocali brevi
+"""
+
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+import numpy as np
+import torch
+import whisper
+from whisper.audio import N_SAMPLES
+from whisper.decoding import DecodingOptions, DecodingTask
+from whisper.model import AudioEncoder, ModelDimensions, TextDecoder, Whisper
+from config.settings import (
+    DEBUG, SAMPLE_RATE, WHISPER_MODEL, WHISPER_LANGUAGE, WHISPER_BEAM_SIZE,
+    WHISPER_COMMAND_MAX_TOKENS, WHISPER_FAST_PATH_MAX_SECONDS,
+    WHISPER_NO_SPEECH_THRESHOLD, WHISPER_LOGPROB_THRESHOLD,
+    WHISPER_PRECISION, WHISPER_CACHE_PATH, WHISPER_MMAP_CACHE
+)
+
+WHISPER_PRECISIONS = ('fp32', 'int8', 'fp16')
+
+
+def _quantize_int8(model):
+    """Quantizzazione dinamica int8 dei layer lineari (pesi int8, attivazioni float)"""
+    # whisper.model.Linear è una sottoclasse che in fp32 si comporta come nn.Linear,
+    # ma quantize_dynamic riconosce solo il tipo esatto
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+# torch >= 2.1: pesi mappati dal file (mmap) e assegnati senza copia (assign)
+_MMAP_SUPPORTED = ('mmap' in inspect.signature(torch.load).parameters and
+                   'assign' in inspect.signature(torch.nn.Module.load_state_dict).parameters)
+
+
+def _cache_file(name, precision):
+    return os.path.join(WHISPER_CACHE_PATH, f"whisper-{name}-{precision}.pt")
+
+
+def _cache_signature():
+    """Il formato dei pesi quantizzati dipende da versione torch e backend"""
+    return {'torch': torch.__version__, 'engine': torch.backends.quantized.engine, 'format': 2}
+
+
+def _unusable_file(name, precision):
+    return _cache_file(name, precision) + '.unusable'
+
+
+def _cache_unusable(name, precision):
+    """La cache non si carica con questa versione di torch: non riprovare (né riscriverla) a ogni avvio"""
+    try:
+        with open(_unusable_file(name, precision)) as f:
+            return json.load(f) == _cache_signature()
+    except Exception:
+        return False
+
+
+def _mark_unusable(name, precision, error):
+    if DEBUG:
+        print(f"[WHISPER] Cache {precision} non utilizzabile con torch {torch.__version__} ({error}), disattivata")
+    try:
+        os.makedirs(WHISPER_CACHE_PATH, exist_ok=True)
+        with open(_unusable_file(name, precision), 'w') as f:
+            json.dump(_cache_signature(), f)
+    except Exception:
+        pass
+
+
+def _skeleton(dims, precision):
+    """
+    Modello senza pesi: i tensori nascono sul device 'meta' (nessuna
+    allocazione né inizializzazione casuale) e vengono poi sostituiti da
+    quelli mappati dal file
+
+    Come Whisper.__init__, ma `alignment_heads` (sparso) viene creato fuori
+    dal contesto 'meta': la conversione in sparso non esiste per i tensori meta.
+    """
+    dims = ModelDimensions(**dims)
+    model = Whisper.__new__(Whisper)
+    torch.nn.Module.__init__(model)
+    model.dims = dims
+    with torch.device('meta'):
+        model.encoder = AudioEncoder(dims.n_mels, dims.n_audio_ctx, dims.n_audio_state,
+                                     dims.n_audio_head, dims.n_audio_layer)
+        model.decoder = TextDecoder(dims.n_vocab, dims.n_text_ctx, dims.n_text_state,
+                                    dims.n_text_head, dims.n_text_layer)
+    # Default di Whisper (metà superiore dei layer); sostituito da quello salvato in cache
+    all_heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+    all_heads[dims.n_text_layer // 2:] = True
+    model.register_buffer('alignment_heads', all_heads.to_sparse(), persistent=False)
+    if precision == 'int8':
+        # Stessi moduli prodotti da quantize_dynamic, con pesi vuoti
+        for module in list(model.modules()):
+            for child_name, child in list(module.named_children()):
+                if isinstance(child, torch.nn.Linear):
+                    setattr(module, child_name, torch.ao.nn.quantized.dynamic.Linear(
+                        child.in_features, child.out_features, bias_=child.bias is not None, dtype=torch.qint8
+                    ))
+    return model
+
+
+def _extra_buffers(model):
+    """Buffer non salvati da state_dict (maschera causale, alignment heads)"""
+    saved = model.state_dict().keys()
+    return {name: buffer.to_dense() if buffer.is_sparse else buffer
+            for name, buffer in model.named_buffers() if name not in saved}
+
+
+def _read_cache(path, precision):
+    """Modello dal file di cache; None se creato con un'altra versione di torch, eccezione se non caricabile"""
+    checkpoint = torch.load(path, map_location='cpu', weights_only=False, mmap=True)
+    if checkpoint.get('signature') != _cache_signature():
+        return None
+
+    model = _skeleton(checkpoint['dims'], precision)
+    model.load_state_dict(checkpoint['state_dict'], assign=True)
+    sparse = checkpoint.get('sparse_buffers', ())
+    for buffer_name, tensor in checkpoint.get('buffers', {}).items():
+        module_name, _, leaf = buffer_name.rpartition('.')
+        model.get_submodule(module_name).register_buffer(
+            leaf, tensor.to_sparse() if buffer_name in sparse else tensor, persistent=False
+        )
+
+    if any(t.is_meta for t in itertools.chain(model.parameters(), model.buffers())):
+        raise ValueError("tensori mancanti")
+    return model
+
+
+def _load_cached(name, precision):
+    """
+    Carica il modello dalla cache su disco; None se manca o non è valida
+
+    Il file è mappato in memoria: le pagine dei pesi vengono lette solo
+    quando servono e, in sola lettura, sono condivise dalla page cache tra
+    tutti i processi che usano lo stesso file. I pesi int8 vengono
+    reimpacchettati nel formato del backend (copia privata); embedding,
+    convoluzioni e layer norm restano mappati.
+    """
+    path = _cache_file(name, precision)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        model = _read_cache(path, precision)
+    except Exception as e:
+        # File danneggiato (es. scrittura interrotta): invalidato una volta e rigenerato;
+        # se anche il nuovo file non si carica, _save_cache disattiva la cache
+        if DEBUG:
+            print(f"[WHISPER] Cache {precision} non valida ({e}), la rigenero")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    if model is None:
+        if DEBUG:
+            print(f"[WHISPER] Cache {precision} creata con un'altra versione di torch, la rigenero")
+        return None
+
+    if DEBUG:
+        print(f"[WHISPER] Modello {precision} mappato dalla cache: {path}")
+    return model
+
+
+def _save_cache(model, name, precision):
+    path = _cache_file(name, precision)
+    buffers = _extra_buffers(model)
+    # File temporaneo + rename: altri processi possono leggere (o mappare) la versione precedente
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(WHISPER_CACHE_PATH, exist_ok=True)
+        torch.save({
+            'dims': asdict(model.dims),
+            'signature': _cache_signature(),
+            'state_dict': model.state_dict(),
+            'buffers': buffers,
+            'sparse_buffers': [n for n, b in model.named_buffers() if n in buffers and b.is_sparse]
+        }, temp_path)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if DEBUG:
+            print(f"[WHISPER] Impossibile salvare la cache {precision}: {e}")
+        return
+
+    try:
+        # Salvataggio → caricamento verificato prima di pubblicare il file
+        _read_cache(temp_path, precision)
+    except Exception as e:
+        os.remove(temp_path)
+        _mark_unusable(name, precision, e)
+        return
+    try:
+        os.replace(temp_path, path)
+    except OSError as e:
+        os.remove(temp_path)
+        if DEBUG:
+            print(f"[WHISPER] Impossibile salvare la cache {precision}: {e}")
+        return
+    if DEBUG:
+        print(f"[WHISPER] Modello {precision} salvato in cache: {path}")
+
+
+def _load_via_cache(name, precision):
+    """Modello su CPU ('fp32' o 'int8') dalla cache, creandola se manca o non è valida"""
+    use_cache = WHISPER_MMAP_CACHE and _MMAP_SUPPORTED and not _cache_unusable(name, precision)
+    model = _load_cached(name, precision) if use_cache else None
+    if model is not None:
+        return model
+
+    model = whisper.load_model(name, device='cpu')
+    if precision == 'int8':
+        model = _quantize_int8(model)
+    if use_cache:
+        _save_cache(model, name, precision)
+    return model
+
+
+def load_whisper_model(name=WHISPER_MODEL, precision=WHISPER_PRECISION):
+    """
+    Carica Whisper con la precisione di inferenza richiesta
+
+    Args:
+        name (str): tiny, base, small, medium, large
+        precision (str): 'fp32', 'int8' (quantizzazione dinamica per CPU) o 'fp16' (solo GPU)
+
+    Returns:
+        tuple: (modello, precisione effettivamente usata)
+    """
+    if precision not in WHISPER_PRECISIONS:
+        raise ValueError(f"Precisione Whisper sconosciuta: {precision} (valide: {', '.join(WHISPER_PRECISIONS)})")
+
+    if precision == 'fp16' and not torch.cuda.is_available():
+        if DEBUG:
+            print("[WHISPER] fp16 richiede una GPU, uso fp32")
+        precision = 'fp32'
+
+    start = time.perf_counter()
+    if precision == 'fp16':
+        # Stessi pesi float della cache fp32, copiati poi sulla GPU
+        model = _load_via_cache(name, 'fp32').to('cuda')
+    else:
+        model = _load_via_cache(name, precision)
+    model.eval()
+
+    if DEBUG:
+        print(f"[WHISPER] Modello {name} ({precision}) pronto in {time.perf_counter() - start:.1f}s")
+
+    return model, precision
+
+
+class CommandTranscriber:
+    def __init__(self, whisper_model, language=WHISPER_LANGUAGE, beam_size=WHISPER_BEAM_SIZE,
+                 max_tokens=WHISPER_COMMAND_MAX_TOKENS, fp16=False):
+        """
+        Trascrizione diretta di clip brevi, senza il ciclo di `transcribe`
+
+        `whisper_model.transcribe` per ogni chiamata rileva la lingua, costruisce
+        opzioni, tokenizer e filtri, scorre l'audio a finestre di 30 s e può
+        ripetere la decodifica a temperature crescenti. Per un comando di 1-4 s
+        basta una sola decodifica (greedy o beam) di una finestra: qui la
+        sessione di decodifica (DecodingTask con tokenizer, filtri e decoder)
+        viene creata una volta per thread e riusata.
+
+        Limite: l'encoder di Whisper ha un embedding posizionale fisso di 30 s,
+        quindi anche un comando di 1 s viene portato a 30 s (pad_or_trim) e il
+        costo dell'encoder resta quello di una finestra intera. Il risparmio
+        riguarda solo il lavoro attorno al decoder.
+        """
+        self.model = whisper_model
+        self.n_mels = getattr(whisper_model.dims, 'n_mels', 80)
+        self.max_samples = int(min(WHISPER_FAST_PATH_MAX_SECONDS * SAMPLE_RATE, N_SAMPLES))
+
+        self.options = DecodingOptions(
+            task='transcribe',
+            language=language,
+            temperature=0.0,
+            beam_size=beam_size if beam_size and beam_size > 1 else None,
+            sample_len=max_tokens,
+            without_timestamps=True,
+            fp16=fp16
+        )
+
+        # DecodingTask mantiene la cache KV durante run(): una sessione per worker
+        self._local = threading.local()
+
+    def _session(self):
+        task = getattr(self._local, 'task', None)
+        if task is None:
+            task = DecodingTask(self.model, self.options)
+            self._local.task = task
+            if DEBUG:
+                print(f"[WHISPER] Sessione di decodifica creata ({threading.current_thread().name})")
+        return task
+
+    def transcribe(self, audio_data):
+        """
+        Trascrive un comando breve
+
+        Args:
+            audio_data (np.ndarray): audio float32 normalizzato a SAMPLE_RATE
+
+        Returns:
+            str: testo trascritto ("" se Whisper non rileva parlato)
+        """
+        if len(audio_data) > self.max_samples:
+            # Clip lunga: percorso standard con finestre multiple
+            return self.transcribe_full(audio_data)
+
+        audio = torch.from_numpy(np.ascontiguousarray(audio_data, dtype=np.float32))
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=self.n_mels)
+        mel = mel.to(self.model.device).unsqueeze(0)
+
+        with torch.no_grad():
+            result = self._session().run(mel)[0]
+
+        # Stessi criteri di scarto di `transcribe`
+        if (result.no_speech_prob > WHISPER_NO_SPEECH_THRESHOLD and
+                result.avg_logprob < WHISPER_LOGPROB_THRESHOLD):
+            if DEBUG:
+                print(f"[WHISPER] Nessun parlato (p={result.no_speech_prob:.2f})")
+            return ""
+
+        return result.text.strip()
+
+    def transcribe_full(self, audio_data):
+        """Percorso standard di Whisper (finestre da 30 s, fallback di temperatura)"""
+        result = self.model.transcribe(
+            audio_data,
+            language=self.options.language,
+            fp16=self.options.fp16,
+            verbose=None,
+            no_speech_threshold=WHISPER_NO_SPEECH_THRESHOLD,
+            logprob_threshold=WHISPER_LOGPROB_THRESHOLD,
+            condition_on_previous_text=False
+        )
+        return result["text"].strip()